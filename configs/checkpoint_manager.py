@@ -0,0 +1,126 @@
+import os
+import re
+import time
+import shutil
+import hashlib
+import threading
+import weakref
+import yaml
+from configs.yaml_manager import get_private_folder
+
+CHECKPOINTS_FOLDER = "checkpoints"
+COMPLETED = "completed"
+RUNNING = "running"
+
+
+class CheckpointStore:
+    """
+    A class to persist the progress of a module (rules, output tables, CSV files) so that an
+    interrupted run can be resumed.
+
+    Each entry is stored in its own YAML file under private/checkpoints/<module>/, written atomically,
+    so worker processes can record their own entries without conflicting with each other.
+
+    Attributes:
+        module (str): The name of the module (e.g. "csv_loader", "data_migration").
+        folder (str): The folder holding the entries of the module.
+        entries (dict): The entries read or written by this process, keyed by name.
+    """
+    def __init__(self, module, folder=None):
+        self.module = module
+        self.folder = folder or os.path.join(get_private_folder(), CHECKPOINTS_FOLDER, module)
+        self.entries = {}
+        self.lock = threading.RLock()
+
+    def __getstate__(self):
+        # Sent to worker processes without the lock and the entries read so far
+        return {"module": self.module, "folder": self.folder}
+
+    def __setstate__(self, state):
+        self.__init__(state["module"], state["folder"])
+
+    def entry_path(self, key):
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", key)[:100]
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+        return os.path.join(self.folder, f"{name}_{digest}.yml")
+
+    def get(self, key):
+        if key in self.entries:
+            return self.entries[key]
+        path = self.entry_path(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as file:
+            entry = (yaml.safe_load(file) or {}).get("entry")
+        self.entries[key] = entry
+        return entry
+
+    def save(self, key, **values):
+        """
+        Updates an entry with values and writes it to disk.
+
+        """
+        with self.lock:
+            entry = dict(self.get(key) or {})
+            entry.update(values)
+            entry["updated_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            os.makedirs(self.folder, exist_ok=True)
+            path = self.entry_path(key)
+            temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(temporary_path, "w") as file:
+                    yaml.safe_dump({"key": key, "entry": entry}, file)
+                os.replace(temporary_path, path)
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+            self.entries[key] = entry
+            return entry
+
+    def complete(self, key, **values):
+        return self.save(key, status=COMPLETED, **values)
+
+    def is_completed(self, key):
+        entry = self.get(key)
+        return entry is not None and entry.get("status") == COMPLETED
+
+    def committed_rows(self, key):
+        entry = self.get(key)
+        return entry.get("rows", 0) if entry else 0
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            path = self.entry_path(key)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """
+        Removes every entry of the module (a new run starts from the beginning).
+
+        """
+        with self.lock:
+            self.entries = {}
+        if os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+
+
+class TableCheckpoint:
+    """
+    A writer on_commit callback that records the rows committed into a table under key. The rows of
+    every writer it is attached to are added to the rows committed by the previous run.
+
+    """
+    def __init__(self, store, key, rows=0):
+        self.store = store
+        self.key = key
+        self.rows = rows
+        self.writers = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def __call__(self, writer):
+        with self.lock:
+            self.rows += writer.committed_rows - self.writers.get(writer, 0)
+            self.writers[writer] = writer.committed_rows
+            self.store.save(self.key, status=RUNNING, rows=self.rows)
@@ -0,0 +1,144 @@
+import time
+import traceback
+from concurrent.futures import wait, FIRST_COMPLETED
+
+
+class TaskResult:
+    """
+    A class to store the outcome of a scheduled task.
+
+    Attributes:
+        name (str): The name of the task.
+        status (str): "success", "failed" or "skipped" (a dependency did not succeed).
+        result: The value returned by the task.
+        error (str): The error message of a failed task, or the reason a task was skipped.
+        elapsed_time (float): Seconds between the submission and the completion of the task.
+    """
+    def __init__(self, name, status, result=None, error=None, elapsed_time=0.0):
+        self.name = name
+        self.status = status
+        self.result = result
+        self.error = error
+        self.elapsed_time = elapsed_time
+
+    def __str__(self):
+        return f"TaskResult(name={self.name}, status={self.status}, elapsed_time={round(self.elapsed_time, 2)}s, error={self.error})"
+
+
+class DependencyScheduler:
+    """
+    A class to run tasks concurrently on an executor (thread or process pool) while respecting
+    the dependencies declared between them. A task starts as soon as all of its dependencies
+    succeeded; when a dependency fails, the task (and its own dependents) is skipped.
+
+    Attributes:
+        tasks (dict): The tasks, as name -> (function, args), in submission order.
+        dependencies (dict): The dependencies of each task, as name -> list of task names.
+    """
+    def __init__(self):
+        self.tasks = {}
+        self.dependencies = {}
+
+    def add_task(self, name, function, args=(), depends_on=None):
+        """
+        Adds a task. args may be a callable returning the arguments, called when the task is
+        submitted, so that they can include the results of its dependencies.
+
+        """
+        if name in self.tasks:
+            raise Exception(f"Task '{name}' already scheduled")
+        self.tasks[name] = (function, args)
+        self.dependencies[name] = list(depends_on or [])
+
+    def validate(self):
+        """
+        Checks that every dependency exists and that there are no cycles.
+
+        """
+        for name, dependencies in self.dependencies.items():
+            for dependency in dependencies:
+                if dependency not in self.tasks:
+                    raise Exception(f"Task '{name}' depends on unknown task '{dependency}'")
+
+        visiting, visited = set(), set()
+
+        def visit(name, path):
+            if name in visited:
+                return
+            if name in visiting:
+                raise Exception(f"Dependency cycle detected: {' -> '.join(path + [name])}")
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency, path + [name])
+            visiting.discard(name)
+            visited.add(name)
+
+        for name in self.tasks:
+            visit(name, [])
+
+    def ordered_tasks(self):
+        """
+        Returns the task names in an order where every task comes after its dependencies, keeping the
+        submission order otherwise. Used to run the tasks one after another.
+
+        """
+        self.validate()
+        ordered = []
+        done = set()
+        pending = list(self.tasks)
+        while pending:
+            name = next(name for name in pending if all(d in done for d in self.dependencies[name]))
+            pending.remove(name)
+            ordered.append(name)
+            done.add(name)
+        return ordered
+
+    def run(self, executor, on_complete=None):
+        """
+        Runs all tasks on the executor and waits for them.
+
+        Args:
+            executor (concurrent.futures.Executor): The executor running the tasks.
+            on_complete (callable, optional): Called with each TaskResult as soon as the task ends.
+
+        Returns:
+            dict: The TaskResult of every task, keyed by name, in submission order.
+        """
+        self.validate()
+        results = {}
+        pending = list(self.tasks)
+        running = {}
+
+        def finish(task_result):
+            results[task_result.name] = task_result
+            if on_complete is not None:
+                on_complete(task_result)
+
+        while pending or running:
+            for name in list(pending):
+                dependencies = self.dependencies[name]
+                failed = [d for d in dependencies if d in results and results[d].status != "success"]
+                if failed:
+                    pending.remove(name)
+                    finish(TaskResult(name, "skipped", error=f"dependency '{failed[0]}' did not succeed"))
+                elif all(d in results for d in dependencies):
+                    pending.remove(name)
+                    function, args = self.tasks[name]
+                    if callable(args):
+                        args = args()
+                    running[executor.submit(function, *args)] = (name, time.perf_counter())
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, start_time = running.pop(future)
+                elapsed_time = time.perf_counter() - start_time
+                try:
+                    finish(TaskResult(name, "success", result=future.result(), elapsed_time=elapsed_time))
+                except Exception as e:
+                    error = "".join(traceback.format_exception_only(type(e), e)).strip()
+                    finish(TaskResult(name, "failed", error=error, elapsed_time=elapsed_time))
+
+        return {name: results[name] for name in self.tasks}
@@ -14,10 +14,11 @@ class GenericModule(ABC):
     Attributes:
         module_name (str): The name of the module.
         config_path (str): The default path to the configuration file.
+        resume (bool): Whether the run resumes from the checkpoints of the previous run.
 
     Methods:
         __init__(self, module_name: str): Initializes the module with a name and sets the default configuration file path.
-        parse_arguments(self): Parses command-line arguments to get the configuration file path.
+        parse_arguments(self): Parses command-line arguments to get the configuration file path and the resume flag.
         calculate_time(start_time): Calculates and formats the elapsed time since the start time.
         load_configs(self, config_path: str): Loads the configuration file from the specified path.
         run(self, configs: dict): Abstract method that must be implemented by subclasses to define the module's main functionality.
@@ -26,6 +27,7 @@ class GenericModule(ABC):
     def __init__(self, module_name: str):
         self.module_name = module_name
         self.config_path = "private/configs.yml"
+        self.resume = False
 
     def parse_arguments(self):
         parser = argparse.ArgumentParser(description=f"Run {self.module_name} pipeline")
@@ -35,6 +37,11 @@ class GenericModule(ABC):
             default=self.config_path,
             help=f"Path to configuration file (default: {self.config_path})"
         )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume from the checkpoints of the previous run, skipping the work already committed"
+        )
         return parser.parse_args()
 
     @staticmethod
@@ -65,9 +72,12 @@ class GenericModule(ABC):
 
     def execute(self):
         args = self.parse_arguments()
+        self.resume = args.resume
         
         try:
             print(f"\n[{self.module_name}] Using configuration: {args.config}")
+            if self.resume:
+                print(f"[{self.module_name}] Resuming from the last checkpoints")
             configs = self.load_configs(args.config)
             
             start_time = time.perf_counter()
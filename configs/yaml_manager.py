@@ -1,3 +1,4 @@
+import ast
 import yaml
 from data_access.db_credentials import DBCredentials
 from system_logging.console_log import ConsoleLog
@@ -10,6 +11,7 @@ PRIVATE_FOLDER = "private"
 RULES_FOLDER = f"{PRIVATE_FOLDER}/rules"
 GENERAL_CONFIGS_FILE = f"{PRIVATE_FOLDER}/configs.yml"
 SENSOR_FILENAME = "new_data_sensor.yml"
+METADATA_CACHE_FILENAME = "metadata_cache.yml"
 
 
 def update_private_folder(folder):
@@ -26,6 +28,19 @@ def get_rules_folder():
 def get_private_folder():
     return PRIVATE_FOLDER
 
+def rule_file_functions(name):
+    """
+    Returns the names of the functions defined at the top level of a rule file (empty when there is no file),
+    without importing it.
+
+    """
+    path = f"{RULES_FOLDER}/{name}.py"
+    if not os.path.isfile(path):
+        return set()
+    with open(path, 'r') as file:
+        tree = ast.parse(file.read(), filename=path)
+    return {node.name for node in tree.body if isinstance(node, ast.FunctionDef)}
+
 def load_yaml_file(file_path):
     configs = None
     try:
@@ -66,12 +81,20 @@ def load_csv_loader(configs=None):
     
     buffer_size = csv_loader.get('buffer_size', 1000)
     bulk_commit = csv_loader.get('bulk_commit', False)
+    load_mode = csv_loader.get('load_mode', 'insert')
+    parallelism = csv_loader.get('parallelism', 1)
+    async_flush = csv_loader.get('async_flush', False)
+    bulk_load = csv_loader.get('bulk_load', None)
     csv_files = csv_loader['csv_files']
     
     return {
         'credentials': target_credentials,
         'buffer_size': buffer_size,
         'bulk_commit': bulk_commit,
+        'load_mode': load_mode,
+        'parallelism': parallelism,
+        'async_flush': async_flush,
+        'bulk_load': bulk_load,
         'csv_files': csv_files
     }
 
@@ -117,6 +140,15 @@ def load_data_migration(mapper,configs=None):
     
     mapper.buffer_size = data_migration.get('buffer_size', 1000)
     mapper.bulk_commit = data_migration.get('bulk_commit', False)
+    mapper.load_mode = data_migration.get('load_mode', 'insert')
+    mapper.async_flush = data_migration.get('async_flush', False)
+    mapper.prefetch = data_migration.get('prefetch', 0)
+    mapper.connection_pool = data_migration.get('connection_pool') or {}
+    mapper.metadata_cache = data_migration.get('metadata_cache') or {}
+    mapper.parallelism = data_migration.get('parallelism', 1)
+    mapper.executor = data_migration.get('executor', 'thread')
+    if mapper.executor not in ('thread', 'process'):
+        raise Exception(f"Invalid data_migration executor '{mapper.executor}', expected 'thread' or 'process'")
     mapper.rules = []
     
     for name, rule in rules.items():
@@ -127,9 +159,17 @@ def load_data_migration(mapper,configs=None):
         outputs = rule.get("outputs", None)
         setup = rule.get("setup", False)
 
+        depends_on = rule.get("depends_on") or []
+        if not isinstance(depends_on, list):
+            raise Exception(f"Rule '{name}' has an invalid 'depends_on' section, expected a list of rule names.")
+        for dependency in depends_on:
+            if dependency not in rules:
+                raise Exception(f"Rule '{name}' depends on unknown rule '{dependency}'.")
+
         if setup is True:
             rule_obj = Rule(name)
             rule_obj.skip = rule.get("skip", False)
+            rule_obj.depends_on = depends_on
             mapper.rules.append(rule_obj)
             continue
 
@@ -150,6 +190,7 @@ def load_data_migration(mapper,configs=None):
 
         rule_obj = Rule(name)
         rule_obj.skip = rule.get("skip", False)
+        rule_obj.depends_on = depends_on
         mapper.rules.append(rule_obj)
         
         for db, queries in (inputs or {}).items():
@@ -173,8 +214,71 @@ def load_data_migration(mapper,configs=None):
             
             for table in tables:
                 rule_obj.outputs.append(Output(db_credentials, table))
+
+        rule_obj.copy = rule.get("copy", False)
+        if rule_obj.copy and len(rule_obj.inputs) != len(rule_obj.outputs):
+            raise Exception(f"Rule '{name}' is a copy rule and must have one input query per output table.")
+        rule_obj.columns = rule.get("columns", None)
+        if rule_obj.columns is not None and not isinstance(rule_obj.columns, (dict, list)):
+            raise Exception(f"Rule '{name}' has an invalid 'columns' section, expected a mapping of source to target columns or a list.")
+        rule_obj.pushdown = rule.get("pushdown", True)
+        rule_obj.batch_format = rule.get("batch_format", "rows")
+        if rule_obj.batch_format not in ("rows", "dataframe"):
+            raise Exception(f"Rule '{name}' has an invalid batch_format '{rule_obj.batch_format}', expected 'rows' or 'dataframe'.")
+        rule_obj.transform_workers = rule.get("transform_workers", 1)
+        rule_obj.ordered = rule.get("ordered", True)
+        rule_obj.max_pending_batches = rule.get("max_pending_batches", None)
+        rule_obj.checkpoint_interval = rule.get("checkpoint_interval", None)
+        if rule_obj.checkpoint_interval is not None and (not isinstance(rule_obj.checkpoint_interval, int) or rule_obj.checkpoint_interval < 1):
+            raise Exception(f"Rule '{name}' has an invalid checkpoint_interval '{rule_obj.checkpoint_interval}', expected a positive number of batches.")
+        if rule_obj.checkpoint_interval and not rule_obj.ordered:
+            raise Exception(f"Rule '{name}' sets checkpoint_interval, which requires ordered: true.")
+        rule_obj.write_mode = rule.get("write_mode", "insert")
+        if rule_obj.write_mode not in ("insert", "upsert"):
+            raise Exception(f"Rule '{name}' has an invalid write_mode '{rule_obj.write_mode}', expected 'insert' or 'upsert'.")
+        if rule_obj.copy and rule_obj.write_mode == "upsert":
+            raise Exception(f"Rule '{name}' is a copy rule, which does not support write_mode: upsert.")
+        rule_obj.conflict_key = rule.get("conflict_key", None)
+        if rule_obj.conflict_key is not None and (not isinstance(rule_obj.conflict_key, list) or not rule_obj.conflict_key):
+            raise Exception(f"Rule '{name}' has an invalid conflict_key, expected a list of column names.")
+        rule_obj.shadow = rule.get("shadow", False)
+        rule_obj.incremental_key = rule.get("incremental_key", None)
+        if rule_obj.incremental_key is not None and (not isinstance(rule_obj.incremental_key, str) or not rule_obj.incremental_key):
+            raise Exception(f"Rule '{name}' has an invalid incremental_key, expected a column name.")
+        if rule_obj.incremental_key is not None and rule_obj.write_mode != "upsert":
+            # The changed rows are read again, so they must be merged into the outputs (copy rules cannot upsert)
+            raise Exception(f"Rule '{name}' sets incremental_key, which requires write_mode: upsert.")
+        rule_obj.group_commit = rule.get("group_commit", None)
+        if rule_obj.group_commit is not None:
+            if not isinstance(rule_obj.group_commit, dict) or set(rule_obj.group_commit) - {"rows", "interval"}:
+                raise Exception(f"Rule '{name}' has an invalid group_commit, expected a mapping with 'rows' and/or 'interval'.")
+            for key, value in rule_obj.group_commit.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+                    raise Exception(f"Rule '{name}' has an invalid group_commit {key} '{value}', expected a positive number.")
+            if rule_obj.copy:
+                raise Exception(f"Rule '{name}' is a copy rule, which does not support group_commit.")
+            if rule_obj.checkpoint_interval:
+                raise Exception(f"Rule '{name}' sets both group_commit and checkpoint_interval, which decide the commits differently.")
+            if "exec" in rule_file_functions(name):
+                raise Exception(f"Rule '{name}' is an exec rule, group_commit only applies to transform_batch rules (use output.transaction() in exec).")
+        rule_obj.resumable = rule.get("resumable", False)
         
         
+def load_new_data_sensor(configs=None):
+    if configs is None:
+        configs = load_yaml_file(GENERAL_CONFIGS_FILE)
+    sensor = configs.get('new_data_sensor') or {}
+    
+    mode = sensor.get('mode', 'estimate')
+    if mode not in ('estimate', 'exact'):
+        raise Exception(f"Invalid new_data_sensor mode '{mode}', expected 'estimate' or 'exact'")
+    
+    return {
+        'mode': mode,
+        'exact_tables': sensor.get('exact_tables') or [],
+        'exact_threshold': sensor.get('exact_threshold', None)
+    }
+        
 def save_sensor_file(data):
     sensor_path = os.path.join(get_private_folder(), SENSOR_FILENAME)
     with open(sensor_path, "w") as file:
@@ -185,4 +289,16 @@ def load_sensor_file():
     if not os.path.exists(sensor_path):
         return {}
     with open(sensor_path, "r") as file:
-        return yaml.safe_load(file)
\ No newline at end of file
+        return yaml.safe_load(file)
+
+def save_metadata_cache_file(data):
+    cache_path = os.path.join(get_private_folder(), METADATA_CACHE_FILENAME)
+    with open(cache_path, "w") as file:
+        yaml.dump(data, file)
+
+def load_metadata_cache_file():
+    cache_path = os.path.join(get_private_folder(), METADATA_CACHE_FILENAME)
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path, "r") as file:
+        return yaml.safe_load(file)
@@ -7,6 +7,7 @@ import sys
 from system_logging.log_manager import log, Level
 from configs.yaml_manager import load_csv_loader
 from csv_loader.csv_to_database import csv_importer
+from data_access.db_factory import DatabaseFactory
 
 
 class CsvLoaderModule(GenericModule):
@@ -17,7 +18,7 @@ class CsvLoaderModule(GenericModule):
         try:
             start_time = time.perf_counter()
     
-            csv_importer(**load_csv_loader(configs))
+            csv_importer(**load_csv_loader(configs), resume=self.resume)
             
             end_time = time.perf_counter()
             execution_time_seconds = end_time - start_time
@@ -27,6 +28,8 @@ class CsvLoaderModule(GenericModule):
             log(Level.ERROR, f'[csv_loader] Fatal error: {e}')
             log(Level.ERROR, traceback.format_exc())
             sys.exit(1)
+        finally:
+            DatabaseFactory().close_all_connections()
 
 if __name__ == "__main__":
     CsvLoaderModule().execute()
@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+
+TEXT_TYPES = {'text', 'character varying', 'character', 'varchar', 'char', 'bpchar', 'name', 'citext', 'uuid', 'json', 'jsonb', 'xml', 'inet', 'cidr'}
+TEXT_TYPE_PREFIXES = ('character', 'date', 'time', 'interval')
+TRUE_VALUES = {'true', 't', 'yes', 'y', 'on', '1'}
+FALSE_VALUES = {'false', 'f', 'no', 'n', 'off', '0'}
+
+
+def column_kind(data_type):
+    """
+    Classifies a PostgreSQL data type into the conversion applied to its CSV column:
+    "boolean", "text" (values are kept as read) or "numeric" (numeric strings are converted to int/float).
+
+    """
+    if data_type is None:
+        return 'numeric'
+    data_type = data_type.lower()
+    if data_type == 'boolean':
+        return 'boolean'
+    if data_type in TEXT_TYPES or data_type.startswith(TEXT_TYPE_PREFIXES):
+        return 'text'
+    return 'numeric'
+
+
+def integral_floats_to_int(values, floats, mask):
+    """
+    Stores the floats selected by mask into values, as int when they have no fractional part.
+
+    """
+    integral = mask & np.isfinite(floats) & (np.abs(np.nan_to_num(floats)) < 2**63)
+    integral[integral] = np.mod(floats[integral], 1) == 0
+    fractional = mask & ~integral
+    values[fractional] = floats[fractional]
+    indexes = np.flatnonzero(integral)
+    if len(indexes) > 0:
+        values[indexes] = floats[indexes].astype(np.int64).tolist()
+    return values
+
+
+def convert_numeric_column(series):
+    """
+    Vectorized equivalent of convert_value_to_numeric: numeric values become int (when integral)
+    or float, anything that is not a number is kept unchanged.
+
+    """
+    values = series.to_numpy(dtype=object).copy()
+    if pd.api.types.is_bool_dtype(series):
+        return values
+    if pd.api.types.is_integer_dtype(series):
+        return np.array(series.to_numpy().tolist(), dtype=object)
+    numeric = pd.to_numeric(series, errors='coerce')
+    parsed = numeric.notna().to_numpy()
+    floats = numeric.to_numpy(dtype='float64', na_value=np.nan)
+    return integral_floats_to_int(values, floats, parsed)
+
+
+def convert_text_column(series):
+    """
+    Keeps the values as read, only turning integral floats (numeric columns with missing values
+    are read by pandas as float) back into int.
+
+    """
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=object).copy()
+        floats = series.to_numpy(dtype='float64', na_value=np.nan)
+        return integral_floats_to_int(values, floats, ~np.isnan(floats))
+    if pd.api.types.is_integer_dtype(series):
+        return convert_numeric_column(series)
+    return series.to_numpy(dtype=object).copy()
+
+
+def convert_boolean_column(series):
+    """
+    Converts numbers (0 is False) and the usual textual literals (true/false, t/f, yes/no, ...) to bool.
+
+    """
+    values = series.to_numpy(dtype=object).copy()
+    if pd.api.types.is_bool_dtype(series):
+        return values
+    numeric = pd.to_numeric(series, errors='coerce')
+    parsed = numeric.notna().to_numpy()
+    values[parsed] = (numeric.to_numpy(dtype='float64', na_value=np.nan)[parsed] != 0).tolist()
+    others = np.flatnonzero(~parsed & series.notna().to_numpy())
+    for index in others:
+        text = str(values[index]).strip().lower()
+        values[index] = text in TRUE_VALUES if text in TRUE_VALUES or text in FALSE_VALUES else bool(values[index])
+    return values
+
+
+def convert_dataframe(df, columns, replace_columns_values=None):
+    """
+    Converts a DataFrame column by column to the types expected by the target table.
+
+    Args:
+        df (pd.DataFrame): The data read from the CSV file.
+        columns (list): A list of Column objects representing the columns of the table.
+        replace_columns_values (dict): A dictionary of column names and their replacement values.
+
+    Returns:
+        list: One object array per column, holding Python values (None for missing values).
+    """
+    arrays = []
+    for column in columns:
+        if replace_columns_values is not None and column.name in replace_columns_values:
+            values = np.empty(len(df), dtype=object)
+            values[:] = [replace_columns_values[column.name]] * len(df)
+            arrays.append(values)
+            continue
+        if column.name not in df.columns:
+            raise Exception(f'[csv_loader] Error: Column {column.name} not found in the CSV file')
+
+        series = df[column.name]
+        kind = column_kind(column.data_type)
+        if kind == 'boolean':
+            values = convert_boolean_column(series)
+        elif kind == 'text':
+            values = convert_text_column(series)
+        else:
+            values = convert_numeric_column(series)
+        values[series.isna().to_numpy()] = None
+        arrays.append(values)
+    return arrays
+
+
+def dataframe_rows(df, columns, replace_columns_values=None):
+    """
+    Converts a DataFrame (see convert_dataframe) and returns its rows as a list of tuples.
+
+    """
+    return list(zip(*convert_dataframe(df, columns, replace_columns_values)))
@@ -0,0 +1,139 @@
+import io
+import os
+import csv
+import pandas as pd
+
+SCAN_BLOCK_SIZE = 1024 * 1024
+
+
+class ByteRangeFile(io.RawIOBase):
+    """
+    A read-only binary file limited to the bytes between start and end, so that a range of a CSV file
+    can be streamed to pandas without being loaded into memory.
+
+    """
+    def __init__(self, path, start, end):
+        self.file = open(path, "rb")
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        data = self.file.read(size)
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def find_record_end(file, offset, quote, in_quotes):
+    """
+    Returns the offset right after the first newline at or after offset that is not inside a quoted field,
+    or None at the end of the file. in_quotes is the quoting state at offset.
+
+    """
+    file.seek(offset)
+    while True:
+        block = file.read(SCAN_BLOCK_SIZE)
+        if not block:
+            return None
+        position = 0
+        while True:
+            newline = block.find(b"\n", position)
+            if newline < 0:
+                in_quotes ^= block.count(quote, position) % 2 == 1
+                break
+            in_quotes ^= block.count(quote, position, newline) % 2 == 1
+            if not in_quotes:
+                return offset + newline + 1
+            position = newline + 1
+        offset += len(block)
+
+
+def split_csv_file(path, parts, quotechar='"', encoding="utf-8"):
+    """
+    Splits a CSV file into up to parts byte ranges aligned to record boundaries. A newline is a record
+    boundary only when an even number of quotechar was seen before it (escaped quotes are doubled,
+    so they keep the parity).
+
+    Returns:
+        tuple: The header offset (where the data starts) and the list of (start, end) byte ranges.
+    """
+    quote = quotechar.encode(encoding) if quotechar else b""
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        if quote:
+            header_end = find_record_end(file, 0, quote, False)
+        else:
+            header_end = len(file.readline()) or None
+        if header_end is None:
+            return size, []
+
+        targets = [header_end + (size - header_end) * part // parts for part in range(1, parts)]
+        offsets = [header_end]
+        in_quotes = False
+        scanned = header_end
+        file.seek(header_end)
+        for target in targets:
+            if target <= offsets[-1]:
+                continue
+            if quote:
+                # quoting state at the target offset
+                while scanned < target:
+                    block = file.read(min(SCAN_BLOCK_SIZE, target - scanned))
+                    if not block:
+                        break
+                    in_quotes ^= block.count(quote) % 2 == 1
+                    scanned += len(block)
+                boundary = find_record_end(file, target, quote, in_quotes)
+            else:
+                file.seek(target)
+                line = file.readline()
+                boundary = target + len(line) if line else None
+            if boundary is None or boundary >= size:
+                break
+            if quote:
+                # continue the scan from the boundary, which is outside quotes
+                in_quotes = False
+                scanned = boundary
+                file.seek(boundary)
+            offsets.append(boundary)
+        offsets.append(size)
+
+    ranges = [(start, end) for start, end in zip(offsets, offsets[1:]) if end > start]
+    return header_end, ranges
+
+
+def read_csv_header(path, header_end, delimiter=",", quotechar='"', encoding="utf-8"):
+    """
+    Reads the column names from the first record of the file.
+
+    """
+    with open(path, "rb") as file:
+        header = file.read(header_end).decode(encoding)
+    names = next(csv.reader(io.StringIO(header), delimiter=delimiter, quotechar=quotechar or None), [])
+    if names and names[0].startswith("\ufeff"):
+        names[0] = names[0][1:]
+    return names
+
+
+def read_csv_range_chunks(path, start, end, names, delimiter=",", quotechar='"', encoding="utf-8", chunk_size=None):
+    """
+    Reads the records between the start and end byte offsets as a sequence of DataFrames (see read_csv_chunks).
+
+    """
+    with io.TextIOWrapper(io.BufferedReader(ByteRangeFile(path, start, end)), encoding=encoding, newline="") as text:
+        if not chunk_size:
+            yield pd.read_csv(text, names=names, header=None, delimiter=delimiter, quotechar=quotechar)
+            return
+        with pd.read_csv(text, names=names, header=None, delimiter=delimiter, quotechar=quotechar, chunksize=chunk_size) as reader:
+            for chunk in reader:
+                yield chunk
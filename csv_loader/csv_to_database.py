@@ -1,10 +1,311 @@
+import os
+import time
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from configs.dependency_scheduler import DependencyScheduler, TaskResult
+from configs.checkpoint_manager import CheckpointStore, TableCheckpoint
 from system_logging.log_manager import log, Level
 from data_access.db_factory import DatabaseFactory
 from data_access.metadata_models import Table
-from csv_loader.csv_process_tuple import process_row
+from data_access.postgresql_reject_sink import RejectFile
+from configs.yaml_manager import get_private_folder
+from data_access.utils import format_rows_per_second
+from csv_loader.csv_process_dataframe import dataframe_rows
+from csv_loader.csv_split import split_csv_file, read_csv_header, read_csv_range_chunks
 
-def csv_importer(credentials=None, buffer_size=1000, bulk_commit=False, csv_files=None):
+REJECTS_FOLDER = "rejects"
+
+
+def read_csv_chunks(path, delimiter=",", quotechar='"', encoding="utf-8", chunk_size=None):
+    """
+    Reads a CSV file as a sequence of DataFrames. Without chunk_size the whole file is read at once,
+    otherwise at most chunk_size rows are kept in memory at a time.
+
+    """
+    if not chunk_size:
+        yield pd.read_csv(path, delimiter=delimiter, quotechar=quotechar, encoding=encoding)
+        return
+    with pd.read_csv(path, delimiter=delimiter, quotechar=quotechar, encoding=encoding, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def checkpoint_key(csv_file, byte_range=None):
+    key = f'{csv_file["path"]}:{csv_file["target_table"]}'
+    if byte_range is not None:
+        key += f":{byte_range[0]}-{byte_range[1]}"
+    return key
+
+
+def skip_rows(chunks, count):
+    """
+    Drops the first count rows of a sequence of DataFrames (rows committed by a previous run).
+
+    """
+    for df in chunks:
+        if count > 0:
+            skipped = min(count, len(df))
+            df = df.iloc[skipped:]
+            count -= skipped
+        if len(df) > 0:
+            yield df
+
+
+def reject_sink(db, csv_file, byte_range=None):
+    """
+    Returns the sink of the rows rejected while importing the file: its reject_table in the target database,
+    or its reject_file (default private/rejects/<target_table>.csv). Each byte range of a split file
+    writes to its own file.
+
+    """
+    if csv_file.get("reject_table"):
+        return db.reject_table(csv_file["reject_table"])
+    path = csv_file.get("reject_file") or os.path.join(get_private_folder(), REJECTS_FOLDER, f"{csv_file['target_table']}.csv")
+    if byte_range is not None:
+        base, extension = os.path.splitext(path)
+        path = f"{base}_{byte_range[0]}-{byte_range[1]}{extension}"
+    return RejectFile(path)
+
+
+def import_csv_file(db, csv_file, buffer_size=1000, load_mode="insert", byte_range=None, checkpoint=None):
+    """
+    Imports one CSV file into its target table using an open database facade.
+    Each chunk is converted and written before the next one is read.
+
+    Args:
+        db (PostgreSQLFacade): The database facade, with an open connection.
+        csv_file (dict): The CSV file configuration (see csv_importer).
+        buffer_size (int, optional): The size of the buffer for bulk inserts. Defaults to 1000.
+        load_mode (str, optional): The default load mode, overridden by the file's load_mode.
+        byte_range (tuple, optional): Only imports the records between these byte offsets, as (start, end, column names). Defaults to None (the whole file).
+        checkpoint (CheckpointStore, optional): Records the committed rows; completed files are skipped and
+            partially loaded files restart after their last committed row. Defaults to None.
+
+    Returns:
+        dict: The import totals (target_table, total, total_valid).
+    """
+    path = csv_file["path"]
+    target_table = csv_file["target_table"]
+    encoding = csv_file.get("encoding", "utf-8")
+    delimiter = csv_file.get("delimiter", ",")
+    quotechar = csv_file.get("quotechar", '"')
+    replace_columns_values = csv_file.get("replace_columns_values", None)
+    file_load_mode = csv_file.get("load_mode", load_mode)
+    write_mode = csv_file.get("write_mode", "insert")
+    conflict_key = csv_file.get("conflict_key", None)
+    on_error = csv_file.get("on_error", "abort")
+    shadow = None
+    if csv_file.get("shadow", False) and byte_range is not None:
+        raise Exception(f"[csv_loader] {target_table}: shadow cannot be combined with split")
+    chunk_size = csv_file.get("chunk_size", None)
+
+    total_valid = 0
+    total = 0
+    label = target_table
+    if byte_range is not None:
+        start, end, names = byte_range
+        label = f"{target_table} [bytes {start}-{end}]"
+        chunks = read_csv_range_chunks(path, start, end, names, delimiter, quotechar, encoding, chunk_size)
+    else:
+        chunks = read_csv_chunks(path, delimiter, quotechar, encoding, chunk_size)
+
+    key = checkpoint_key(csv_file, byte_range)
+    committed_rows = 0
+    if checkpoint is not None:
+        if checkpoint.is_completed(key):
+            entry = checkpoint.get(key)
+            log(Level.INFO, f"[csv_loader] {label} already imported ({entry.get('rows', 0)} rows), skipped")
+            return {'target_table': target_table, 'total': entry.get('total', 0), 'total_valid': entry.get('rows', 0)}
+        committed_rows = checkpoint.committed_rows(key)
+        if committed_rows > 0:
+            log(Level.INFO, f"[csv_loader] {label}: resuming after {committed_rows} committed rows")
+            chunks = skip_rows(chunks, committed_rows)
+
+    #log(Level.INFO, f'[csv_loader] Importing {target_table}')
+
+    meta = db.metadata(table_name=target_table)
+
+    table = Table(target_table, 0)
+    table.columns = meta.get_table_columns()
+    if table.columns is None or len(table.columns) == 0:
+        raise Exception(f'[csv_loader] Error: No columns found for table {target_table} in database {db.db_credentials.database}')
+
+    if csv_file.get("shadow", False):
+        shadow = db.shadow_table(target_table)
+        shadow.create(reuse=committed_rows > 0)
+        table = Table(shadow.shadow_name, 0)
+
+    writer = db.writer(table=table, buffer_size=buffer_size, load_mode=file_load_mode, write_mode=write_mode, conflict_key=conflict_key, on_error=on_error,
+                       reject_sink=reject_sink(db, csv_file, byte_range) if on_error == "reject" else None)
+    if checkpoint is not None:
+        writer.on_commit = TableCheckpoint(checkpoint, key, committed_rows)
+    start_time = time.perf_counter()
+    try:
+        for chunk_number, df in enumerate(chunks, start=1):
+            # The whole chunk is handed to the writer, which splits it into buffers and logs the ids once
+            rows = dataframe_rows(df, table.columns, replace_columns_values)
+            writer.insert_batch(rows)
+            total_valid = total_valid + len(rows)
+
+            total = total + len(df)
+            if chunk_size:
+                elapsed_time = time.perf_counter() - start_time
+                log(Level.INFO, f"[csv_loader] {label}: chunk {chunk_number} loaded, {total} rows so far ({format_rows_per_second(total, elapsed_time)} rows/s)")
+
+        writer.flush_buffer()
+        writer.commit()
+    except Exception as e:
+        writer.rollback()
+        raise e
+
+    if shadow is not None:
+        shadow.swap()
+
+    if on_error == "reject" and writer.rejected_rows:
+        log(Level.WARNING, f"[csv_loader] {label}: {writer.rejected_rows} rows rejected into {writer.reject_sink}")
+        total_valid = total_valid - writer.rejected_rows
+    total = total + committed_rows
+    total_valid = total_valid + committed_rows
+    if checkpoint is not None:
+        checkpoint.complete(key, rows=total_valid, total=total)
+
+    log(Level.DEBUG, f"[csv_loader] Total: {total}")
+    log(Level.DEBUG, f"[csv_loader] Total valid lines: {total_valid}")
+    log(Level.DEBUG, f"[csv_loader] Load mode: {file_load_mode}, throughput: {writer.rows_per_second()} rows/s")
+    if total != total_valid:
+        log(Level.ERROR, f"[csv_loader] Error: {total - total_valid} invalid lines found")
+    else:
+        log(Level.INFO, f"[csv_loader] ---------> {label} imported successfully total: {total_valid}")
+
+    return {
+        'target_table': target_table,
+        'total': total,
+        'total_valid': total_valid
+    }
+
+
+def init_csv_worker():
+    DatabaseFactory().discard_inherited_connections()
+
+
+def import_csv_file_worker(credentials, buffer_size, bulk_commit, load_mode, async_flush, checkpoint, csv_file, byte_range=None):
+    """
+    Imports one CSV file (or one byte range of it) in a worker process, with its own connection and writer.
+
+    """
+    db = DatabaseFactory().create(credentials, buffer_size=buffer_size, bulk_commit=bulk_commit, load_mode=load_mode, async_flush=async_flush)
+    try:
+        db.create_connection()
+        return import_csv_file(db, csv_file, buffer_size=buffer_size, load_mode=load_mode, byte_range=byte_range, checkpoint=checkpoint)
+    finally:
+        db.close_connection()
+        DatabaseFactory().close_all_connections()
+
+
+def file_dependencies(csv_files):
+    """
+    Resolves the depends_on entries (target table names) of each CSV file into the indexes of the files loading those tables.
+
+    """
+    tables = {}
+    for index, csv_file in enumerate(csv_files):
+        tables.setdefault(csv_file["target_table"], []).append(index)
+
+    dependencies = {}
+    for index, csv_file in enumerate(csv_files):
+        dependencies[index] = []
+        for table in csv_file.get("depends_on") or []:
+            if table not in tables:
+                raise Exception(f'[csv_loader] Error: {csv_file["path"]} depends on table {table}, which is not loaded by any CSV file')
+            dependencies[index].extend(i for i in tables[table] if i != index)
+    return dependencies
+
+
+def file_byte_ranges(csv_file):
+    """
+    Returns the byte ranges of a file with the split option, as (start, end, column names) tuples,
+    or [None] when the file is imported as a whole.
+
+    """
+    split = csv_file.get("split", None)
+    if not split or split <= 1:
+        return [None]
+
+    path = csv_file["path"]
+    encoding = csv_file.get("encoding", "utf-8")
+    delimiter = csv_file.get("delimiter", ",")
+    quotechar = csv_file.get("quotechar", '"')
+    header_end, ranges = split_csv_file(path, split, quotechar, encoding)
+    if len(ranges) == 0:
+        return [None]
+    names = read_csv_header(path, header_end, delimiter, quotechar, encoding)
+    log(Level.DEBUG, f'[csv_loader] {path} split into {len(ranges)} byte ranges')
+    return [(start, end, names) for start, end in ranges]
+
+
+def combine_file_results(target_table, task_results):
+    """
+    Combines the results of the byte ranges of a file into the result of one logical import.
+
+    """
+    elapsed_time = max(task_result.elapsed_time for task_result in task_results)
+    for status in ("failed", "skipped"):
+        errors = [task_result.error for task_result in task_results if task_result.status == status]
+        if errors:
+            return TaskResult(target_table, status, error=errors[0], elapsed_time=elapsed_time)
+
+    result = {
+        'target_table': target_table,
+        'total': sum(task_result.result['total'] for task_result in task_results),
+        'total_valid': sum(task_result.result['total_valid'] for task_result in task_results),
+        'parts': len(task_results)
+    }
+    return TaskResult(target_table, "success", result=result, elapsed_time=elapsed_time)
+
+
+def parallel_csv_importer(credentials, buffer_size, bulk_commit, csv_files, load_mode, parallelism, async_flush=False, checkpoint=None):
+    """
+    Imports the CSV files concurrently on a pool of parallelism worker processes. A file starts once
+    the files loading the tables listed in its depends_on were imported; files depending on a failed
+    file are skipped. Files with the split option are imported as several byte ranges, each one by
+    its own worker, and reported as one import. A per-file summary is logged and an exception is
+    raised if any file failed.
+
+    """
+    dependencies = file_dependencies(csv_files)
+    byte_ranges = [file_byte_ranges(csv_file) for csv_file in csv_files]
+    file_tasks = {index: [(index, part) for part in range(len(ranges))] for index, ranges in enumerate(byte_ranges)}
+
+    scheduler = DependencyScheduler()
+    for index, csv_file in enumerate(csv_files):
+        depends_on = [task for dependency in dependencies[index] for task in file_tasks[dependency]]
+        for part, byte_range in enumerate(byte_ranges[index]):
+            scheduler.add_task((index, part), import_csv_file_worker,
+                               args=(credentials, buffer_size, bulk_commit, load_mode, async_flush, checkpoint, csv_file, byte_range),
+                               depends_on=depends_on)
+
+    log(Level.DEBUG, f'[csv_loader] Starting parallel CSV import with {parallelism} workers')
+    with ProcessPoolExecutor(max_workers=parallelism, initializer=init_csv_worker) as executor:
+        task_results = scheduler.run(executor)
+
+    results = {}
+    failed = 0
+    log(Level.INFO, '[csv_loader] Summary:')
+    for index, csv_file in enumerate(csv_files):
+        task_result = combine_file_results(csv_file["target_table"], [task_results[task] for task in file_tasks[index]])
+        results[index] = task_result
+        elapsed_time = round(task_result.elapsed_time, 2)
+        if task_result.status == "success":
+            log(Level.INFO, f'[csv_loader]   {csv_file["path"]} -> {csv_file["target_table"]}: success, {task_result.result["total_valid"]} rows in {elapsed_time}s')
+        else:
+            failed += 1
+            log(Level.ERROR, f'[csv_loader]   {csv_file["path"]} -> {csv_file["target_table"]}: {task_result.status} ({task_result.error})')
+    if failed > 0:
+        raise Exception(f'[csv_loader] {failed} of {len(csv_files)} CSV files were not imported')
+    return results
+
+
+def csv_importer(credentials=None, buffer_size=1000, bulk_commit=False, csv_files=None, load_mode="insert", parallelism=1, async_flush=False, resume=False, bulk_load=None):
     """
     Imports data from CSV files into a PostgreSQL database.
 
@@ -19,66 +320,58 @@ def csv_importer(credentials=None, buffer_size=1000, bulk_commit=False, csv_file
             - delimiter (str, optional): The delimiter used in the CSV file. Defaults to ",".
             - quotechar (str, optional): The character used to quote fields in the CSV file. Defaults to '"'.
             - replace_columns_values (dict, optional): A dictionary of column names and their replacement values. Defaults to None.
+            - load_mode (str, optional): Overrides the global load_mode for this file.
+            - write_mode (str, optional): "insert" (default) or "upsert" (rows with an existing key are updated).
+            - conflict_key (list, optional): The columns identifying a row when upserting. Defaults to the primary key.
+            - on_error (str, optional): "abort" (default, a failing row aborts the file) or "reject" (failing rows are set aside and the others loaded).
+            - reject_file (str, optional): The CSV file receiving the rejected rows. Defaults to private/rejects/<target_table>.csv.
+            - reject_table (str, optional): A table of the target database receiving the rejected rows instead of a file. Defaults to None.
+            - shadow (bool, optional): Loads the file into an UNLOGGED copy of the table, swapped in once loaded. Defaults to False.
+            - chunk_size (int, optional): Streams the file in chunks of this many rows instead of reading it whole. Defaults to None.
+            - depends_on (list, optional): Target tables that must be loaded before this file (parallel mode). Defaults to None.
+            - split (int, optional): Splits the file into this many byte ranges, aligned to record boundaries, imported by separate workers. Defaults to None.
+        load_mode (str, optional): How rows are sent to the database, "insert" or "copy". Defaults to "insert".
+        parallelism (int, optional): The number of worker processes loading files concurrently, each with its own connection. Defaults to 1 (files are loaded one after another, in order).
+        async_flush (bool, optional): Whether full buffers are written by a background thread while the next rows are converted. Defaults to False.
+        resume (bool, optional): Whether to resume from the checkpoints of the previous run instead of starting over. Defaults to False.
+        bulk_load (dict, optional): When set, the secondary indexes and foreign keys of the target tables are dropped
+            before the import and rebuilt after it, by bulk_load['workers'] connections (default 4). Defaults to None.
     """
     if csv_files is None:
         raise Exception('[csv_loader] No CSV files found')
 
-    
+    if bulk_load:
+        tables = [csv_file["target_table"] for csv_file in csv_files]
+        workers = bulk_load.get("workers", 4) if isinstance(bulk_load, dict) else 4
+        with DatabaseFactory().create(credentials).bulk_load(tables, workers=workers):
+            csv_importer(credentials, buffer_size, bulk_commit, csv_files, load_mode, parallelism, async_flush, resume)
+        return
+
+    checkpoint = CheckpointStore("csv_loader")
+    if not resume:
+        checkpoint.clear()
+
+    if parallelism and parallelism > 1:
+        parallel_csv_importer(credentials, buffer_size, bulk_commit, csv_files, load_mode, parallelism, async_flush, checkpoint)
+        return
+
     if bulk_commit:
         log(Level.DEBUG, f'[csv_loader] Bulk commit enabled with buffer size: {buffer_size}')
-    
-    db = DatabaseFactory().create(credentials, buffer_size=buffer_size, bulk_commit=bulk_commit)
-    
+
+    db = DatabaseFactory().create(credentials, buffer_size=buffer_size, bulk_commit=bulk_commit, load_mode=load_mode, async_flush=async_flush)
+
     try:
         db.create_connection()
-        
+
         log(Level.DEBUG, '[csv_loader] Starting CSV import')
-        writer = None
         for csv_file in csv_files:
-            path = csv_file["path"]
-            target_table = csv_file["target_table"]
-            encoding = csv_file.get("encoding", "utf-8")
-            delimiter = csv_file.get("delimiter", ",")
-            quotechar = csv_file.get("quotechar", '"')
-            replace_columns_values = csv_file.get("replace_columns_values", None)
-            
-            total_valid = 0
-            total = 0
-            
-            #log(Level.INFO, f'[csv_loader] Importing {target_table}')
-            
-            df = pd.read_csv(path, delimiter=delimiter, quotechar=quotechar, encoding=encoding)
-
-            meta = db.metadata(table_name=target_table)
-            
-            table = Table(target_table, 0)
-            table.columns = meta.get_table_columns()
-            if table.columns is None or len(table.columns) == 0:
-                raise Exception(f'[csv_loader] Error: No columns found for table {target_table} in database {credentials.database}')    
-            
-            writer = db.writer(table=table)
-              
-            for index, row in df.iterrows():
-                p_row = process_row(row, table.columns, replace_columns_values)
-                writer.insert(p_row)
-                total_valid = total_valid + 1
-            
-            total = len(df)
-            
-            writer.flush_buffer()
-            writer.commit()
-            
-            log(Level.DEBUG, f"[csv_loader] Total: {total}")
-            log(Level.DEBUG, f"[csv_loader] Total valid lines: {total_valid}")
-            if total != total_valid:
-                log(Level.ERROR, f"[csv_loader] Error: {total - total_valid} invalid lines found")
+            split = csv_file.get("split", None)
+            if split and split > 1:
+                # the byte ranges of a split file are imported by their own pool of workers
+                parallel_csv_importer(credentials, buffer_size, bulk_commit, [dict(csv_file, depends_on=None)], load_mode, split, async_flush, checkpoint)
             else:
-                log(Level.INFO, f"[csv_loader] ---------> {target_table} imported successfully total: {total_valid}")
-                    
-    except Exception as e:
-        if writer:
-            writer.rollback()
-        raise e
+                import_csv_file(db, csv_file, buffer_size=buffer_size, load_mode=load_mode, checkpoint=checkpoint)
+
     finally:
         if db is not None:
             db.close_connection()
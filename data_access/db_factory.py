@@ -1,4 +1,5 @@
 from data_access.postgresql_facade import PostgreSQLFacade
+from data_access.postgresql_pool import PostgreSQLPoolManager
 
 class DatabaseFactory:
     _instance = None
@@ -7,12 +8,24 @@ class DatabaseFactory:
             cls._instance = super(DatabaseFactory, cls).__new__(cls)
         return cls._instance
     
-    def create(self, db_credentials, table=None, table_name=None, buffer_size=1000, bulk_commit=False, query=None):
+    def create(self, db_credentials, table=None, table_name=None, buffer_size=1000, bulk_commit=False, query=None, load_mode="insert", async_flush=False, write_mode="insert", conflict_key=None):
         if db_credentials.type == "postgresql":
-            return PostgreSQLFacade(db_credentials, table=table, table_name=table_name, buffer_size=buffer_size, bulk_commit=bulk_commit, query=query)
+            return PostgreSQLFacade(db_credentials, table=table, table_name=table_name, buffer_size=buffer_size, bulk_commit=bulk_commit, query=query, load_mode=load_mode, async_flush=async_flush, write_mode=write_mode, conflict_key=conflict_key)
         else:
             raise Exception("Unsupported database type")
         
+    def configure_pool(self, **settings):
+        PostgreSQLPoolManager().configure(**settings)
+
+    def pool_stats(self):
+        return PostgreSQLFacade.pool_stats()
+
+    def discard_inherited_connections(self):
+        PostgreSQLFacade.discard_inherited_connections()
+
+    def release_all_connections(self):
+        PostgreSQLFacade.release_all_connections()
+        
     def close_all_connections(self):
         PostgreSQLFacade.close_all_connections()
         
\ No newline at end of file
@@ -0,0 +1,110 @@
+import time
+import threading
+from data_access.metadata_models import Column
+
+
+class MetadataCache:
+    """
+    A singleton, process-wide cache of table columns keyed by (credentials name, schema, table).
+
+    Attributes:
+        entries (dict): The cached columns, as (fetched_at, columns) tuples.
+        ttl (float): Seconds an entry stays valid (None keeps entries until they are invalidated).
+        hits (int): The number of lookups answered by the cache.
+        misses (int): The number of lookups that had to query the database.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetadataCache, cls).__new__(cls)
+            cls._instance.entries = {}
+            cls._instance.lock = threading.Lock()
+            cls._instance.ttl = 300
+            cls._instance.hits = 0
+            cls._instance.misses = 0
+        return cls._instance
+
+    def configure(self, ttl=300):
+        self.ttl = ttl
+
+    def is_expired(self, fetched_at):
+        return self.ttl is not None and time.time() - fetched_at > self.ttl
+
+    def get(self, credentials_name, schema, table):
+        """
+        Returns a copy of the cached columns, or None when the entry is missing or expired.
+
+        """
+        key = (credentials_name, schema, table)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or self.is_expired(entry[0]):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+            return list(entry[1])
+
+    def put(self, credentials_name, schema, table, columns, fetched_at=None):
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self.lock:
+            self.entries[(credentials_name, schema, table)] = (fetched_at, list(columns))
+
+    def invalidate(self, credentials_name=None, schema=None, table=None):
+        """
+        Removes the entries matching all the given filters (all entries when no filter is given).
+
+        """
+        with self.lock:
+            for key in list(self.entries):
+                if credentials_name is not None and key[0] != credentials_name:
+                    continue
+                if schema is not None and key[1] != schema:
+                    continue
+                if table is not None and key[2] != table:
+                    continue
+                del self.entries[key]
+
+    def to_dict(self):
+        """
+        Serializes the valid entries so they can be saved as a snapshot.
+
+        """
+        with self.lock:
+            entries = list(self.entries.items())
+        return {
+            'entries': [
+                {
+                    'credentials': credentials_name,
+                    'schema': schema,
+                    'table': table,
+                    'fetched_at': fetched_at,
+                    'columns': [
+                        {'name': c.name, 'data_type': c.data_type, 'nullable': c.nullable, 'default': c.default}
+                        for c in columns
+                    ],
+                }
+                for (credentials_name, schema, table), (fetched_at, columns) in entries
+                if not self.is_expired(fetched_at)
+            ]
+        }
+
+    def load_dict(self, data):
+        """
+        Loads the entries of a snapshot, skipping the expired ones.
+
+        """
+        loaded = 0
+        for entry in (data or {}).get('entries', []):
+            if self.is_expired(entry['fetched_at']):
+                continue
+            columns = [Column(**column) for column in entry['columns']]
+            self.put(entry['credentials'], entry['schema'], entry['table'], columns, fetched_at=entry['fetched_at'])
+            loaded += 1
+        return loaded
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
@@ -8,17 +8,19 @@ class Table:
         columns (list): A list of Column objects representing the columns of the table.
         constraints (list): A list of Constraint objects representing the constraints of the table.
         indexes (list): A list of Index objects representing the indexes of the table.
+        size_bytes (int): The total size of the table on disk, including indexes and TOAST data.
     """
 
-    def __init__(self, name, num_tuples, columns=None, constraints=None, indexes=None):
+    def __init__(self, name, num_tuples, columns=None, constraints=None, indexes=None, size_bytes=None):
         self.name = name
         self.num_tuples = num_tuples
         self.columns = columns or []
         self.constraints = constraints or []
         self.indexes = indexes or []
+        self.size_bytes = size_bytes
     
     def __str__(self):
-        return f"Table(name={self.name}, num_tuples={self.num_tuples}, columns={self.columns}, constraints={self.constraints}, indexes={self.indexes})"
+        return f"Table(name={self.name}, num_tuples={self.num_tuples}, size_bytes={self.size_bytes}, columns={self.columns}, constraints={self.constraints}, indexes={self.indexes})"
 
 class Column:
     """
@@ -50,14 +52,21 @@ class Constraint:
         referenced_table_schema (str): The schema of the referenced table.
         referenced_table_name (str): The name of the referenced table.
         referenced_column_name (str): The name of the referenced column.
+        constraint_type (str): The type of the constraint ("p" primary key, "f" foreign key, "u" unique).
+        definition (str): The SQL definition of the constraint (as returned by pg_get_constraintdef).
     """
 
-    def __init__(self, name, column_name, referenced_table_schema, referenced_table_name, referenced_column_name):
+    def __init__(self, name, column_name, referenced_table_schema, referenced_table_name, referenced_column_name, constraint_type=None, definition=None):
         self.name = name
         self.column_name = column_name
         self.referenced_table_schema = referenced_table_schema
         self.referenced_table_name = referenced_table_name
         self.referenced_column_name = referenced_column_name
+        self.constraint_type = constraint_type
+        self.definition = definition
+
+    def __str__(self):
+        return f"Constraint(name={self.name}, type={self.constraint_type}, column_name={self.column_name}, references={self.referenced_table_schema}.{self.referenced_table_name}.{self.referenced_column_name})"
 
 class Index:
     """
@@ -69,10 +78,17 @@ class Index:
         nullable (bool): Whether the column can contain null values.
         index_type (str): The type of the index.
         non_unique (bool): Whether the index allows non-unique values.
+        definition (str): The SQL definition of the index (as returned by pg_get_indexdef).
+        constraint_name (str): The name of the constraint backed by the index (primary key or unique), if any.
     """
-    def __init__(self, name, column_name, nullable, index_type, non_unique):   
+    def __init__(self, name, column_name, nullable, index_type, non_unique, definition=None, constraint_name=None):   
         self.name = name
         self.column_name = column_name
         self.nullable = nullable
         self.index_type = index_type
-        self.non_unique = non_unique
\ No newline at end of file
+        self.non_unique = non_unique
+        self.definition = definition
+        self.constraint_name = constraint_name
+
+    def __str__(self):
+        return f"Index(name={self.name}, column_name={self.column_name}, index_type={self.index_type}, non_unique={self.non_unique})"
\ No newline at end of file
@@ -0,0 +1,219 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from configs.checkpoint_manager import CheckpointStore
+from system_logging.log_manager import log, Level
+
+BULK_LOAD_CHECKPOINTS = "bulk_load"
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def add_not_valid(definition):
+    # pg_get_constraintdef already ends with NOT VALID for a foreign key that was never validated
+    return definition if definition.rstrip().endswith("NOT VALID") else f"{definition} NOT VALID"
+
+
+def create_index_if_not_exists(definition):
+    return re.sub(r"^CREATE (UNIQUE )?INDEX ", r"CREATE \1INDEX IF NOT EXISTS ", definition)
+
+
+class PostgreSQLBulkLoadSession:
+    """
+    A class to load tables without maintaining their secondary indexes and foreign keys.
+
+    begin() reads the definitions of the non-unique indexes that do not back a constraint and of the
+    foreign keys of the tables, saves them under private/checkpoints/bulk_load (one entry per table) and
+    drops them. finish() recreates the indexes on workers connections at once, adds the foreign keys back
+    as NOT VALID and validates those that were valid before (without blocking writes), then runs ANALYZE. Primary keys, unique
+    constraints and unique indexes are kept, so duplicates are still rejected during the load.
+
+    The saved definitions are only removed once they are restored, so a session interrupted before
+    finish() is completed by the next session on the same tables (or by restore()).
+
+    Attributes:
+        pool (PostgreSQLConnectionPool): The pool providing the connections.
+        credentials_name (str): The name of the credentials, part of the saved entries keys.
+        schema (str): The schema of the tables.
+        tables (list): The names of the tables being loaded.
+        workers (int): The number of connections rebuilding the indexes at the same time.
+        definitions (dict): The dropped definitions by table, as {'indexes': [...], 'foreign_keys': [...]}.
+            Foreign keys also record whether they were validated.
+    """
+    INDEXES_SQL = """
+        SELECT c.relname, i.relname, pg_get_indexdef(ix.indexrelid)
+        FROM pg_catalog.pg_index ix
+        JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = ANY(%s) AND NOT ix.indisunique
+        AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con WHERE con.conindid = ix.indexrelid)
+        ORDER BY c.relname, i.relname
+    """
+    FOREIGN_KEYS_SQL = """
+        SELECT c.relname, con.conname, pg_get_constraintdef(con.oid), con.convalidated
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = ANY(%s) AND con.contype = 'f'
+        ORDER BY c.relname, con.conname
+    """
+
+    def __init__(self, pool, credentials_name, tables, schema=None, workers=4, checkpoint=None):
+        self.pool = pool
+        self.credentials_name = credentials_name
+        self.schema = schema or "public"
+        self.tables = list(dict.fromkeys(tables))
+        self.workers = max(1, workers)
+        self.checkpoint = checkpoint or CheckpointStore(BULK_LOAD_CHECKPOINTS)
+        self.definitions = {}
+
+    def entry_key(self, table_name):
+        return f"{self.credentials_name}.{self.schema}.{table_name}"
+
+    def qualified_name(self, name):
+        return f"{quote_identifier(self.schema)}.{quote_identifier(name)}"
+
+    def run(self, statements, connection=None):
+        """
+        Runs the statements in autocommit mode, on the given connection or on one checked out from the pool.
+
+        """
+        postgresql = connection or self.pool.checkout()
+        psycopg2_connection = postgresql.connection
+        try:
+            psycopg2_connection.rollback()
+            psycopg2_connection.autocommit = True
+            cursor = psycopg2_connection.cursor()
+            try:
+                for sql in statements:
+                    log(Level.SQL, f"Query: {sql}")
+                    cursor.execute(sql)
+            finally:
+                cursor.close()
+        finally:
+            psycopg2_connection.autocommit = False
+            if connection is None:
+                self.pool.checkin(postgresql)
+
+    def fetch(self, connection, sql):
+        cursor = connection.connection.cursor()
+        try:
+            log(Level.SQL, f"Query: {sql} [{self.schema}: {self.tables}]")
+            cursor.execute(sql, (self.schema, self.tables))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def read_definitions(self, connection):
+        """
+        Returns the definitions saved by an interrupted session merged with those found in the catalog, by table.
+
+        """
+        definitions = {}
+        for table_name in self.tables:
+            saved = self.checkpoint.get(self.entry_key(table_name)) or {}
+            definitions[table_name] = {
+                'indexes': {item['name']: {'name': item['name'], 'definition': item['definition']} for item in saved.get('indexes', [])},
+                'foreign_keys': {item['name']: {'name': item['name'], 'definition': item['definition'], 'validated': item.get('validated', not item['definition'].rstrip().endswith("NOT VALID"))}
+                                 for item in saved.get('foreign_keys', [])},
+            }
+        for table_name, name, definition in self.fetch(connection, self.INDEXES_SQL):
+            definitions[table_name]['indexes'][name] = {'name': name, 'definition': definition}
+        for table_name, name, definition, validated in self.fetch(connection, self.FOREIGN_KEYS_SQL):
+            definitions[table_name]['foreign_keys'][name] = {'name': name, 'definition': definition, 'validated': validated}
+        return {table_name: {kind: list(items.values()) for kind, items in table_definitions.items()}
+                for table_name, table_definitions in definitions.items()}
+
+    def begin(self):
+        """
+        Saves and drops the secondary indexes and foreign keys of the tables.
+
+        """
+        connection = self.pool.checkout()
+        try:
+            self.definitions = self.read_definitions(connection)
+            statements = []
+            for table_name, definitions in self.definitions.items():
+                self.checkpoint.save(self.entry_key(table_name), status="dropped", **definitions)
+                for foreign_key in definitions['foreign_keys']:
+                    statements.append(f"ALTER TABLE {self.qualified_name(table_name)} DROP CONSTRAINT IF EXISTS {quote_identifier(foreign_key['name'])}")
+                for index in definitions['indexes']:
+                    statements.append(f"DROP INDEX IF EXISTS {self.qualified_name(index['name'])}")
+            self.run(statements, connection=connection)
+        finally:
+            self.pool.checkin(connection)
+        dropped = sum(len(definitions['indexes']) + len(definitions['foreign_keys']) for definitions in self.definitions.values())
+        log(Level.INFO, f"Bulk load of {', '.join(self.tables)}: {dropped} indexes and foreign keys dropped")
+
+    def run_parallel(self, tasks):
+        """
+        Runs each list of statements on its own connection, workers at a time. Returns the errors.
+
+        """
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run, statements) for statements in tasks]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    log(Level.ERROR, f"Error rebuilding after the bulk load: {e}")
+                    errors.append(e)
+        return errors
+
+    def finish(self):
+        """
+        Recreates the indexes in parallel, adds the foreign keys back and validates them, and analyzes the tables.
+        The saved definitions of a table are removed once it is fully restored.
+
+        """
+        indexes = [[create_index_if_not_exists(index['definition'])]
+                   for definitions in self.definitions.values() for index in definitions['indexes']]
+        errors = self.run_parallel(indexes)
+
+        connection = self.pool.checkout()
+        try:
+            existing = {(table_name, name) for table_name, name, _, _ in self.fetch(connection, self.FOREIGN_KEYS_SQL)}
+            statements = [f"ALTER TABLE {self.qualified_name(table_name)} ADD CONSTRAINT {quote_identifier(foreign_key['name'])} {add_not_valid(foreign_key['definition'])}"
+                          for table_name, definitions in self.definitions.items() for foreign_key in definitions['foreign_keys']
+                          if (table_name, foreign_key['name']) not in existing]
+            self.run(statements, connection=connection)
+        finally:
+            self.pool.checkin(connection)
+        # Foreign keys that were NOT VALID before the load are left so
+        validations = [[f"ALTER TABLE {self.qualified_name(table_name)} VALIDATE CONSTRAINT {quote_identifier(foreign_key['name'])}"]
+                       for table_name, definitions in self.definitions.items() for foreign_key in definitions['foreign_keys']
+                       if foreign_key['validated']]
+        errors += self.run_parallel(validations)
+        errors += self.run_parallel([[f"ANALYZE {self.qualified_name(table_name)}"] for table_name in self.tables])
+
+        if errors:
+            raise Exception(f"{len(errors)} indexes, foreign keys or analyzes failed after the bulk load, "
+                            f"the definitions are kept under private/checkpoints/{BULK_LOAD_CHECKPOINTS}: {errors[0]}")
+        for table_name in self.tables:
+            self.checkpoint.delete(self.entry_key(table_name))
+        log(Level.INFO, f"Bulk load of {', '.join(self.tables)}: {len(indexes)} indexes and {len(statements)} foreign keys rebuilt")
+
+    def restore(self):
+        """
+        Restores the definitions saved by an interrupted session, without loading anything.
+
+        """
+        connection = self.pool.checkout()
+        try:
+            self.definitions = self.read_definitions(connection)
+        finally:
+            self.pool.checkin(connection)
+        self.finish()
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The schema is restored even when the load failed
+        self.finish()
+        return False
@@ -1,11 +1,26 @@
+import os
+import re
+import time
+import queue
+import threading
 import psycopg2
 import psycopg2.extras
-from psycopg2.extras import RealDictCursor
 from psycopg2.extensions import adapt
 
 from system_logging.log_manager import log, Level
-from system_logging.ids_log_manager import log_id
-from data_access.utils import format_reserved_word
+from system_logging.ids_log_manager import log_id, log_ids
+from data_access.metadata_cache import MetadataCache
+from data_access.postgresql_metadata_access import PostgreSQLTableManager
+from data_access.postgresql_bulk_load import quote_identifier
+from data_access.utils import format_reserved_word, rows_to_copy_buffer, format_rows_per_second, unique_timestamp_string_id
+
+LOAD_MODES = ("insert", "copy")
+WRITE_MODES = ("insert", "upsert")
+ERROR_MODES = ("abort", "reject")
+# Errors caused by the values of some rows, isolated when on_error is "reject"
+ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+COPY_FORMATS = ("text", "binary")
+COPY_PIPE_BUFFER_SIZE = 1024 * 1024
 
 
 def postgres_execute_DDL(postgresql, sql):
@@ -18,6 +33,8 @@ def postgres_execute_DDL(postgresql, sql):
         cursor = connection.cursor()
         log(Level.SQL, f"Query: {sql}")
         cursor.execute(sql)
+        # Cached table metadata may no longer match the catalog
+        MetadataCache().invalidate(credentials_name=postgresql.db_credentials.name)
     except Exception as e:
         log(Level.ERROR, f"Error executing PostgreSQL DDL query")
         raise e
@@ -51,6 +68,76 @@ def postgres_all_tables_names(postgresql):
         if cursor:
             cursor.close()
 
+def postgres_insert_select(postgresql, table_name, query, schema="", columns=None):
+    """
+    Runs INSERT INTO table SELECT ... FROM (query) on the server, so the rows never leave the database.
+    columns maps source to target names (a list uses the same names on both sides); without it
+    the query columns are inserted by position. Returns the number of inserted rows.
+
+    """
+    if schema:
+        schema += "."
+    if isinstance(columns, (list, tuple)):
+        columns = {column: column for column in columns}
+    if columns:
+        target_columns = ', '.join(format_reserved_word(column) for column in columns.values())
+        source_columns = ', '.join(format_reserved_word(column) for column in columns)
+        sql = f"INSERT INTO {schema}{table_name} ({target_columns}) SELECT {source_columns} FROM ({query}) AS source"
+    else:
+        sql = f"INSERT INTO {schema}{table_name} {query}"
+    cursor = None
+    try:
+        start_time = time.perf_counter()
+        cursor = postgresql.connection.cursor()
+        log(Level.SQL, f"Query: {sql}")
+        cursor.execute(sql)
+        rows = cursor.rowcount
+        elapsed_time = time.perf_counter() - start_time
+        log(Level.DEBUG, f"Inserted {rows} rows into {schema}{table_name} "
+            f"(insert select: {format_rows_per_second(rows, elapsed_time)} rows/s).")
+        return rows
+    except Exception as e:
+        log(Level.ERROR, f"Error running INSERT ... SELECT into {schema}{table_name}")
+        raise e
+    finally:
+        if cursor:
+            cursor.close()
+
+def postgres_max_value(postgresql, query, column):
+    """
+    Returns the maximum value of column in the result of query (None when it returns no rows).
+
+    """
+    sql = f"SELECT MAX({format_reserved_word(column)}) FROM ({query}) AS source"
+    cursor = None
+    try:
+        cursor = postgresql.connection.cursor()
+        log(Level.SQL, f"Query: {sql}")
+        cursor.execute(sql)
+        return cursor.fetchone()[0]
+    except Exception as e:
+        log(Level.ERROR, f"Error getting the maximum value of {column} from PostgreSQL")
+        raise e
+    finally:
+        if cursor:
+            cursor.close()
+
+def postgres_delta_query(query, column, lower=None, upper=None):
+    """
+    Wraps query to return only the rows whose column is greater than lower and at most upper
+    (a bound left as None is not applied).
+
+    """
+    column = format_reserved_word(column)
+    conditions = []
+    if lower is not None:
+        conditions.append(f"{column} > {adapt(lower).getquoted().decode()}")
+    if upper is not None:
+        conditions.append(f"{column} <= {adapt(upper).getquoted().decode()}")
+    if not conditions:
+        return query
+    return f"SELECT * FROM ({query}) AS source WHERE {' AND '.join(conditions)}"
+
 def postgres_commit(postgresql):
     try:
         postgresql.connection.commit()
@@ -58,6 +145,15 @@ def postgres_commit(postgresql):
         log(Level.ERROR, f"Error committing data to PostgreSQL")
         raise e
 
+def staging_table_name(table_name):
+    """
+    Returns the quoted name of a new staging table for a table: the table name without its schema or
+    quotes, with the characters that are not letters, digits or underscores replaced.
+
+    """
+    base = re.sub(r"\W", "_", table_name.split(".")[-1].strip('"'))[:40]
+    return quote_identifier(f"staging_{base}_{unique_timestamp_string_id()}")
+
 class PostgreSQLWriter:
     """
     A class to handle writing data to a PostgreSQL table.
@@ -73,9 +169,51 @@ class PostgreSQLWriter:
         insert_sql (str): The SQL insert statement template.
         cursor (psycopg2.cursor): The cursor for executing SQL statements.
         template (str): The template for inserting values.
+        load_mode (str): How buffers are sent to the database: "insert" (execute_values) or "copy" (COPY ... FROM STDIN).
+        copy_sql (str): The SQL COPY statement used when load_mode is "copy".
+        total_rows (int): The number of rows flushed by this writer.
+        total_time (float): The time, in seconds, spent flushing buffers.
+        async_flush (bool): Whether full buffers are written by a background thread while the caller keeps filling a new one.
+        max_pending_buffers (int): The maximum number of full buffers waiting for the background thread.
+        committed_rows (int): The number of rows flushed by this writer and committed.
+        on_commit (callable): Called with the writer after each successful commit (used for checkpoints).
+        write_mode (str): "insert" (plain inserts) or "upsert" (each buffer is loaded into a temporary staging
+            table and merged into the table with one INSERT ... ON CONFLICT DO UPDATE).
+        conflict_key (list): The columns identifying a row when upserting. Defaults to the primary key of the table.
+        staging_table (str): The temporary table receiving the buffers when upserting.
+        coordinator (PostgreSQLTransactionCoordinator): When set, decides when the flushed buffers are committed,
+            together with those of the other writers sharing the connection (instead of bulk_commit).
+        on_error (str): "abort" (a failing buffer raises) or "reject" (the buffer is split until the failing
+            rows are found; they are handed to reject_sink and the other rows are written).
+        reject_sink (RejectFile | PostgreSQLRejectTable): Receives the rejected rows with their error.
+        rejected_rows (int): The number of rows rejected by this writer.
     """
 
-    def __init__(self, postgresql, table, schema="", buffer_size=100, bulk_commit=True):
+    def __init__(self, postgresql, table, schema="", buffer_size=100, bulk_commit=True, load_mode="insert", async_flush=False, max_pending_buffers=2, write_mode="insert", conflict_key=None, on_error="abort"):
+        if load_mode not in LOAD_MODES:
+            raise Exception(f"Unsupported load mode '{load_mode}', expected one of {LOAD_MODES}")
+        if write_mode not in WRITE_MODES:
+            raise Exception(f"Unsupported write mode '{write_mode}', expected one of {WRITE_MODES}")
+        if on_error not in ERROR_MODES:
+            raise Exception(f"Unsupported error mode '{on_error}', expected one of {ERROR_MODES}")
+        self.on_error = on_error
+        self.reject_sink = None
+        self.rejected_rows = 0
+        self.load_mode = load_mode
+        self.write_mode = write_mode
+        self.conflict_key = conflict_key
+        self.staging_table = staging_table_name(table.name)
+        self.merge_sql = None
+        self.async_flush = async_flush
+        self.max_pending_buffers = max_pending_buffers
+        self.pending_buffers = None
+        self.flusher = None
+        self.flush_error = None
+        self.coordinator = None
+        self.committed_rows = 0
+        self.on_commit = None
+        self.total_rows = 0
+        self.total_time = 0.0
         self.bulk_commit = bulk_commit
         self.postgresql = postgresql
         self.table = table
@@ -92,7 +230,11 @@ class PostgreSQLWriter:
         
     def set_columns(self, columns):
         self.column_names = ', '.join([format_reserved_word(column) for column in columns])
-        self.insert_sql = f"INSERT INTO {self.schema}{self.table.name} ({self.column_names}) VALUES %s"
+        # When upserting, buffers are loaded into the staging table and merged from there
+        target = self.staging_table if self.write_mode == "upsert" else f"{self.schema}{self.table.name}"
+        self.insert_sql = f"INSERT INTO {target} ({self.column_names}) VALUES %s"
+        self.copy_sql = f"COPY {target} ({self.column_names}) FROM STDIN"
+        self.merge_sql = None
         parts = []
         for column in columns:
             parts.append("%s")
@@ -104,6 +246,7 @@ class PostgreSQLWriter:
         Inserts a row of data into the buffer. If the buffer size is reached, flushes the buffer.
 
         """
+        self.raise_flush_error()
         if isinstance(data, dict):
             data = [data[column.name] for column in self.table.columns]
         self.buffer.append(data)
@@ -113,44 +256,246 @@ class PostgreSQLWriter:
             return self.flush_buffer()
         return False
 
+    def insert_batch(self, rows, logging_ids=True, logging_ids_key=None):
+        """
+        Inserts a batch of rows (dicts, sequences or a pandas DataFrame with the column names) into the buffer,
+        flushing it every buffer_size rows. Ids are logged with one call per batch instead of one per row.
+
+        """
+        self.raise_flush_error()
+        columns = self.orderned_columns or [column.name for column in self.table.columns]
+        if hasattr(rows, "to_numpy"):
+            missing = [column for column in columns if column not in rows.columns]
+            if missing:
+                raise KeyError(f"DataFrame has no column {', '.join(missing)} for table {self.table.name}")
+            frame = rows[columns]
+            frame = frame.astype(object).where(frame.notna(), None)
+            rows = list(frame.itertuples(index=False, name=None))
+        elif rows and isinstance(rows[0], dict):
+            rows = [[row[column] for column in columns] for row in rows]
+        if not rows:
+            return False
+        if logging_ids:
+            log_ids(self.schema, self.table, columns, rows, logging_ids_key=logging_ids_key)
+
+        flushed = False
+        position = 0
+        while position < len(rows):
+            space = max(self.buffer_size - len(self.buffer), 1)
+            self.buffer.extend(rows[position:position + space])
+            position += space
+            if len(self.buffer) >= self.buffer_size:
+                flushed = self.flush_buffer() or flushed
+        return flushed
+
     def flush_buffer(self):
         """
-        Flushes the buffer by inserting all buffered rows into the PostgreSQL table.
+        Flushes the buffer by inserting all buffered rows into the PostgreSQL table, and returns whether
+        the rows were committed. With async_flush the buffer is handed to the background thread instead,
+        waiting while max_pending_buffers buffers are already queued, and False is returned since nothing
+        is committed yet (on_commit reports the commits of the thread).
         
         """
         if not self.buffer or len(self.buffer) == 0:
             return False
+        if self.async_flush:
+            self.raise_flush_error()
+            buffer, self.buffer = self.buffer, []
+            self.start_flusher()
+            self.pending_buffers.put(buffer)
+            if self.coordinator is not None:
+                return self.coordinator.flushed(self, len(buffer))
+            return False
+        rows = len(self.buffer)
         try:
             self.cursor = self.postgresql.connection.cursor()
-            psycopg2.extras.execute_values(self.cursor, self.insert_sql, self.buffer, template=self.template)
-            num_inserted_rows = len(self.buffer)
-            log(Level.DEBUG, f"Inserted {num_inserted_rows} rows into {self.schema}{self.table.name}.")
-            #log(Level.SQL, f"Query: {self.format_sql_log(self.insert_sql, self.buffer)}")
-            log(Level.SQL, f"Query: {self.insert_sql} {self.buffer}")
+            self.write_buffer(self.cursor, self.buffer)
             self.buffer.clear()
-        except Exception as e:
-            log(Level.DEBUG, f"Error inserting data into PostgreSQL, table: {self.table.name}")
-            raise e
         finally:
             self.close_cursor()
+        if self.coordinator is not None:
+            return self.coordinator.flushed(self, rows)
         if self.bulk_commit:
             self.commit()
             return True
 
+    def upsert_sql(self):
+        """
+        Returns the statement merging the staging table into the table. Rows with the same key in one
+        buffer are merged once, keeping the last one.
+
+        """
+        if self.merge_sql is not None:
+            return self.merge_sql
+        conflict_key = self.conflict_key
+        if not conflict_key:
+            schema = self.schema[:-1] if self.schema else ""
+            conflict_key = PostgreSQLTableManager(self.postgresql, self.table.name, schema=schema).get_primary_key()
+        if not conflict_key:
+            raise Exception(f"Cannot upsert into {self.schema}{self.table.name}: no conflict_key given and the table has no primary key")
+        keys = ', '.join(format_reserved_word(column) for column in conflict_key)
+        columns = self.orderned_columns or [column.name for column in self.table.columns]
+        updates = [column for column in columns if column not in conflict_key]
+        if updates:
+            action = "DO UPDATE SET " + ', '.join(f"{format_reserved_word(column)} = EXCLUDED.{format_reserved_word(column)}" for column in updates)
+        else:
+            action = "DO NOTHING"
+        self.merge_sql = (f"INSERT INTO {self.schema}{self.table.name} ({self.column_names}) "
+                          f"SELECT DISTINCT ON ({keys}) {self.column_names} FROM {self.staging_table} ORDER BY {keys}, ctid DESC "
+                          f"ON CONFLICT ({keys}) {action}")
+        return self.merge_sql
+
+    def write_buffer(self, cursor, buffer):
+        if self.on_error == "reject":
+            self.write_isolating_errors(cursor, buffer)
+        else:
+            self.write_rows(cursor, buffer)
+
+    def write_isolating_errors(self, cursor, rows):
+        """
+        Writes the rows inside a savepoint. When a row makes the write fail, the savepoint is rolled back
+        and each half of the rows is written the same way, down to the single rows failing, which are
+        rejected. Costs one savepoint per buffer, plus a few statements per bad row.
+
+        """
+        cursor.execute("SAVEPOINT writer_rows")
+        try:
+            self.write_rows(cursor, rows)
+        except ROW_ERRORS as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT writer_rows")
+            if len(rows) == 1:
+                self.reject(rows[0], e)
+            else:
+                middle = len(rows) // 2
+                self.write_isolating_errors(cursor, rows[:middle])
+                self.write_isolating_errors(cursor, rows[middle:])
+        cursor.execute("RELEASE SAVEPOINT writer_rows")
+
+    def reject(self, row, error):
+        self.rejected_rows += 1
+        log(Level.WARNING, f"Row rejected from {self.schema}{self.table.name}: {str(error).strip()}")
+        if self.reject_sink is not None:
+            self.reject_sink.reject(self, row, error)
+
+    def write_rows(self, cursor, buffer):
+        try:
+            start_time = time.perf_counter()
+            if self.write_mode == "upsert":
+                # Dropped at the end of the transaction, so it never outlives a commit or rollback
+                sql = f"CREATE TEMP TABLE IF NOT EXISTS {self.staging_table} (LIKE {self.schema}{self.table.name} INCLUDING DEFAULTS) ON COMMIT DROP"
+                log(Level.SQL, f"Query: {sql}")
+                cursor.execute(sql)
+            if self.load_mode == "copy":
+                cursor.copy_expert(self.copy_sql, rows_to_copy_buffer(buffer))
+            else:
+                psycopg2.extras.execute_values(cursor, self.insert_sql, buffer, template=self.template)
+            if self.write_mode == "upsert":
+                log(Level.SQL, f"Query: {self.upsert_sql()}")
+                cursor.execute(self.upsert_sql())
+                cursor.execute(f"TRUNCATE {self.staging_table}")
+            elapsed_time = time.perf_counter() - start_time
+            num_inserted_rows = len(buffer)
+            self.total_rows += num_inserted_rows
+            self.total_time += elapsed_time
+            log(Level.DEBUG, f"Inserted {num_inserted_rows} rows into {self.schema}{self.table.name} "
+                f"({self.load_mode}{', upsert' if self.write_mode == 'upsert' else ''}: {format_rows_per_second(num_inserted_rows, elapsed_time)} rows/s).")
+            #log(Level.SQL, f"Query: {self.format_sql_log(self.insert_sql, buffer)}")
+            if self.load_mode == "copy":
+                log(Level.SQL, f"Query: {self.copy_sql} ({num_inserted_rows} rows)")
+            else:
+                log(Level.SQL, f"Query: {self.insert_sql} {buffer}")
+        except Exception as e:
+            log(Level.DEBUG, f"Error inserting data into PostgreSQL, table: {self.table.name}")
+            raise e
+
+    def start_flusher(self):
+        if self.flusher is not None:
+            return
+        self.pending_buffers = queue.Queue(maxsize=self.max_pending_buffers)
+        self.flusher = threading.Thread(target=self.run_flusher, name=f"flusher_{self.table.name}", daemon=True)
+        self.flusher.start()
+
+    def run_flusher(self):
+        """
+        Writes the queued buffers until it receives None. After an error the remaining
+        buffers are dropped; the error is raised by the next insert, flush or commit.
+
+        """
+        while True:
+            buffer = self.pending_buffers.get()
+            try:
+                if buffer is None:
+                    return
+                if self.flush_error is None:
+                    cursor = self.postgresql.connection.cursor()
+                    try:
+                        self.write_buffer(cursor, buffer)
+                    finally:
+                        cursor.close()
+                    if self.bulk_commit and self.coordinator is None:
+                        self.postgresql.connection.commit()
+                        self.committed()
+            except Exception as e:
+                self.flush_error = e
+            finally:
+                self.pending_buffers.task_done()
+
+    def wait_for_flushes(self):
+        """
+        Waits until the background thread has written every queued buffer, then stops it.
+
+        """
+        if self.flusher is None:
+            return
+        self.pending_buffers.join()
+        self.pending_buffers.put(None)
+        self.flusher.join()
+        self.flusher = None
+
+    def raise_flush_error(self):
+        if self.flush_error is not None:
+            log(Level.ERROR, f"Error flushing data in the background, table: {self.table.name}")
+            raise self.flush_error
+
+    def rows_per_second(self):
+        """
+        Returns the average throughput of the flushed buffers as a formatted rows/s value.
+        
+        """
+        return format_rows_per_second(self.total_rows, self.total_time)
+
     def close_cursor(self):
         if self.cursor and not self.cursor.closed:
             self.cursor.close()
             self.cursor = None
 
     def commit(self):
+        if self.coordinator is not None:
+            # The other writers of the connection are committed with this one
+            self.coordinator.commit()
+            return
+        self.wait_for_flushes()
+        self.raise_flush_error()
         try:
             self.postgresql.connection.commit()
         except Exception as e:
             log(Level.ERROR, f"Error committing data to PostgreSQL")
             raise e
         self.close_cursor()
+        self.committed()
+
+    def committed(self):
+        # Rejected rows are done as well: a resumed load must not read them again
+        self.committed_rows = self.total_rows + self.rejected_rows
+        if self.on_commit is not None:
+            self.on_commit(self)
 
     def rollback(self):
+        if self.coordinator is not None:
+            self.coordinator.rollback()
+            return
+        self.wait_for_flushes()
+        self.flush_error = None
         try:
             self.postgresql.connection.rollback()
         except Exception as e:
@@ -158,6 +503,112 @@ class PostgreSQLWriter:
             raise e
         self.close_cursor()
 
+
+class PostgreSQLTransactionCoordinator:
+    """
+    A class to commit the flushes of several writers sharing a connection together (group commit).
+
+    Registered writers no longer commit on their own: each flush is reported to the coordinator, and the
+    caller calls commit_if_due() once a whole batch (a parent and its children) has been written, which
+    commits when commit_rows rows were flushed or commit_interval seconds went by since the last commit.
+    A commit first flushes the buffers of every writer, so a batch is always committed in one transaction
+    across the tables. Rows are otherwise only committed by commit() (or the commit() of any registered writer).
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The connection shared by the writers.
+        commit_rows (int): The number of flushed rows after which commit_if_due() commits.
+        commit_interval (float): The number of seconds after which commit_if_due() commits.
+        writers (list): The registered writers.
+        pending_rows (int): The rows flushed since the last commit.
+        commits (int): The number of commits done.
+    """
+    def __init__(self, postgresql, commit_rows=None, commit_interval=None):
+        self.postgresql = postgresql
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval
+        self.writers = []
+        self.pending_rows = 0
+        self.last_commit = time.monotonic()
+        self.commits = 0
+
+    def register(self, writer):
+        if writer.postgresql is not self.postgresql:
+            raise Exception(f"Writer of {writer.table.name} does not share the connection of the transaction")
+        writer.coordinator = self
+        self.writers.append(writer)
+        return writer
+
+    def attach(self, facade):
+        """
+        Makes the writers created by the facade join the transaction. The facade must use the same
+        connection (see create_connection with reuse=True).
+
+        """
+        if facade.connection is not self.postgresql:
+            raise Exception(f"{facade.table_name} does not share the connection of the transaction")
+        facade.coordinator = self
+        return facade
+
+    def due(self):
+        if self.commit_rows and self.pending_rows >= self.commit_rows:
+            return True
+        return bool(self.commit_interval) and time.monotonic() - self.last_commit >= self.commit_interval
+
+    def flushed(self, writer, rows):
+        """
+        Called by a writer after each flush. Never commits: the flush may be in the middle of a batch.
+        Returns False (nothing committed).
+
+        """
+        self.pending_rows += rows
+        return False
+
+    def commit_if_due(self):
+        """
+        Commits when the budget is spent, to be called between batches. Returns whether it committed.
+
+        """
+        if not self.due():
+            return False
+        self.commit()
+        return True
+
+    def commit(self):
+        """
+        Flushes the buffers of every writer and commits them all at once.
+
+        """
+        try:
+            for writer in self.writers:
+                writer.flush_buffer()
+            for writer in self.writers:
+                writer.wait_for_flushes()
+                writer.raise_flush_error()
+            self.postgresql.connection.commit()
+        except Exception as e:
+            log(Level.ERROR, f"Error committing data to PostgreSQL")
+            raise e
+        log(Level.DEBUG, f"Group commit of {self.pending_rows} rows from {len(self.writers)} writers")
+        self.pending_rows = 0
+        self.last_commit = time.monotonic()
+        self.commits += 1
+        for writer in self.writers:
+            writer.close_cursor()
+            writer.committed()
+
+    def rollback(self):
+        for writer in self.writers:
+            writer.wait_for_flushes()
+            writer.flush_error = None
+        try:
+            self.postgresql.connection.rollback()
+        except Exception as e:
+            log(Level.ERROR, f"Error rollback data to PostgreSQL")
+            raise e
+        self.pending_rows = 0
+        for writer in self.writers:
+            writer.close_cursor()
+
     #def format_sql_log(self, sql, values):
     #    def adapt_row(row):
     #        return "(" + ", ".join(adapt(v).getquoted().decode('utf-8', errors='backslashreplace') if v is not None else 'NULL' for v in row) + ")"
@@ -166,47 +617,329 @@ class PostgreSQLWriter:
         
 class PostgresTableIterator:
     """
-    A class to handle reading data from a PostgreSQL table.      
+    A class to handle reading data from a PostgreSQL table.
+
+    By default the query runs on a named (server-side) cursor, so rows are streamed
+    from the server in chunks of itersize instead of being loaded into client memory.
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The PostgreSQL connection object.
+        table_name (str): The name of the table (used when no query is given).
+        schema (str): The schema of the table.
+        query (str): The SQL query to read.
+        batch_size (int): The number of rows per batch returned by iter_batches.
+        itersize (int): The number of rows fetched per round trip while iterating row by row.
+        server_side (bool): Whether to use a named server-side cursor.
+        as_dict (bool): Whether rows are returned as dicts (True) or tuples (False).
+        prefetch (int): The number of batches fetched ahead by a background thread (0 disables prefetching).
+            Prefetched batches have the size of the first batch requested.
+        withhold (bool): Whether the named cursor is declared WITH HOLD, so that it survives the commits of
+            writers sharing the connection. The server then copies the remaining rows at the first commit.
     """
-    def __init__(self, postgresql, table_name=None, schema=None, query=None, batch_size=1000):     
+    def __init__(self, postgresql, table_name=None, schema=None, query=None, batch_size=1000, itersize=None, server_side=True, as_dict=True, prefetch=0, withhold=False):
         self.postgresql = postgresql
         self.table_name = table_name
         self.batch_size = batch_size
+        self.itersize = itersize or batch_size
         self.query = query
         self.schema = schema
+        self.server_side = server_side
+        self.as_dict = as_dict
+        self.withhold = withhold
         self.cursor = None
+        self.columns = None
         self.current_batch = []
+        self.position = 0
+        self.prefetch = prefetch
+        self.prefetch_queue = None
+        self.prefetch_thread = None
+        self.prefetch_stop = None
+        self.consumer_wait_time = 0.0
+        self.consumer_waits = 0
+        self.producer_blocked_time = 0.0
+        self.prefetched_batches = 0
 
     def __iter__(self):
         return self
 
-    def __next__(self):
+    def build_sql(self):
+        sql = None
+        if self.query:
+            sql = self.query
+        elif self.schema:
+            sql = f"SELECT * FROM {self.schema}.{self.table_name}"
+        elif self.table_name:
+            sql = f"SELECT * FROM {self.table_name}"
+
+        if sql is None:
+            raise Exception("No query or table name provided.")
+        return sql
+
+    def open(self):
+        """
+        Opens the cursor and executes the query. With withhold, named cursors are declared WITH HOLD
+        so that commits made on the same connection do not invalidate them.
+
+        """
+        sql = self.build_sql()
+        if self.server_side:
+            self.cursor = self.postgresql.connection.cursor(name=f"sterna_{unique_timestamp_string_id()}", withhold=self.withhold)
+            self.cursor.itersize = self.itersize
+        else:
+            self.cursor = self.postgresql.connection.cursor()
+        log(Level.SQL, f"Query: {sql}")
+        self.cursor.execute(sql)
+
+    def fetch_batch(self, size):
+        """
+        Fetches up to size rows from the cursor (or from the prefetch queue) as a list of dicts or tuples.
+
+        """
         if self.cursor is None:
-            self.cursor = self.postgresql.connection.cursor(cursor_factory=RealDictCursor)
-            sql = None
-            if self.query:
-                sql = self.query
-            elif self.schema:
-                sql = f"SELECT * FROM {self.schema}.{self.table_name}"
-            else:
-                sql = f"SELECT * FROM {self.table_name}"
-            
-            if sql is None:
-                raise Exception("No query or table name provided.")
-            log(Level.SQL, f"Query: {sql}")
-            self.cursor.execute(sql)
+            self.open()
+        if self.prefetch:
+            return self.next_prefetched_batch(size)
+        return self.fetch_rows(size)
+
+    def fetch_rows(self, size):
+        rows = self.cursor.fetchmany(size)
+        if not rows:
+            return []
+        if self.columns is None:
+            self.columns = [description[0] for description in self.cursor.description]
+        if self.as_dict:
+            columns = self.columns
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
 
-        if not self.current_batch:
-            self.current_batch = self.cursor.fetchmany(self.batch_size)
+    def __next__(self):
+        if self.position >= len(self.current_batch):
+            self.current_batch = self.fetch_batch(self.itersize)
+            self.position = 0
             if not self.current_batch:
-                self.cursor.close()
+                self.close()
                 raise StopIteration
 
-        row = self.current_batch.pop(0)
+        row = self.current_batch[self.position]
+        self.position += 1
         return row
 
+    def iter_batches(self, batch_size=None, as_dict=None):
+        """
+        Yields the query results as lists of rows (dicts or plain tuples) of up to batch_size rows.
+
+        """
+        if as_dict is not None:
+            self.as_dict = as_dict
+        if not batch_size:
+            batch_size = self.batch_size
+
+        if self.position < len(self.current_batch):
+            remaining = self.current_batch[self.position:]
+            self.current_batch = []
+            self.position = 0
+            yield remaining
+
+        while True:
+            batch = self.fetch_batch(batch_size)
+            if not batch:
+                break
+            yield batch
+        self.close()
+
+    def next_prefetched_batch(self, size):
+        if self.prefetch_thread is None:
+            self.prefetch_queue = queue.Queue(maxsize=self.prefetch)
+            self.prefetch_stop = threading.Event()
+            self.prefetch_thread = threading.Thread(target=self.run_prefetch, args=(size,), name="prefetch_reader", daemon=True)
+            self.prefetch_thread.start()
+
+        starved = self.prefetch_queue.empty()
+        start_time = time.perf_counter()
+        batch = self.prefetch_queue.get()
+        if starved:
+            self.consumer_waits += 1
+            self.consumer_wait_time += time.perf_counter() - start_time
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    def run_prefetch(self, size):
+        """
+        Fetches batches into the prefetch queue until the results end (an empty batch is queued)
+        or the reader is closed. Errors are queued and raised by the consumer.
+
+        """
+        try:
+            while not self.prefetch_stop.is_set():
+                batch = self.fetch_rows(size)
+                start_time = time.perf_counter()
+                while not self.prefetch_stop.is_set():
+                    try:
+                        self.prefetch_queue.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                self.producer_blocked_time += time.perf_counter() - start_time
+                if not batch:
+                    return
+                self.prefetched_batches += 1
+        except Exception as e:
+            log(Level.ERROR, f"Error prefetching data from PostgreSQL")
+            self.prefetch_queue.put(e)
+
+    def stop_prefetch(self):
+        if self.prefetch_thread is None:
+            return
+        self.prefetch_stop.set()
+        # Unblocks the producer if it is waiting for room in the queue
+        while self.prefetch_thread.is_alive():
+            try:
+                self.prefetch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.prefetch_thread.join()
+        self.prefetch_thread = None
+        log(Level.DEBUG, f"Reader prefetch stats: {self.prefetch_stats()}")
+
+    def prefetch_stats(self):
+        """
+        Returns how long the consumer waited for batches (starved) and how long the background
+        thread waited for room in the queue (blocked), in seconds.
+
+        """
+        return {
+            'batches': self.prefetched_batches,
+            'consumer_waits': self.consumer_waits,
+            'consumer_wait_time': round(self.consumer_wait_time, 4),
+            'producer_blocked_time': round(self.producer_blocked_time, 4),
+        }
+
     def close(self):
+        self.stop_prefetch()
         if self.cursor:
-            self.cursor.close()
+            if not self.cursor.closed:
+                self.cursor.close()
             self.cursor = None
-      
\ No newline at end of file
+
+
+class PostgreSQLCopyPipe:
+    """
+    A class to copy data between two PostgreSQL databases by streaming COPY (query) TO STDOUT
+    from the source connection into COPY table FROM STDIN on the target connection.
+
+    The data moves through an OS pipe in buffers of buffer_size bytes and is never parsed into
+    Python rows. The target transaction is rolled back if either side fails.
+
+    Attributes:
+        source (PostgreSQLConnection): The connection the data is read from.
+        target (PostgreSQLConnection): The connection the data is written to.
+        table_name (str): The target table.
+        schema (str): The schema of the target table.
+        query (str): The query read from the source (defaults to the whole source table).
+        source_table (str): The source table, when no query is given (defaults to table_name).
+        source_schema (str): The schema of the source table.
+        columns (dict or list): The columns to copy, as source -> target names, or a list of names used on both sides.
+        format (str): The COPY format, "text" or "binary" (faster, but column types must match exactly).
+        buffer_size (int): The size, in bytes, of the chunks moved through the pipe.
+        total_rows (int): The number of rows copied by the last run.
+        total_time (float): The time, in seconds, spent by the last run.
+    """
+    def __init__(self, source, target, table_name, schema="", query=None, source_table=None, source_schema="", columns=None, format="text", buffer_size=COPY_PIPE_BUFFER_SIZE):
+        if format not in COPY_FORMATS:
+            raise Exception(f"Unsupported COPY format '{format}', expected one of {COPY_FORMATS}")
+        self.source = source
+        self.target = target
+        self.table_name = table_name
+        self.schema = f"{schema}." if schema else ""
+        self.query = query
+        self.source_table = source_table or table_name
+        self.source_schema = f"{source_schema}." if source_schema else ""
+        if isinstance(columns, (list, tuple)):
+            columns = {column: column for column in columns}
+        self.columns = columns
+        self.format = format
+        self.buffer_size = buffer_size
+        self.total_rows = 0
+        self.total_time = 0.0
+
+    def copy_options(self):
+        return " WITH (FORMAT binary)" if self.format == "binary" else ""
+
+    def source_sql(self):
+        if self.columns:
+            source_columns = ', '.join(format_reserved_word(column) for column in self.columns)
+            source = self.query or f"SELECT * FROM {self.source_schema}{self.source_table}"
+            return f"COPY (SELECT {source_columns} FROM ({source}) AS source) TO STDOUT{self.copy_options()}"
+        if self.query:
+            return f"COPY ({self.query}) TO STDOUT{self.copy_options()}"
+        return f"COPY {self.source_schema}{self.source_table} TO STDOUT{self.copy_options()}"
+
+    def target_sql(self):
+        target_columns = ""
+        if self.columns:
+            target_columns = f" ({', '.join(format_reserved_word(column) for column in self.columns.values())})"
+        return f"COPY {self.schema}{self.table_name}{target_columns} FROM STDIN{self.copy_options()}"
+
+    def run(self, commit=True):
+        """
+        Copies the data and returns the number of rows written to the target table.
+
+        """
+        source_sql = self.source_sql()
+        target_sql = self.target_sql()
+        log(Level.SQL, f"Query: {source_sql}")
+        log(Level.SQL, f"Query: {target_sql}")
+
+        start_time = time.perf_counter()
+        read_fd, write_fd = os.pipe()
+        pipe_reader = os.fdopen(read_fd, "rb", buffering=self.buffer_size)
+        pipe_writer = os.fdopen(write_fd, "wb", buffering=self.buffer_size)
+        source_errors = []
+
+        def produce():
+            cursor = None
+            try:
+                cursor = self.source.connection.cursor()
+                cursor.copy_expert(source_sql, pipe_writer, size=self.buffer_size)
+            except Exception as e:
+                source_errors.append(e)
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                try:
+                    pipe_writer.close()
+                except OSError:
+                    pass
+
+        producer = threading.Thread(target=produce, name=f"copy_pipe_{self.table_name}", daemon=True)
+        producer.start()
+        cursor = None
+        try:
+            cursor = self.target.connection.cursor()
+            cursor.copy_expert(target_sql, pipe_reader, size=self.buffer_size)
+            rows = cursor.rowcount
+        except Exception as e:
+            log(Level.ERROR, f"Error copying data into {self.schema}{self.table_name}")
+            self.target.connection.rollback()
+            raise e
+        finally:
+            # Closing the read end unblocks the producer if the target failed
+            pipe_reader.close()
+            producer.join()
+            if cursor is not None:
+                cursor.close()
+
+        if source_errors:
+            log(Level.ERROR, f"Error reading data for {self.schema}{self.table_name} from the source database")
+            self.target.connection.rollback()
+            raise source_errors[0]
+
+        if commit:
+            self.target.connection.commit()
+        self.total_rows = rows
+        self.total_time = time.perf_counter() - start_time
+        log(Level.DEBUG, f"Copied {rows} rows into {self.schema}{self.table_name} "
+            f"(copy pipe: {format_rows_per_second(rows, self.total_time)} rows/s).")
+        return rows
+
@@ -1,15 +1,24 @@
-from data_access.postgresql_connection import PostgreSQLConnection
-from data_access.postgresql_data_access import PostgreSQLWriter, PostgresTableIterator, postgres_execute_DDL, postgres_commit, postgres_all_tables_names
-from data_access.postgresql_metadata_access import PostgreSQLTableManager
-from system_logging.log_manager import log, Level
-from data_access.utils import unique_timestamp_string_id
-
-from data_access.postgresql_connection import PostgreSQLConnection
+import threading
+from data_access.postgresql_data_access import PostgreSQLWriter, PostgreSQLTransactionCoordinator, PostgresTableIterator, PostgreSQLCopyPipe, postgres_execute_DDL, postgres_insert_select, postgres_max_value, postgres_delta_query, postgres_commit, postgres_all_tables_names
+from data_access.postgresql_metadata_access import PostgreSQLTableManager, PostgreSQLSchemaManager
+from data_access.postgresql_pool import PostgreSQLPoolManager
+from data_access.postgresql_parallel_reader import PostgreSQLParallelReader
+from data_access.postgresql_bulk_load import PostgreSQLBulkLoadSession
+from data_access.postgresql_shadow_table import PostgreSQLShadowTable
+from data_access.postgresql_reject_sink import PostgreSQLRejectTable
 
 class PostgreSQLFacade:
-    connections_pool = {}  # Static shared connection pool
+    """
+    A facade to access a PostgreSQL database (connections, readers, writers and metadata).
+
+    Connections are checked out from a PostgreSQLConnectionPool shared by all facades with
+    the same credentials. Connections created with reuse=True are shared, per thread, by
+    all facades with the same credentials name. Checked out connections are tracked per
+    thread and returned to the pool by release_all_connections, so they survive across rules.
+    """
+    thread_connections = threading.local()  # Connections checked out by the current thread
     
-    def __init__(self, db_credentials, table=None, table_name=None, buffer_size=1000, bulk_commit=False, query=None, use_columns_metadata=True):
+    def __init__(self, db_credentials, table=None, table_name=None, buffer_size=1000, bulk_commit=False, query=None, use_columns_metadata=True, load_mode="insert", async_flush=False, write_mode="insert", conflict_key=None):
         self.db_credentials = db_credentials
         self.reuse = False
         self.connection = None
@@ -19,38 +28,88 @@ class PostgreSQLFacade:
         self.bulk_commit = bulk_commit
         self.query = query
         self.use_columns_metadata = use_columns_metadata
+        self.load_mode = load_mode
+        self.async_flush = async_flush
+        self.write_mode = write_mode
+        self.conflict_key = conflict_key
+        self.coordinator = None  # Commits the writers with those of the other facades of the transaction
+        self.on_commit = None  # Passed to the writers, called after each commit (checkpoints)
+        self.checkpoint_rows = 0  # Rows committed into the table by the previous, interrupted run
+
+    @staticmethod
+    def thread_state():
+        state = PostgreSQLFacade.thread_connections
+        if not hasattr(state, "checked_out"):
+            state.shared = {}
+            state.checked_out = []
+        return state
 
     def create_connection(self, reuse=False):
         self.reuse = reuse
+        state = PostgreSQLFacade.thread_state()
+        if self.reuse and self.db_credentials.name in state.shared:
+            self.connection = state.shared[self.db_credentials.name]
+            return
+        pool = PostgreSQLPoolManager().get_pool(self.db_credentials)
+        self.connection = pool.checkout()
+        state.checked_out.append((pool, self.connection))
         if self.reuse:
-            if self.db_credentials.name in PostgreSQLFacade.connections_pool:
-                self.connection = PostgreSQLFacade.connections_pool[self.db_credentials.name]
-            else:
-                self.connection = PostgreSQLConnection(self.db_credentials)
-                self.connection.create()
-                PostgreSQLFacade.connections_pool[self.db_credentials.name] = self.connection
-        else:
-            self.connection = PostgreSQLConnection(self.db_credentials)
-            self.connection.create()
-            new_name = unique_timestamp_string_id()
-            PostgreSQLFacade.connections_pool[new_name] = self.connection
+            state.shared[self.db_credentials.name] = self.connection
     
     def close_connection(self):
         if not self.reuse and self.connection:
-            self.connection.close()
-            
+            state = PostgreSQLFacade.thread_state()
+            state.checked_out = [(pool, connection) for pool, connection in state.checked_out if connection is not self.connection]
+            PostgreSQLPoolManager().get_pool(self.db_credentials).checkin(self.connection)
+            self.connection = None
+
+    @staticmethod
+    def release_all_connections():
+        """
+        Returns every connection checked out by the current thread to its pool, keeping it open for reuse.
+
+        """
+        state = PostgreSQLFacade.thread_state()
+        checked_out = state.checked_out
+        state.checked_out = []
+        state.shared = {}
+        for pool, connection in checked_out:
+            pool.checkin(connection)
+
+    @staticmethod
     def close_all_connections():
-        for conn in PostgreSQLFacade.connections_pool.values():
-            conn.close()
-        PostgreSQLFacade.connections_pool = {}
+        PostgreSQLFacade.release_all_connections()
+        PostgreSQLPoolManager().close_all()
+
+    @staticmethod
+    def discard_inherited_connections():
+        """
+        Must be called at the start of a worker process: connections inherited from the parent
+        process are forgotten (not closed) and new ones are opened on demand.
+
+        """
+        PostgreSQLFacade.thread_connections = threading.local()
+        PostgreSQLPoolManager().discard_inherited_pools()
+
+    @staticmethod
+    def pool_stats():
+        return PostgreSQLPoolManager().stats()
             
-    def writer(self, table=None, buffer_size=None, bulk_commit=None):
+    def writer(self, table=None, buffer_size=None, bulk_commit=None, load_mode=None, async_flush=None, max_pending_buffers=2, write_mode=None, conflict_key=None, on_error="abort", reject_sink=None):
         if not table:
             table = self.table
         if not buffer_size:
             buffer_size = self.buffer_size
         if not bulk_commit:
             bulk_commit = self.bulk_commit
+        if not load_mode:
+            load_mode = self.load_mode
+        if async_flush is None:
+            async_flush = self.async_flush
+        if not write_mode:
+            write_mode = self.write_mode
+        if not conflict_key:
+            conflict_key = self.conflict_key
             
         if not self.connection:
             raise Exception('Connection not created')
@@ -64,14 +123,27 @@ class PostgreSQLFacade:
             table, 
             schema=self.db_credentials.schema, 
             buffer_size=buffer_size, 
-            bulk_commit=bulk_commit)
+            bulk_commit=bulk_commit,
+            load_mode=load_mode,
+            async_flush=async_flush,
+            max_pending_buffers=max_pending_buffers,
+            write_mode=write_mode,
+            conflict_key=conflict_key,
+            on_error=on_error)
+        postgres_writer.reject_sink = reject_sink
+        postgres_writer.on_commit = self.on_commit
+        if self.coordinator is not None:
+            self.coordinator.register(postgres_writer)
         return postgres_writer
     
-    def reader(self, table=None, query=None, batch_size=1000):
+    def reader(self, table=None, query=None, batch_size=1000, itersize=None, server_side=True, as_dict=True, prefetch=0, withhold=None):
         if not table:
             table = self.table
         if not query:
             query = self.query
+        if withhold is None:
+            # Only a shared connection can be committed by a writer while the reader streams
+            withhold = self.reuse
             
         if not self.connection:
             raise Exception('Connection not created')
@@ -79,9 +151,103 @@ class PostgreSQLFacade:
             self.connection, 
             table, 
             schema=self.db_credentials.schema, 
-            query=query)
+            query=query,
+            batch_size=batch_size,
+            itersize=itersize,
+            server_side=server_side,
+            as_dict=as_dict,
+            prefetch=prefetch,
+            withhold=withhold)
         return postgres_reader
     
+    def parallel_reader(self, table=None, query=None, key="id", parts=4, batch_size=1000, balanced=False, as_dict=True):
+        """
+        Returns a PostgreSQLParallelReader reading the table (or query) split into parts key ranges, over
+        parts connections sharing one snapshot. Iterate it (or its iter_batches) for a single merged stream,
+        or use partitions() for one iterator per range. The parts + 1 connections are checked out from the
+        pool and returned by close().
+
+        """
+        if not table:
+            table = self.table_name or (self.table.name if self.table else None)
+        if not query:
+            query = self.query
+
+        pool = PostgreSQLPoolManager().get_pool(self.db_credentials)
+        connections = []
+        try:
+            for _ in range(parts + 1):
+                connections.append(pool.checkout())
+        except Exception as e:
+            for connection in connections:
+                pool.checkin(connection)
+            raise e
+
+        def release():
+            for connection in connections:
+                pool.checkin(connection)
+
+        return PostgreSQLParallelReader(
+            connections[0],
+            connections[1:],
+            table_name=table,
+            schema=self.db_credentials.schema,
+            query=query,
+            key=key,
+            batch_size=batch_size,
+            balanced=balanced,
+            as_dict=as_dict,
+            on_close=release)
+
+    def bulk_load(self, tables=None, workers=4):
+        """
+        Returns a PostgreSQLBulkLoadSession for the tables (defaults to the facade table), to be used as a
+        context manager around the load: the secondary indexes and foreign keys are dropped on entry and
+        rebuilt, workers at a time, on exit. The session uses its own connections from the pool.
+
+        """
+        if not tables:
+            tables = [self.table_name or self.table.name]
+        return PostgreSQLBulkLoadSession(
+            PostgreSQLPoolManager().get_pool(self.db_credentials),
+            self.db_credentials.name,
+            tables,
+            schema=self.db_credentials.schema,
+            workers=workers)
+
+    def transaction(self, commit_rows=None, commit_interval=None):
+        """
+        Returns a PostgreSQLTransactionCoordinator committing the writers of this facade together with those
+        of the facades attached to it, every commit_rows flushed rows or commit_interval seconds.
+
+        """
+        if not self.connection:
+            raise Exception('Connection not created')
+        return PostgreSQLTransactionCoordinator(self.connection, commit_rows=commit_rows, commit_interval=commit_interval).attach(self)
+
+    def reject_table(self, table_name):
+        """
+        Returns a PostgreSQLRejectTable storing the rows rejected by writers (on_error="reject") in the
+        given table, in the transaction of the facade connection.
+
+        """
+        if not self.connection:
+            raise Exception('Connection not created')
+        return PostgreSQLRejectTable(self.connection, table_name, schema=self.db_credentials.schema)
+
+    def shadow_table(self, table_name=None):
+        """
+        Returns a PostgreSQLShadowTable to reload the table (defaults to the facade table) into an UNLOGGED
+        copy swapped in once loaded, using the facade connection.
+
+        """
+        if not table_name:
+            table_name = self.table_name or self.table.name
+
+        if not self.connection:
+            raise Exception('Connection not created')
+        return PostgreSQLShadowTable(self.connection, table_name, schema=self.db_credentials.schema)
+
     def metadata(self, table_name=None):
         if not table_name:
             table_name = self.table_name
@@ -94,6 +260,122 @@ class PostgreSQLFacade:
             schema=self.db_credentials.schema)
         return postgres_meta
     
+    def schema_tables(self, schema=None, table_names=None):
+        """
+        Returns fully populated Table objects (columns, constraints, indexes and estimated sizes)
+        for every table of the schema, using a handful of catalog queries.
+
+        """
+        if not schema:
+            schema = self.db_credentials.schema
+        
+        if not self.connection:
+            raise Exception('Connection not created')
+        return PostgreSQLSchemaManager(self.connection, schema=schema).get_tables(table_names=table_names)
+    
+    def row_count_estimates(self, schema=None):
+        """
+        Returns the estimated row count of every table of the schema, read from the catalog statistics.
+
+        """
+        if not schema:
+            schema = self.db_credentials.schema
+        
+        if not self.connection:
+            raise Exception('Connection not created')
+        return PostgreSQLSchemaManager(self.connection, schema=schema).get_row_count_estimates()
+    
+    def same_database(self, other):
+        """
+        Whether both facades point at the same server, database and schema with the same user, so that SQL
+        written for one of them can run on the other (with the same privileges).
+
+        """
+        credentials, other_credentials = self.db_credentials, other.db_credentials
+        return (credentials.host, str(credentials.port), credentials.database, credentials.schema, credentials.user) == \
+            (other_credentials.host, str(other_credentials.port), other_credentials.database, other_credentials.schema, other_credentials.user)
+
+    def max_value(self, column, query=None):
+        """
+        Returns the maximum value of column in the result of query (defaults to the facade query),
+        for example the high watermark of an incremental read.
+
+        """
+        if not query:
+            query = self.query
+
+        if not self.connection:
+            raise Exception('Connection not created')
+        return postgres_max_value(self.connection, query, column)
+
+    def delta_query(self, column, lower=None, upper=None, query=None):
+        """
+        Returns the query (defaults to the facade query) restricted to the rows whose column is
+        greater than lower and at most upper.
+
+        """
+        if not query:
+            query = self.query
+        return postgres_delta_query(query, column, lower=lower, upper=upper)
+
+    def insert_select(self, query, table_name=None, columns=None, commit=True):
+        """
+        Inserts the result of query into a table of this database with a single INSERT INTO ... SELECT
+        run on the server. Returns the number of rows inserted.
+
+        Args:
+            query (str): The query, runnable on this database.
+            table_name (str, optional): The target table. Defaults to the facade table_name.
+            columns (dict or list, optional): The columns to insert, as source -> target names, or a list of names used on both sides. Defaults to all columns, by position.
+            commit (bool, optional): Whether to commit the transaction. Defaults to True.
+        """
+        if not table_name:
+            table_name = self.table_name or (self.table.name if self.table else None)
+
+        if not self.connection:
+            raise Exception('Connection not created')
+        try:
+            rows = postgres_insert_select(self.connection, table_name, query, schema=self.db_credentials.schema or "", columns=columns)
+        except Exception as e:
+            self.connection.connection.rollback()
+            raise e
+        if commit:
+            postgres_commit(self.connection)
+        return rows
+
+    def pipe_to(self, target, table_name=None, query=None, source_table=None, columns=None, format="text", commit=True):
+        """
+        Copies the result of query (or the whole source_table) into a table of the target database
+        with COPY, without converting the data into Python rows. Returns the number of rows copied.
+
+        Args:
+            target (PostgreSQLFacade): The target database, with an open connection.
+            table_name (str, optional): The target table. Defaults to the target table_name.
+            query (str, optional): The query read from this database. Defaults to this facade's query.
+            source_table (str, optional): The table read when there is no query. Defaults to table_name.
+            columns (dict or list, optional): The columns to copy, as source -> target names, or a list of names used on both sides. Defaults to all columns, by position.
+            format (str, optional): "text" or "binary". Defaults to "text".
+            commit (bool, optional): Whether to commit the target transaction. Defaults to True.
+        """
+        if not table_name:
+            table_name = target.table_name or (target.table.name if target.table else None)
+        if not query:
+            query = self.query
+
+        if not self.connection or not target.connection:
+            raise Exception('Connection not created')
+        pipe = PostgreSQLCopyPipe(
+            self.connection,
+            target.connection,
+            table_name,
+            schema=target.db_credentials.schema,
+            query=query,
+            source_table=source_table,
+            source_schema=self.db_credentials.schema,
+            columns=columns,
+            format=format)
+        return pipe.run(commit=commit)
+
     def execute_DDL(self, sql):
         if not self.connection:
             raise Exception('Connection not created')
@@ -109,13 +391,13 @@ class PostgreSQLFacade:
             raise Exception('Connection not created')
         postgres_commit(self.connection)
 
-    def simple_writer(self, reuse=True, table=None, buffer_size=None, bulk_commit=None, columns=None):
+    def simple_writer(self, reuse=True, table=None, buffer_size=None, bulk_commit=None, columns=None, load_mode=None):
         self.create_connection(reuse=reuse)
-        writer = self.writer(table=table, buffer_size=buffer_size, bulk_commit=bulk_commit)
+        writer = self.writer(table=table, buffer_size=buffer_size, bulk_commit=bulk_commit, load_mode=load_mode)
         if columns is not None:
             writer.set_columns(columns)
         return writer
         
-    def simple_reader(self, reuse=True, table=None, query=None, batch_size=1000):
+    def simple_reader(self, reuse=True, table=None, query=None, batch_size=1000, itersize=None):
         self.create_connection(reuse=reuse)
-        return self.reader(table=table, query=query, batch_size=batch_size)
+        return self.reader(table=table, query=query, batch_size=batch_size, itersize=itersize)
@@ -1,5 +1,6 @@
 from system_logging.log_manager import log, Level
-from data_access.metadata_models import Column
+from data_access.metadata_models import Table, Column, Constraint, Index
+from data_access.metadata_cache import MetadataCache
 
 
 class PostgreSQLTableManager:
@@ -21,16 +22,21 @@ class PostgreSQLTableManager:
         self.cursor = None
         
         
-    def get_table_columns(self):
+    def get_table_columns(self, use_cache=True):
         """
         Retrieves the columns of the table from the PostgreSQL database.
+        The result is kept in the process-wide MetadataCache unless use_cache is False.
         
         """
+        schema_name = self.schema[:-1] if self.schema else "public"
+        credentials_name = self.postgresql.db_credentials.name
+        if use_cache:
+            columns = MetadataCache().get(credentials_name, schema_name, self.table_name)
+            if columns is not None:
+                return columns
         try:
             self.cursor = self.postgresql.connection.cursor()
             
-            schema_name = self.schema[:-1] if self.schema else "public"
-            
             sql = f"""
                 SELECT column_name, data_type, is_nullable, column_default
                 FROM information_schema.columns
@@ -47,6 +53,8 @@ class PostgreSQLTableManager:
                 )
                 for row in self.cursor.fetchall()
             ]
+            if columns:
+                MetadataCache().put(credentials_name, schema_name, self.table_name, columns)
             return columns
         except Exception as e:
             log(Level.ERROR, f"Error getting columns from PostgreSQL table")
@@ -54,6 +62,33 @@ class PostgreSQLTableManager:
         finally:
             self.close_cursor()
 
+    def get_primary_key(self):
+        """
+        Retrieves the columns of the primary key of the table, in key order (empty when there is none).
+
+        """
+        schema_name = self.schema[:-1] if self.schema else "public"
+        try:
+            self.cursor = self.postgresql.connection.cursor()
+            sql = """
+                SELECT a.attname
+                FROM pg_catalog.pg_index ix
+                JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+                JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+                JOIN pg_catalog.pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+                WHERE n.nspname = %s AND c.relname = %s AND ix.indisprimary
+                ORDER BY k.position
+            """
+            log(Level.SQL, f"Query: {sql} [{schema_name}.{self.table_name}]")
+            self.cursor.execute(sql, (schema_name, self.table_name))
+            return [row[0] for row in self.cursor.fetchall()]
+        except Exception as e:
+            log(Level.ERROR, f"Error getting the primary key of PostgreSQL table")
+            raise e
+        finally:
+            self.close_cursor()
+
     def get_table_row_count(self):
         """
         Retrieves the row count of the table from the PostgreSQL database.
@@ -89,6 +124,24 @@ class PostgreSQLTableManager:
         finally:
             self.close_cursor()
 
+    def get_min_id(self, id_column):
+        """
+        Retrieves the minimum value of the specified ID column from the table.
+
+        """
+        try:
+            self.cursor = self.postgresql.connection.cursor()
+            sql = f"SELECT MIN({id_column}) FROM {self.schema}{self.table_name}"
+            log(Level.SQL, f"Query: {sql}")
+            self.cursor.execute(sql)
+            min_id = self.cursor.fetchone()[0]
+            return min_id
+        except Exception as e:
+            log(Level.ERROR, f"Error getting minimum value of ID column from PostgreSQL table")
+            raise e
+        finally:
+            self.close_cursor()
+
     def truncate_table(self):
         """
         Truncates the table, removing all rows (WARNING: is using CASCADE).
@@ -180,4 +233,148 @@ class PostgreSQLTableManager:
         except Exception as e:
             log(Level.ERROR, f"Error committing data to PostgreSQL")
             raise e  
-        self.close_cursor()
\ No newline at end of file
+        self.close_cursor()
+
+
+class PostgreSQLSchemaManager:
+    """
+    A class to read the metadata of every table of a PostgreSQL schema at once.
+
+    Instead of one information_schema query per table, the columns, constraints, indexes and
+    estimated sizes of all tables are loaded with one pg_catalog query each.
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The PostgreSQL connection object.
+        schema (str): The schema to inspect.
+        cursor (psycopg2.cursor): The cursor for executing SQL statements.
+    """
+    TABLES_SQL = """
+        SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+        ORDER BY c.relname
+    """
+    COLUMNS_SQL = """
+        SELECT c.relname, a.attname, format_type(a.atttypid, NULL), NOT a.attnotnull, pg_get_expr(d.adbin, d.adrelid)
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p') AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY c.relname, a.attnum
+    """
+    CONSTRAINTS_SQL = """
+        SELECT c.relname, con.conname, con.contype, a.attname, fn.nspname, fc.relname, fa.attname, pg_get_constraintdef(con.oid)
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        CROSS JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, position)
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.attnum
+        LEFT JOIN pg_catalog.pg_class fc ON fc.oid = con.confrelid
+        LEFT JOIN pg_catalog.pg_namespace fn ON fn.oid = fc.relnamespace
+        LEFT JOIN pg_catalog.pg_attribute fa ON fa.attrelid = con.confrelid AND fa.attnum = con.confkey[k.position]
+        WHERE n.nspname = %s AND con.contype IN ('p', 'f', 'u')
+        ORDER BY c.relname, con.conname, k.position
+    """
+    INDEXES_SQL = """
+        SELECT t.relname, i.relname, a.attname, NOT a.attnotnull, am.amname, NOT ix.indisunique, pg_get_indexdef(ix.indexrelid), con.conname
+        FROM pg_catalog.pg_index ix
+        JOIN pg_catalog.pg_class t ON t.oid = ix.indrelid
+        JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_catalog.pg_am am ON am.oid = i.relam
+        CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+        LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        LEFT JOIN pg_catalog.pg_constraint con ON con.conindid = ix.indexrelid AND con.conrelid = t.oid AND con.contype IN ('p', 'u', 'x')
+        WHERE n.nspname = %s AND t.relkind IN ('r', 'p')
+        ORDER BY t.relname, i.relname, k.position
+    """
+
+    ROW_ESTIMATES_SQL = """
+        SELECT c.relname, c.reltuples::bigint, s.n_live_tup, s.n_tup_ins, s.n_tup_upd, s.n_tup_del
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        LEFT JOIN pg_catalog.pg_stat_user_tables s ON s.relid = c.oid
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p')
+        ORDER BY c.relname
+    """
+
+    def __init__(self, postgresql, schema=""):
+        self.postgresql = postgresql
+        self.schema = schema if schema else "public"
+        self.cursor = None
+
+    def fetch_all(self, sql):
+        try:
+            self.cursor = self.postgresql.connection.cursor()
+            log(Level.SQL, f"Query: {sql} [{self.schema}]")
+            self.cursor.execute(sql, (self.schema,))
+            return self.cursor.fetchall()
+        except Exception as e:
+            log(Level.ERROR, f"Error reading PostgreSQL catalog of schema {self.schema}")
+            raise e
+        finally:
+            self.close_cursor()
+
+    def get_tables(self, table_names=None):
+        """
+        Retrieves every table of the schema with its columns, primary/foreign/unique key constraints,
+        indexes, estimated number of tuples (pg_class.reltuples) and total size in bytes.
+
+        Args:
+            table_names (list, optional): Restricts the result to these tables.
+        """
+        tables = {}
+        for name, reltuples, size_bytes in self.fetch_all(self.TABLES_SQL):
+            if table_names is None or name in table_names:
+                # reltuples is -1 when the table was never vacuumed or analyzed
+                tables[name] = Table(name, reltuples if reltuples >= 0 else None, size_bytes=size_bytes)
+
+        for table_name, name, data_type, nullable, default in self.fetch_all(self.COLUMNS_SQL):
+            if table_name in tables:
+                tables[table_name].columns.append(Column(name, data_type=data_type, nullable=nullable, default=default))
+
+        for table_name, name, contype, column_name, ref_schema, ref_table, ref_column, definition in self.fetch_all(self.CONSTRAINTS_SQL):
+            if table_name in tables:
+                tables[table_name].constraints.append(Constraint(
+                    name, column_name, ref_schema, ref_table, ref_column, constraint_type=contype, definition=definition))
+
+        for table_name, name, column_name, nullable, index_type, non_unique, definition, constraint_name in self.fetch_all(self.INDEXES_SQL):
+            if table_name in tables:
+                tables[table_name].indexes.append(Index(
+                    name, column_name, nullable, index_type, non_unique, definition=definition, constraint_name=constraint_name))
+
+        log(Level.DEBUG, f"Loaded metadata of {len(tables)} tables from schema {self.schema}")
+        return list(tables.values())
+
+    def get_row_count_estimates(self):
+        """
+        Retrieves the estimated row count of every table of the schema with a single catalog query,
+        without scanning the tables. The estimate is pg_stat_user_tables.n_live_tup when statistics
+        are available, otherwise pg_class.reltuples. A n_live_tup of 0 with a positive reltuples (statistics
+        reset, or a table loaded before they were collected) also uses reltuples.
+
+        Returns:
+            dict: table name -> {estimate, reltuples, n_live_tup, n_tup_ins, n_tup_upd, n_tup_del}
+        """
+        estimates = {}
+        for name, reltuples, n_live_tup, n_tup_ins, n_tup_upd, n_tup_del in self.fetch_all(self.ROW_ESTIMATES_SQL):
+            if n_live_tup is None or (n_live_tup == 0 and reltuples > 0):
+                estimate = max(reltuples, 0)
+            else:
+                estimate = n_live_tup
+            estimates[name] = {
+                'estimate': estimate,
+                'reltuples': reltuples,
+                'n_live_tup': n_live_tup,
+                'n_tup_ins': n_tup_ins,
+                'n_tup_upd': n_tup_upd,
+                'n_tup_del': n_tup_del,
+            }
+        return estimates
+
+    def close_cursor(self):
+        if self.cursor and not self.cursor.closed:
+            self.cursor.close()
+            self.cursor = None
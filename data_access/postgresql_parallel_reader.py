@@ -0,0 +1,231 @@
+import math
+import queue
+import threading
+from psycopg2.extensions import adapt
+
+from data_access.postgresql_data_access import PostgresTableIterator
+from data_access.postgresql_metadata_access import PostgreSQLTableManager
+from data_access.utils import format_reserved_word
+from system_logging.log_manager import log, Level
+
+SNAPSHOT_TRANSACTION_SQL = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+
+
+class PostgreSQLParallelReader:
+    """
+    A class to read a table (or a query with a numeric key) over several connections at once.
+
+    The key is split into ranges, each one read by its own connection. All connections import the
+    snapshot exported by the coordinator connection (pg_export_snapshot), so together they see the
+    data exactly as one single read would.
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The coordinator connection, holding the exported snapshot.
+        workers (list): The connections reading the ranges, one per range.
+        table_name (str): The name of the table (used when no query is given).
+        schema (str): The schema of the table.
+        query (str): The SQL query to read.
+        key (str): The numeric column used to split the rows into ranges.
+        batch_size (int): The number of rows per batch.
+        balanced (bool): Whether the ranges are split on quantiles of the key (same number of rows per range,
+            at the cost of a scan of the key) instead of equal widths between the minimum and maximum key.
+        as_dict (bool): Whether rows are returned as dicts (True) or tuples (False).
+        snapshot (str): The identifier of the exported snapshot.
+        bounds (list): The range boundaries, as (lower, upper) tuples (upper is None for the last range).
+    """
+    def __init__(self, postgresql, workers, table_name=None, schema=None, query=None, key="id", batch_size=1000, balanced=False, as_dict=True, on_close=None):
+        if not workers:
+            raise Exception("At least one worker connection is required")
+        self.postgresql = postgresql
+        self.workers = workers
+        self.table_name = table_name
+        self.schema = schema
+        self.query = query
+        self.key = key
+        self.batch_size = batch_size
+        self.balanced = balanced
+        self.as_dict = as_dict
+        self.on_close = on_close
+        self.snapshot = None
+        self.bounds = None
+        self.iterators = None
+        self.stop = None
+        self.threads = []
+
+    def source_sql(self):
+        if self.query:
+            return self.query
+        if self.schema:
+            return f"SELECT * FROM {self.schema}.{self.table_name}"
+        if self.table_name:
+            return f"SELECT * FROM {self.table_name}"
+        raise Exception("No query or table name provided.")
+
+    def execute(self, connection, sql, params=None):
+        cursor = connection.connection.cursor()
+        try:
+            log(Level.SQL, f"Query: {sql}")
+            cursor.execute(sql, params)
+            return cursor.fetchone() if cursor.description else None
+        finally:
+            cursor.close()
+
+    def export_snapshot(self):
+        """
+        Starts a repeatable read transaction on the coordinator connection and exports its snapshot.
+        The transaction stays open until the reader is closed.
+
+        """
+        self.postgresql.connection.rollback()
+        self.execute(self.postgresql, SNAPSHOT_TRANSACTION_SQL)
+        self.snapshot = self.execute(self.postgresql, "SELECT pg_export_snapshot()")[0]
+        log(Level.DEBUG, f"Snapshot {self.snapshot} exported for the parallel read")
+
+    def key_bounds(self):
+        """
+        Returns the minimum and maximum key, using the table metadata when reading a whole table.
+
+        """
+        if not self.query and self.table_name:
+            manager = PostgreSQLTableManager(self.postgresql, self.table_name, schema=self.schema or "")
+            return manager.get_min_id(self.key), manager.get_max_id(self.key)
+        key = format_reserved_word(self.key)
+        return self.execute(self.postgresql, f"SELECT MIN({key}), MAX({key}) FROM ({self.source_sql()}) AS source")
+
+    def split_points(self, parts):
+        """
+        Returns the keys splitting the rows into parts ranges (at most parts - 1 values).
+
+        """
+        min_key, max_key = self.key_bounds()
+        if min_key is None or parts <= 1:
+            return []
+        if self.balanced:
+            key = format_reserved_word(self.key)
+            fractions = [part / parts for part in range(1, parts)]
+            points = self.execute(self.postgresql, f"SELECT percentile_disc(%s::float8[]) WITHIN GROUP (ORDER BY {key}) FROM ({self.source_sql()}) AS source", (fractions,))[0]
+        else:
+            points = [min_key + (max_key - min_key) * part / parts for part in range(1, parts)]
+            if isinstance(min_key, int) and isinstance(max_key, int):
+                points = [math.ceil(point) for point in points]
+        return sorted({point for point in points if point is not None and min_key < point <= max_key})
+
+    def range_sql(self, lower, upper, first):
+        key = format_reserved_word(self.key)
+        conditions = []
+        if lower is not None:
+            conditions.append(f"{key} >= {adapt(lower).getquoted().decode()}")
+        if upper is not None:
+            conditions.append(f"{key} < {adapt(upper).getquoted().decode()}")
+        condition = " AND ".join(conditions) or "TRUE"
+        if first:
+            # Rows without a key are read by the first range
+            condition = f"({condition}) OR {key} IS NULL"
+        return f"SELECT * FROM ({self.source_sql()}) AS source WHERE {condition}"
+
+    def open(self):
+        """
+        Exports the snapshot, computes the ranges and prepares one iterator per range on its own connection.
+
+        """
+        self.export_snapshot()
+        points = self.split_points(len(self.workers))
+        limits = [None] + points + [None]
+        self.bounds = list(zip(limits, limits[1:]))
+
+        self.iterators = []
+        for index, (lower, upper) in enumerate(self.bounds):
+            worker = self.workers[index]
+            worker.connection.rollback()
+            self.execute(worker, SNAPSHOT_TRANSACTION_SQL)
+            self.execute(worker, "SET TRANSACTION SNAPSHOT %s", (self.snapshot,))
+            self.iterators.append(PostgresTableIterator(
+                worker,
+                query=self.range_sql(lower, upper, index == 0),
+                batch_size=self.batch_size,
+                as_dict=self.as_dict))
+        log(Level.DEBUG, f"Parallel read split into {len(self.bounds)} ranges on {self.key}: {self.bounds}")
+
+    def partitions(self):
+        """
+        Returns one PostgresTableIterator per key range, each on its own connection, to be consumed
+        concurrently (for example, one thread per partition).
+
+        """
+        if self.iterators is None:
+            self.open()
+        return self.iterators
+
+    def read_partition(self, iterator, results):
+        try:
+            for batch in iterator.iter_batches():
+                while not self.stop.is_set():
+                    try:
+                        results.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if self.stop.is_set():
+                    return
+        except Exception as e:
+            log(Level.ERROR, f"Error reading a range of the parallel read")
+            results.put(e)
+        finally:
+            results.put(None)
+
+    def iter_batches(self):
+        """
+        Yields the batches of all ranges, read concurrently, as soon as they arrive (not in key order).
+
+        """
+        partitions = self.partitions()
+        results = queue.Queue(maxsize=2 * len(partitions))
+        self.stop = threading.Event()
+        self.threads = [threading.Thread(target=self.read_partition, args=(iterator, results), name=f"parallel_reader_{index}", daemon=True)
+                        for index, iterator in enumerate(partitions)]
+        for thread in self.threads:
+            thread.start()
+
+        running = len(self.threads)
+        try:
+            while running > 0:
+                batch = results.get()
+                if batch is None:
+                    running -= 1
+                elif isinstance(batch, Exception):
+                    raise batch
+                else:
+                    yield batch
+        finally:
+            self.stop_threads(results)
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            yield from batch
+
+    def stop_threads(self, results):
+        self.stop.set()
+        for thread in self.threads:
+            while thread.is_alive():
+                try:
+                    results.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+        self.threads = []
+
+    def close(self):
+        """
+        Closes the iterators and ends the snapshot transactions of every connection.
+
+        """
+        for iterator in self.iterators or []:
+            iterator.close()
+        for connection in [self.postgresql] + self.workers:
+            try:
+                connection.connection.rollback()
+            except Exception:
+                log(Level.WARNING, "Error ending a parallel read transaction")
+        self.iterators = None
+        if self.on_close is not None:
+            self.on_close()
@@ -0,0 +1,279 @@
+import time
+import threading
+from collections import deque
+
+from data_access.postgresql_connection import PostgreSQLConnection
+from system_logging.log_manager import log, Level
+
+
+class PostgreSQLConnectionPool:
+    """
+    A bounded, thread-safe pool of PostgreSQL connections sharing the same credentials.
+
+    Attributes:
+        db_credentials (DBCredentials): The credentials used to open new connections.
+        name (str): The identification of the pool (alias:user@host:port/database/schema). Code using a pooled
+            connection reads the schema and alias of its db_credentials, so every alias has its own pool.
+        min_size (int): The number of idle connections that are never evicted.
+        max_size (int): The maximum number of connections open at the same time.
+        idle_timeout (float): Seconds an idle connection above min_size is kept before being closed.
+        checkout_timeout (float): Seconds to wait for a free connection before giving up.
+        health_check_interval (float): Idle seconds after which a connection is pinged before being handed out.
+        idle (deque): The idle connections, as (connection, last_used) tuples.
+        in_use (set): The connections currently checked out.
+    """
+
+    def __init__(self, db_credentials, min_size=0, max_size=10, idle_timeout=300, checkout_timeout=30, health_check_interval=30):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise Exception(f"Invalid pool size (min_size: {min_size}, max_size: {max_size})")
+        self.db_credentials = db_credentials
+        self.name = PostgreSQLConnectionPool.pool_name(db_credentials)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.idle = deque()
+        self.in_use = set()
+        self.opening = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        self.created = 0
+        self.checkouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @staticmethod
+    def pool_name(db_credentials):
+        return f"{db_credentials.name}:{db_credentials.user}@{db_credentials.host}:{db_credentials.port}/{db_credentials.database}/{db_credentials.schema}"
+
+    def open_connection(self):
+        connection = PostgreSQLConnection(self.db_credentials)
+        connection.create()
+        with self.condition:
+            self.created += 1
+        return connection
+
+    def is_healthy(self, connection, last_used):
+        """
+        Checks that an idle connection is still usable. Connections idle for longer than
+        health_check_interval are pinged with a SELECT 1.
+
+        """
+        psycopg2_connection = connection.connection
+        if psycopg2_connection is None or psycopg2_connection.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = psycopg2_connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            psycopg2_connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            log(Level.WARNING, f"[connection_pool] Error closing discarded connection ({self.name})")
+
+    def checkout(self):
+        """
+        Takes a connection from the pool, opening a new one while the pool is below max_size,
+        or waiting up to checkout_timeout seconds for one to be checked in.
+
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + self.checkout_timeout
+        connection = None
+        last_used = None
+        with self.condition:
+            self.evict_idle()
+            while True:
+                if self.idle:
+                    connection, last_used = self.idle.pop()
+                    self.in_use.add(connection)
+                    break
+                if len(self.in_use) + self.opening < self.max_size:
+                    self.opening += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise Exception(f"[connection_pool] Timed out after {self.checkout_timeout}s waiting for a connection ({self.name}, max_size: {self.max_size})")
+                self.waiting += 1
+                self.condition.wait(remaining)
+                self.waiting -= 1
+
+        if connection is None:
+            try:
+                connection = self.open_connection()
+            finally:
+                with self.condition:
+                    self.opening -= 1
+                    if connection is not None:
+                        self.in_use.add(connection)
+                    self.condition.notify()
+        elif not self.is_healthy(connection, last_used):
+            log(Level.WARNING, f"[connection_pool] Replacing broken connection ({self.name})")
+            self.discard(connection)
+            with self.condition:
+                self.in_use.discard(connection)
+                self.opening += 1
+            new_connection = None
+            try:
+                new_connection = self.open_connection()
+            finally:
+                with self.condition:
+                    self.opening -= 1
+                    if new_connection is not None:
+                        self.in_use.add(new_connection)
+                    self.condition.notify()
+            connection = new_connection
+
+        wait_time = time.perf_counter() - start_time
+        with self.condition:
+            self.checkouts += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+        return connection
+
+    def checkin(self, connection):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back and the session is reset
+        with DISCARD ALL (held cursors, temporary tables, settings), so the next user starts clean;
+        connections that fail to reset are closed instead of being reused.
+
+        """
+        healthy = False
+        psycopg2_connection = connection.connection
+        if psycopg2_connection is not None and not psycopg2_connection.closed:
+            try:
+                psycopg2_connection.rollback()
+                # DISCARD ALL cannot run inside a transaction block
+                psycopg2_connection.autocommit = True
+                cursor = psycopg2_connection.cursor()
+                try:
+                    cursor.execute("DISCARD ALL")
+                finally:
+                    cursor.close()
+                psycopg2_connection.autocommit = False
+                healthy = True
+            except Exception:
+                healthy = False
+
+        with self.condition:
+            if connection not in self.in_use:
+                return
+            self.in_use.discard(connection)
+            if healthy:
+                self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+        if not healthy:
+            self.discard(connection)
+
+    def evict_idle(self):
+        """
+        Closes connections that have been idle for longer than idle_timeout, keeping at least min_size open.
+        Must be called with the pool lock held.
+
+        """
+        now = time.monotonic()
+        while self.idle and len(self.idle) + len(self.in_use) > self.min_size:
+            connection, last_used = self.idle[0]
+            if now - last_used < self.idle_timeout:
+                break
+            self.idle.popleft()
+            self.discard(connection)
+
+    def close_all(self):
+        with self.condition:
+            connections = [connection for connection, _ in self.idle] + list(self.in_use)
+            self.idle.clear()
+            self.in_use.clear()
+            self.condition.notify_all()
+        for connection in connections:
+            self.discard(connection)
+
+    def stats(self):
+        with self.condition:
+            return {
+                'in_use': len(self.in_use),
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                'max_size': self.max_size,
+                'created': self.created,
+                'checkouts': self.checkouts,
+                'total_wait_time': round(self.total_wait_time, 4),
+                'max_wait_time': round(self.max_wait_time, 4),
+                'avg_wait_time': round(self.total_wait_time / self.checkouts, 4) if self.checkouts else 0.0,
+            }
+
+
+class PostgreSQLPoolManager:
+    """
+    A singleton class that keeps one PostgreSQLConnectionPool per server/database/user.
+
+    Attributes:
+        pools (dict): The pools, keyed by their name.
+        settings (dict): The settings applied to every pool (min_size, max_size, idle_timeout, checkout_timeout, health_check_interval).
+    """
+    _instance = None
+    SETTINGS = ('min_size', 'max_size', 'idle_timeout', 'checkout_timeout', 'health_check_interval')
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PostgreSQLPoolManager, cls).__new__(cls)
+            cls._instance.pools = {}
+            cls._instance.lock = threading.Lock()
+            cls._instance.settings = {}
+        return cls._instance
+
+    def configure(self, **settings):
+        """
+        Updates the pool settings. Existing pools are updated in place.
+
+        """
+        for key in settings:
+            if key not in PostgreSQLPoolManager.SETTINGS:
+                raise Exception(f"[connection_pool] Unknown pool setting '{key}'")
+        with self.lock:
+            self.settings.update(settings)
+            for pool in self.pools.values():
+                with pool.condition:
+                    for key, value in settings.items():
+                        setattr(pool, key, value)
+                    pool.condition.notify_all()
+
+    def get_pool(self, db_credentials):
+        name = PostgreSQLConnectionPool.pool_name(db_credentials)
+        with self.lock:
+            pool = self.pools.get(name)
+            if pool is None:
+                pool = PostgreSQLConnectionPool(db_credentials, **self.settings)
+                self.pools[name] = pool
+                log(Level.DEBUG, f"[connection_pool] Pool {name} created (max_size: {pool.max_size})")
+            return pool
+
+    def stats(self):
+        with self.lock:
+            pools = list(self.pools.items())
+        return {name: pool.stats() for name, pool in pools}
+
+    def close_all(self):
+        with self.lock:
+            pools = list(self.pools.values())
+            self.pools = {}
+        for pool in pools:
+            pool.close_all()
+
+    def discard_inherited_pools(self):
+        """
+        Forgets the pools inherited from a parent process (after a fork) without closing them,
+        since their sockets still belong to the parent.
+
+        """
+        self.lock = threading.Lock()
+        self.pools = {}
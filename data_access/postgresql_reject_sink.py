@@ -0,0 +1,94 @@
+import os
+import csv
+import json
+import threading
+
+from data_access.postgresql_bulk_load import quote_identifier
+from system_logging.log_manager import log, Level
+
+
+def error_fields(error):
+    """
+    Returns the SQLSTATE and the message of a database error (the first line of the server message).
+
+    """
+    message = getattr(error, "pgerror", None) or str(error)
+    return getattr(error, "pgcode", None), message.strip().splitlines()[0] if message.strip() else ""
+
+
+def writer_columns(writer):
+    return writer.orderned_columns or [column.name for column in writer.table.columns]
+
+
+class RejectFile:
+    """
+    A reject sink appending the rows rejected by writers to a CSV file, with the columns of the row
+    followed by error_sqlstate and error_message. The header is written when the file is created.
+
+    Attributes:
+        path (str): The path of the CSV file.
+        rows (int): The number of rows written by this sink.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return self.path
+
+    def reject(self, writer, row, error):
+        sqlstate, message = error_fields(error)
+        with self.lock:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            with open(self.path, "a", newline="", encoding="utf-8") as file:
+                csv_writer = csv.writer(file)
+                if new_file:
+                    csv_writer.writerow(list(writer_columns(writer)) + ["error_sqlstate", "error_message"])
+                csv_writer.writerow(list(row) + [sqlstate, message])
+            self.rows += 1
+
+
+class PostgreSQLRejectTable:
+    """
+    A reject sink inserting the rows rejected by writers into a table (created if needed), as JSON with
+    the source table and the error. The rows are inserted on the writer's connection, in its transaction,
+    so they are committed (or rolled back) together with the good rows.
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The connection of the writers.
+        table_name (str): The name of the reject table.
+        schema (str): The schema of the reject table.
+        rows (int): The number of rows written by this sink.
+    """
+    def __init__(self, postgresql, table_name, schema=None):
+        self.postgresql = postgresql
+        self.table_name = table_name
+        self.schema = schema or "public"
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def __str__(self):
+        return f"{self.schema}.{self.table_name}"
+
+    def qualified_name(self):
+        return f"{quote_identifier(self.schema)}.{quote_identifier(self.table_name)}"
+
+    def reject(self, writer, row, error):
+        sqlstate, message = error_fields(error)
+        data = json.dumps(dict(zip(writer_columns(writer), row)), default=str)
+        with self.lock:
+            cursor = self.postgresql.connection.cursor()
+            try:
+                # Runs in the transaction of the writer, so the table is created again after a rollback
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS {self.qualified_name()} (source_table text, row_data jsonb, "
+                               f"error_sqlstate text, error_message text, rejected_at timestamptz DEFAULT now())")
+                sql = f"INSERT INTO {self.qualified_name()} (source_table, row_data, error_sqlstate, error_message) VALUES (%s, %s, %s, %s)"
+                log(Level.SQL, f"Query: {sql}")
+                cursor.execute(sql, (f"{writer.schema}{writer.table.name}", data, sqlstate, message))
+            finally:
+                cursor.close()
+            self.rows += 1
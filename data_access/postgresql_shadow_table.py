@@ -0,0 +1,213 @@
+from data_access.metadata_cache import MetadataCache
+from data_access.postgresql_bulk_load import quote_identifier
+from system_logging.log_manager import log, Level
+
+MAX_IDENTIFIER_LENGTH = 63
+
+
+def suffixed_name(name, suffix):
+    return f"{name[:MAX_IDENTIFIER_LENGTH - len(suffix)]}{suffix}"
+
+
+class PostgreSQLShadowTable:
+    """
+    A class to reload a table through an UNLOGGED copy (the shadow table) swapped in when the load is done.
+
+    create() creates the shadow with the columns, defaults, identities and check constraints of the table but
+    without indexes, so rows are written without WAL or index maintenance while readers keep using the table.
+    swap() makes the shadow LOGGED, builds the indexes, constraints and grants of the table on it, analyzes it,
+    and replaces the table in one short transaction (rename, drop of the old table, foreign keys of the other
+    tables pointing at it recreated as NOT VALID and validated afterwards).
+
+    Tables with triggers, rules or views depending on them are refused, since they would be lost by the swap.
+
+    Attributes:
+        postgresql (PostgreSQLConnection): The connection running the statements.
+        table_name (str): The name of the table being reloaded.
+        schema (str): The schema of the table.
+        shadow_name (str): The name of the shadow table.
+    """
+    INDEXES_SQL = """
+        SELECT i.relname, pg_get_indexdef(ix.indexrelid)
+        FROM pg_catalog.pg_index ix
+        JOIN pg_catalog.pg_class i ON i.oid = ix.indexrelid
+        WHERE ix.indrelid = %s::regclass
+        AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con WHERE con.conindid = ix.indexrelid AND con.conrelid = ix.indrelid)
+        ORDER BY i.relname
+    """
+    CONSTRAINTS_SQL = """
+        SELECT con.conname, con.contype, con.confrelid = con.conrelid, pg_get_constraintdef(con.oid)
+        FROM pg_catalog.pg_constraint con
+        WHERE con.conrelid = %s::regclass AND con.contype IN ('p', 'u', 'x', 'f')
+        ORDER BY con.contype DESC, con.conname
+    """
+    REFERENCING_SQL = """
+        SELECT n.nspname, c.relname, con.conname, pg_get_constraintdef(con.oid)
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class c ON c.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE con.confrelid = %s::regclass AND con.conrelid <> con.confrelid AND con.contype = 'f'
+        ORDER BY n.nspname, c.relname, con.conname
+    """
+    SEQUENCES_SQL = """
+        SELECT a.attname, a.attidentity <> '', pg_get_serial_sequence(%s, a.attname)
+        FROM pg_catalog.pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        AND pg_get_serial_sequence(%s, a.attname) IS NOT NULL
+    """
+    GRANTS_SQL = """
+        SELECT acl.privilege_type, CASE WHEN acl.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END
+        FROM pg_catalog.pg_class c
+        CROSS JOIN LATERAL aclexplode(c.relacl) AS acl
+        LEFT JOIN pg_catalog.pg_roles r ON r.oid = acl.grantee
+        WHERE c.oid = %s::regclass AND acl.grantee <> c.relowner
+    """
+    DEPENDENTS_SQL = """
+        SELECT (SELECT COUNT(*) FROM pg_catalog.pg_trigger t WHERE t.tgrelid = %s::regclass AND NOT t.tgisinternal),
+               (SELECT COUNT(DISTINCT r.ev_class) FROM pg_catalog.pg_depend d
+                JOIN pg_catalog.pg_rewrite r ON r.oid = d.objid
+                WHERE d.classid = 'pg_catalog.pg_rewrite'::regclass AND d.refobjid = %s::regclass AND r.ev_class <> %s::regclass)
+    """
+
+    def __init__(self, postgresql, table_name, schema=None):
+        self.postgresql = postgresql
+        self.table_name = table_name
+        self.schema = schema or "public"
+        self.shadow_name = suffixed_name(table_name, "_shadow")
+
+    def qualified_name(self, name):
+        return f"{quote_identifier(self.schema)}.{quote_identifier(name)}"
+
+    def execute(self, sql, params=None, fetch=False):
+        cursor = self.postgresql.connection.cursor()
+        try:
+            log(Level.SQL, f"Query: {sql} {params or ''}")
+            cursor.execute(sql, params)
+            return cursor.fetchall() if fetch else None
+        finally:
+            cursor.close()
+
+    def exists(self):
+        return self.execute("SELECT to_regclass(%s) IS NOT NULL", (self.qualified_name(self.shadow_name),), fetch=True)[0][0]
+
+    def check(self):
+        target = self.qualified_name(self.table_name)
+        triggers, views = self.execute(self.DEPENDENTS_SQL, (target, target, target), fetch=True)[0]
+        if triggers or views:
+            raise Exception(f"Cannot reload {target} through a shadow table: it has {triggers} triggers and {views} dependent views or rules")
+
+    def create(self, reuse=False):
+        """
+        Creates the shadow table, empty. With reuse, an existing shadow table (left by an interrupted load
+        being resumed) is kept as it is.
+
+        """
+        try:
+            self.check()
+            if reuse and self.exists():
+                log(Level.INFO, f"Loading into the existing shadow table {self.schema}.{self.shadow_name}")
+            else:
+                shadow = self.qualified_name(self.shadow_name)
+                self.execute(f"DROP TABLE IF EXISTS {shadow}")
+                self.execute(f"CREATE UNLOGGED TABLE {shadow} (LIKE {self.qualified_name(self.table_name)} "
+                             f"INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING GENERATED INCLUDING CONSTRAINTS INCLUDING STORAGE)")
+            self.postgresql.connection.commit()
+        except Exception as e:
+            self.postgresql.connection.rollback()
+            raise e
+        MetadataCache().invalidate(credentials_name=self.postgresql.db_credentials.name)
+
+    def prepare(self):
+        """
+        Makes the shadow table LOGGED, creates the indexes, constraints and grants of the table on it,
+        moves its identity sequences past the loaded values and analyzes it. Returns the renames to run
+        once it replaced the table, and the foreign keys referencing the table itself, as (name, definition).
+
+        """
+        target = self.qualified_name(self.table_name)
+        shadow = self.qualified_name(self.shadow_name)
+        renames = []
+        self_references = []
+
+        self.execute(f"ALTER TABLE {shadow} SET LOGGED")
+        for name, definition in self.execute(self.INDEXES_SQL, (target,), fetch=True):
+            shadow_index = suffixed_name(name, "_shadow")
+            on_table = definition.split(" ON ", 1)[1].split(" USING ", 1)[1]
+            unique = "UNIQUE " if definition.startswith("CREATE UNIQUE") else ""
+            self.execute(f"CREATE {unique}INDEX {quote_identifier(shadow_index)} ON {shadow} USING {on_table}")
+            renames.append(f"ALTER INDEX {self.qualified_name(shadow_index)} RENAME TO {quote_identifier(name)}")
+        for name, contype, self_reference, definition in self.execute(self.CONSTRAINTS_SQL, (target,), fetch=True):
+            if contype == "f":
+                if self_reference:
+                    # References the table itself, so it is added once the shadow has its name
+                    self_references.append((name, definition))
+                else:
+                    self.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {quote_identifier(name)} {definition}")
+                continue
+            shadow_constraint = suffixed_name(name, "_shadow")
+            self.execute(f"ALTER TABLE {shadow} ADD CONSTRAINT {quote_identifier(shadow_constraint)} {definition}")
+            renames.append(f"ALTER TABLE {target} RENAME CONSTRAINT {quote_identifier(shadow_constraint)} TO {quote_identifier(name)}")
+        for privilege, grantee in self.execute(self.GRANTS_SQL, (target,), fetch=True):
+            self.execute(f"GRANT {privilege} ON {shadow} TO {grantee}")
+        for column, identity, sequence in self.execute(self.SEQUENCES_SQL, (shadow, shadow, shadow), fetch=True):
+            if identity:
+                quoted = quote_identifier(column)
+                self.execute(f"SELECT setval(%s, COALESCE(MAX({quoted}), 0) + 1, false) FROM {shadow}", (sequence,))
+        self.execute(f"ANALYZE {shadow}")
+        return renames, self_references
+
+    def swap(self):
+        """
+        Replaces the table by the loaded shadow table. Only the final renames run while the table is
+        locked; the indexes are built before, and the foreign keys pointing at the table are validated after.
+
+        """
+        target = self.qualified_name(self.table_name)
+        shadow = self.qualified_name(self.shadow_name)
+        old_name = suffixed_name(self.table_name, "_swap_old")
+        try:
+            renames, self_references = self.prepare()
+            self.postgresql.connection.commit()
+
+            referencing = self.execute(self.REFERENCING_SQL, (target,), fetch=True)
+            sequences = [(column, sequence) for column, identity, sequence in self.execute(self.SEQUENCES_SQL, (target, target, target), fetch=True) if not identity]
+            self.execute(f"LOCK TABLE {target} IN ACCESS EXCLUSIVE MODE")
+            for schema, table_name, name, _ in referencing:
+                self.execute(f"ALTER TABLE {quote_identifier(schema)}.{quote_identifier(table_name)} DROP CONSTRAINT {quote_identifier(name)}")
+            for column, sequence in sequences:
+                # Serial sequences are owned by the old table and would be dropped with it
+                self.execute(f"ALTER SEQUENCE {sequence} OWNED BY {shadow}.{quote_identifier(column)}")
+            self.execute(f"ALTER TABLE {target} RENAME TO {quote_identifier(old_name)}")
+            self.execute(f"ALTER TABLE {shadow} RENAME TO {quote_identifier(self.table_name)}")
+            self.execute(f"DROP TABLE {self.qualified_name(old_name)}")
+            for sql in renames:
+                self.execute(sql)
+            foreign_keys = [(f"{quote_identifier(schema)}.{quote_identifier(table_name)}", name, definition) for schema, table_name, name, definition in referencing]
+            foreign_keys += [(target, name, definition) for name, definition in self_references]
+            for table, name, definition in foreign_keys:
+                self.execute(f"ALTER TABLE {table} ADD CONSTRAINT {quote_identifier(name)} {definition} NOT VALID")
+            self.postgresql.connection.commit()
+        except Exception as e:
+            self.postgresql.connection.rollback()
+            log(Level.ERROR, f"Error swapping the shadow table {self.schema}.{self.shadow_name} into {self.schema}.{self.table_name}")
+            raise e
+        finally:
+            MetadataCache().invalidate(credentials_name=self.postgresql.db_credentials.name)
+
+        # Validation only takes a SHARE UPDATE EXCLUSIVE lock, so it runs after the swap
+        for table, name, _ in foreign_keys:
+            try:
+                self.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {quote_identifier(name)}")
+                self.postgresql.connection.commit()
+            except Exception as e:
+                self.postgresql.connection.rollback()
+                log(Level.WARNING, f"Foreign key {name} of {table} left NOT VALID: {e}")
+        log(Level.INFO, f"Shadow table swapped into {self.schema}.{self.table_name}")
+
+    def drop(self):
+        try:
+            self.execute(f"DROP TABLE IF EXISTS {self.qualified_name(self.shadow_name)}")
+            self.postgresql.connection.commit()
+        except Exception as e:
+            self.postgresql.connection.rollback()
+            raise e
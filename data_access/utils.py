@@ -1,5 +1,7 @@
+import io
 import time
 import random
+import datetime
 
 
 def format_reserved_word(word):
@@ -37,3 +39,69 @@ def unique_timestamp_string_id():
     
     """
     return f"{int(time.time() * 1000):x}{random.randint(0, 255):02x}"
+
+
+COPY_NULL = "\\N"
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def format_array_literal(values):
+    """
+    Formats a Python list as a PostgreSQL array literal (e.g. {1,"a b",NULL}).
+    
+    """
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        elif isinstance(value, (list, tuple)):
+            items.append(format_array_literal(value))
+        else:
+            text = format_copy_value(value, escape=False)
+            text = text.replace("\\", "\\\\").replace('"', '\\"')
+            items.append(f'"{text}"')
+    return "{" + ",".join(items) + "}"
+
+
+def format_copy_value(value, escape=True):
+    """
+    Formats a single value for the text format of PostgreSQL COPY.
+
+    None becomes the NULL marker (\\N), booleans become t/f, bytes are written
+    as bytea hex and backslashes, tabs and line breaks are escaped.
+    """
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        text = "\\x" + bytes(value).hex()
+    elif isinstance(value, (datetime.date, datetime.time)):
+        text = value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        text = format_array_literal(value)
+    else:
+        text = str(value)
+    if escape:
+        return text.translate(COPY_ESCAPES)
+    return text
+
+
+def rows_to_copy_buffer(rows):
+    """
+    Serializes a list of rows into an in-memory buffer ready for COPY ... FROM STDIN.
+    
+    """
+    lines = ["\t".join([format_copy_value(value) for value in row]) for row in rows]
+    lines.append("")
+    return io.StringIO("\n".join(lines))
+
+
+def format_rows_per_second(rows, seconds):
+    """
+    Formats the throughput of an operation as rows per second.
+    
+    """
+    if seconds <= 0:
+        return "n/a"
+    return f"{int(rows / seconds)}"
@@ -14,7 +14,7 @@ class DataMigrationModule(GenericModule):
         try:
             start_time = time.perf_counter()
             
-            Mapper().start_migration()
+            Mapper().start_migration(resume=self.resume)
             
             end_time = time.perf_counter()
             execution_time_seconds = end_time - start_time
@@ -1,10 +1,73 @@
 import os
+import copy
 import time
+import itertools
 import importlib.util
-from configs.yaml_manager import load_data_migration, get_rules_folder
+import yaml
+import pandas as pd
+from decimal import Decimal
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from configs.dependency_scheduler import DependencyScheduler
+from configs.checkpoint_manager import CheckpointStore, TableCheckpoint
+from configs.yaml_manager import load_data_migration, get_rules_folder, load_metadata_cache_file, save_metadata_cache_file
 from system_logging.log_manager import log, Level
 from data_access.db_factory import DatabaseFactory
 from data_access.metadata_models import Table
+from data_migration.rule import Input
+from data_access.metadata_cache import MetadataCache
+
+
+WATERMARKS = "watermarks"  # The checkpoint module holding the high watermarks of the incremental rules
+INSUFFICIENT_PRIVILEGE = "42501"  # The SQLSTATE of a permission error, which makes copy rules fall back to COPY
+
+
+def init_rule_worker():
+    DatabaseFactory().discard_inherited_connections()
+
+
+def load_rule_module(rule_name, rule_file):
+    spec = importlib.util.spec_from_file_location(rule_name, rule_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+transform_worker_state = {}  # The rule module and context of a transform worker process
+
+
+def init_transform_worker(rule_name, rule_file, context):
+    DatabaseFactory().discard_inherited_connections()
+    transform_worker_state['module'] = load_rule_module(rule_name, rule_file)
+    transform_worker_state['context'] = context
+
+
+def transform_batch_worker(batch):
+    return transform_worker_state['module'].transform_batch(batch, transform_worker_state['context'])
+
+
+def context_value_changed(old_value, new_value):
+    try:
+        return bool(old_value != new_value)
+    except Exception:
+        return True
+
+
+def run_rule_task(rule, context, checkpoint=None):
+    """
+    Runs a rule on a private copy of the context and returns its changes, as a dict with
+    the 'updated' values and the 'removed' keys, to be merged into the shared context.
+
+    """
+    if checkpoint is not None:
+        Mapper().checkpoint = checkpoint
+    rule_context = copy.deepcopy(context)
+    Mapper().run_rule(rule, rule_context)
+    updated = {key: value for key, value in rule_context.items() if key not in context or context_value_changed(context[key], value)}
+    removed = [key for key in context if key not in rule_context]
+    return {'updated': updated, 'removed': removed}
+
+
 class Mapper:
     """
     A singleton class to manage mapping processes.
@@ -24,8 +87,16 @@ class Mapper:
             cls._instance.rules = []
             cls._instance.buffer_size = 1000
             cls._instance.bulk_commit = False
+            cls._instance.load_mode = "insert"
+            cls._instance.connection_pool = {}
+            cls._instance.metadata_cache = {}
+            cls._instance.parallelism = 1
+            cls._instance.executor = "thread"
+            cls._instance.async_flush = False
+            cls._instance.prefetch = 0
+            cls._instance.checkpoint = None
             load_data_migration(cls._instance, configs=None)   
-            log(Level.DEBUG, f'[data_migration] Starting mapping process (buffer_size: {cls._instance.buffer_size}, bulk_commit: {cls._instance.bulk_commit})\n')
+            log(Level.DEBUG, f'[data_migration] Starting mapping process (buffer_size: {cls._instance.buffer_size}, bulk_commit: {cls._instance.bulk_commit}, load_mode: {cls._instance.load_mode})\n')
             for rule in cls._instance.rules:
                 log(Level.DEBUG, rule)      
         return cls._instance
@@ -34,69 +105,510 @@ class Mapper:
         self._instance.rules = []
         self._instance.buffer_size = 1000
         self._instance.bulk_commit = False
+        self._instance.load_mode = "insert"
+        self._instance.connection_pool = {}
+        self._instance.metadata_cache = {}
+        self._instance.parallelism = 1
+        self._instance.executor = "thread"
+        self._instance.async_flush = False
+        self._instance.prefetch = 0
+        self._instance.checkpoint = None
         load_data_migration(self._instance, configs=configs)
-        log(Level.DEBUG, f'[data_migration] Starting mapping process (buffer_size: {self._instance.buffer_size}, bulk_commit: {self._instance.bulk_commit})\n')
+        log(Level.DEBUG, f'[data_migration] Starting mapping process (buffer_size: {self._instance.buffer_size}, bulk_commit: {self._instance.bulk_commit}, load_mode: {self._instance.load_mode})\n')
         
 
-    def start_migration(self):
+    def start_migration(self, resume=False):
+        """
+        Runs the rules. Progress is checkpointed under private/checkpoints/data_migration; with resume, the rules
+        completed by the previous run are skipped (their context is restored) and the others restart from
+        their last checkpoint.
+
+        """
         log(Level.INFO, '[data_migration] Starting data migration\n')
-        context = {}
-        for rule in self.rules:
+        DatabaseFactory().configure_pool(**self.connection_pool)
+        self.load_metadata_cache()
+        self.checkpoint = CheckpointStore("data_migration")
+        if not resume:
+            self.checkpoint.clear()
+        context = self.load_checkpoint_context() if resume else {}
+        try:
+            if self.parallelism and self.parallelism > 1:
+                self.run_rules_parallel(context)
+                return
+
+            # Rules run in file order, moved after the rules they depend on
+            rules = {rule.name: rule for rule in self.rules}
+            for name in self.rule_scheduler().ordered_tasks():
+                self.run_rule(rules[name], context)
+                self.save_checkpoint_context(context)
+        finally:
+            log(Level.DEBUG, f"[data_migration] Connection pool stats: {DatabaseFactory().pool_stats()}")
+            DatabaseFactory().close_all_connections()
+            self.save_metadata_cache()
 
+    def rule_scheduler(self, args=None):
+        """
+        Returns a DependencyScheduler holding the rules to run (run_rule_task tasks), without the skipped
+        rules and those completed by the previous run, which are not waited for. args returns the arguments
+        of the task of a rule.
+
+        """
+        checkpoint = self.checkpoint
+        completed = {rule.name for rule in self.rules if checkpoint is not None and checkpoint.is_completed(rule.name)}
+        skipped = {rule.name for rule in self.rules if rule.skip} | completed
+        scheduler = DependencyScheduler()
+        for rule in self.rules:
             if rule.skip:
                 log(Level.INFO, f"[data_migration] Rule {rule.name} skipped\n")
                 continue
-            
-            start_time = time.perf_counter()
-
-            # Check if the corresponding rule file exists
-            rule_file = f"{get_rules_folder()}/{rule.name}.py"
-            
-            if not os.path.isfile(rule_file):
-                raise FileNotFoundError(f"Rule file {rule_file} not found")
-
-            # Load the module dynamically
-            spec = importlib.util.spec_from_file_location(rule.name, rule_file)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
-
-            # Ensure the module contains the 'exec' function
-            if not hasattr(module, "exec"):
-                raise AttributeError(f"Function 'exec' not found in {rule_file}")
-
-            # Execute the rule function with inputs and outputs
-            
-            database_inputs = []
-            for input in rule.inputs:
-                database_inputs.append(DatabaseFactory().create(
-                    input.credentials,
-                    buffer_size=self.buffer_size,
-                    bulk_commit=self.bulk_commit,
-                    query=input.query))
-              
-            database_outputs = []
-            for output in rule.outputs:
-                database_outputs.append(DatabaseFactory().create(
-                    output.credentials,
-                    buffer_size=self.buffer_size,
-                    bulk_commit=self.bulk_commit,
-                    table=Table(output.table, 0),
-                    table_name=output.table,
-                    ))
-                
-            
-            module.exec(database_inputs, database_outputs, context)
-            DatabaseFactory().close_all_connections()
+            if rule.name in completed:
+                log(Level.INFO, f"[data_migration] Rule {rule.name} already completed, skipped\n")
+                continue
+            scheduler.add_task(rule.name, run_rule_task,
+                               args=args(rule) if args is not None else (),
+                               depends_on=[name for name in rule.depends_on if name not in skipped])
+        return scheduler
+
+    def run_rules_parallel(self, context):
+        """
+        Runs the rules on a pool of parallelism threads (or processes, see executor). A rule starts as
+        soon as the rules listed in its depends_on succeeded; rules depending on a failed rule are not run.
+
+        Each rule works on a copy of the context taken when it starts, so it sees the values set by the
+        rules it depends on. Its changes are merged back into the shared context when it succeeds (when
+        rules running at the same time set the same key, the last one to finish wins).
+        """
+        checkpoint = self.checkpoint
+        scheduler = self.rule_scheduler(args=lambda rule: lambda: (rule, dict(context), checkpoint))
+
+        def merge_context(task_result):
+            if task_result.status != "success":
+                return
+            context.update(task_result.result['updated'])
+            for key in task_result.result['removed']:
+                context.pop(key, None)
+            self.save_checkpoint_context(context)
+
+        log(Level.INFO, f"[data_migration] Running rules on {self.parallelism} {self.executor}s\n")
+        if self.executor == "process":
+            executor = ProcessPoolExecutor(max_workers=self.parallelism, initializer=init_rule_worker)
+        else:
+            executor = ThreadPoolExecutor(max_workers=self.parallelism)
+        with executor:
+            results = scheduler.run(executor, on_complete=merge_context)
+
+        failed = [task_result for task_result in results.values() if task_result.status != "success"]
+        for task_result in failed:
+            log(Level.ERROR, f"[data_migration] Rule {task_result.name} {task_result.status}: {task_result.error}")
+        if failed:
+            raise Exception(f"[data_migration] {len(failed)} of {len(results)} rules did not run successfully")
+
+    def load_checkpoint_context(self):
+        entry = self.checkpoint.get("context") or {}
+        return dict(entry.get("values") or {})
+
+    def save_checkpoint_context(self, context):
+        """
+        Saves the context after a rule completed, so that a resumed run starts with the values set by the
+        rules it skips. Contexts holding values that cannot be written as YAML are not saved.
+
+        """
+        if self.checkpoint is None:
+            return
+        try:
+            yaml.safe_dump(context)
+        except yaml.YAMLError:
+            log(Level.WARNING, "[data_migration] The context cannot be saved as YAML, a resumed run starts with an empty context")
+            return
+        self.checkpoint.save("context", values=context)
+
+    def table_checkpoint(self, rule, table_name):
+        """
+        Returns the rows committed into an output table by the previous run of the rule and the writer
+        on_commit callback recording them.
+
+        """
+        key = f"{rule.name}.{table_name}"
+        rows = self.checkpoint.committed_rows(key)
+        return rows, TableCheckpoint(self.checkpoint, key, rows)
+
+    def load_metadata_cache(self):
+        cache = MetadataCache()
+        cache.configure(ttl=self.metadata_cache.get('ttl', 300))
+        if self.metadata_cache.get('snapshot', False):
+            loaded = cache.load_dict(load_metadata_cache_file())
+            log(Level.DEBUG, f"[data_migration] {loaded} tables loaded from the metadata cache snapshot")
+
+    def save_metadata_cache(self):
+        cache = MetadataCache()
+        log(Level.DEBUG, f"[data_migration] Metadata cache stats: {cache.stats()}")
+        if self.metadata_cache.get('snapshot', False):
+            save_metadata_cache_file(cache.to_dict())
+
+    def run_copy_rule(self, rule):
+        """
+        Runs a rule declared with copy: true, without a rule file: each input query is inserted into the
+        output table at the same position. When both sides are on the same database (and pushdown is
+        enabled) a single INSERT INTO ... SELECT runs on the server, otherwise the rows are streamed with COPY.
+        Each pair is committed in one transaction and recorded in the checkpoint of the rule, so a resumed
+        run skips the pairs already copied. A crash between a commit and its record copies that pair again.
+
+        """
+        try:
+            shadows = self.create_shadow_tables(rule)
+            copied = list((self.checkpoint.get(rule.name) or {}).get("copied_pairs", [])) if self.checkpoint is not None else []
+            for index, (input, output) in enumerate(zip(rule.inputs, rule.outputs)):
+                if index in copied:
+                    log(Level.INFO, f"[data_migration] Rule {rule.name}: {output.table} already copied by the previous run, skipped")
+                    continue
+                source = DatabaseFactory().create(input.credentials, query=input.query)
+                target = DatabaseFactory().create(output.credentials, table_name=output.table)
+                table_name = shadows[output.table].shadow_name if output.table in shadows else output.table
+                if rule.pushdown and source.same_database(target):
+                    target.create_connection()
+                    try:
+                        rows = target.insert_select(input.query, table_name=table_name, columns=rule.columns)
+                        log(Level.INFO, f"[data_migration] Rule {rule.name}: {rows} rows inserted into {table_name} (INSERT ... SELECT)")
+                        self.save_copied_pair(rule, copied, index)
+                        continue
+                    except Exception as e:
+                        if getattr(e, "pgcode", None) != INSUFFICIENT_PRIVILEGE:
+                            raise e
+                        log(Level.WARNING, f"[data_migration] Rule {rule.name}: the output user cannot run the query, copying with COPY instead: {e}")
+                    target.close_connection()
+                # Never shared: both sides stream at the same time, even on the same database
+                source.create_connection()
+                target.create_connection()
+                rows = source.pipe_to(target, table_name=table_name, columns=rule.columns)
+                log(Level.INFO, f"[data_migration] Rule {rule.name}: {rows} rows copied into {table_name} (COPY)")
+                self.save_copied_pair(rule, copied, index)
+            self.swap_shadow_tables(shadows)
+        finally:
+            DatabaseFactory().release_all_connections()
+
+    def save_copied_pair(self, rule, copied, index):
+        if self.checkpoint is None:
+            return
+        copied.append(index)
+        self.checkpoint.save(rule.name, status="running", copied_pairs=copied)
+
+    def create_shadow_tables(self, rule):
+        """
+        Creates the shadow table of every output of a rule declared with shadow: true, and returns them by
+        output table. The shadow tables of a rule resumed after writing rows are kept as they are.
+
+        """
+        shadows = {}
+        if not rule.shadow:
+            return shadows
+        for output in rule.outputs:
+            database = DatabaseFactory().create(output.credentials, table_name=output.table)
+            database.create_connection()
+            shadow = database.shadow_table()
+            resumed = self.checkpoint is not None and (
+                self.checkpoint.get(rule.name) is not None or self.checkpoint.committed_rows(f"{rule.name}.{output.table}") > 0)
+            shadow.create(reuse=resumed)
+            shadows[output.table] = shadow
+        return shadows
+
+    def swap_shadow_tables(self, shadows):
+        for shadow in shadows.values():
+            shadow.swap()
+
+    def iter_input_batches(self, rule, database_inputs):
+        for database in database_inputs:
+            reader = database.reader(batch_size=self.buffer_size, prefetch=self.prefetch)
+            for batch in reader.iter_batches(as_dict=rule.batch_format == "rows"):
+                if rule.batch_format == "dataframe":
+                    batch = pd.DataFrame.from_records(batch, columns=reader.columns)
+                yield batch
+
+    def parallel_transform(self, rule, rule_file, batches, context):
+        """
+        Runs transform_batch on a pool of rule.transform_workers processes and yields the results, in the
+        order of the batches when rule.ordered, otherwise as soon as they are ready. At most
+        rule.max_pending_batches batches are in flight, so the reader waits for the workers (backpressure).
+        The workers receive a copy of the context taken when the stage starts; their changes are not kept.
+
+        """
+        max_pending = rule.max_pending_batches or 2 * rule.transform_workers
+        executor = ProcessPoolExecutor(max_workers=rule.transform_workers, initializer=init_transform_worker,
+                                       initargs=(rule.name, rule_file, context))
+        pending = deque()
+
+        def next_results():
+            if rule.ordered:
+                return [pending.popleft().result()]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+            return [future.result() for future in done]
+
+        try:
+            for batch in batches:
+                pending.append(executor.submit(transform_batch_worker, batch))
+                while len(pending) >= max_pending:
+                    yield from next_results()
+            while pending:
+                yield from next_results()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run_transform_batch(self, rule, transform_batch, database_inputs, database_outputs, context, rule_file=None):
+        """
+        Feeds the rows of every input, in batches of buffer_size rows, to the rule's transform_batch(batch, context)
+        function and writes what it returns in bulk. A batch is a list of dicts, or a pandas DataFrame when the
+        rule sets batch_format: dataframe. The returned rows (list or DataFrame) go to the first output; a dict
+        of output table name -> rows writes to several outputs. Returning None writes nothing.
+        With transform_workers > 1 the batches are transformed in worker processes (see parallel_transform).
+
+        """
+        for database in database_inputs:
+            database.create_connection()
+        for database in database_outputs:
+            # With group_commit, the outputs of the same database share a connection and a transaction
+            database.create_connection(reuse=rule.group_commit is not None)
+        transactions = self.group_outputs(rule, database_outputs) if rule.group_commit is not None else []
+        writers = {database.table_name: database.writer() for database in database_outputs}
+        checkpoint_interval = rule.checkpoint_interval if self.checkpoint is not None else None
+        if checkpoint_interval:
+            # Only the checkpoints commit, so that no row is committed past the last recorded batch
+            for writer in writers.values():
+                writer.bulk_commit = False
+        default_table = database_outputs[0].table_name if database_outputs else None
+
+        batches = self.iter_input_batches(rule, database_inputs)
+        done_batches = 0
+        if checkpoint_interval:
+            done_batches = self.committed_batches(rule)
+            if done_batches:
+                log(Level.INFO, f"[data_migration] Rule {rule.name}: resuming after {done_batches} committed batches")
+                batches = itertools.islice(batches, done_batches, None)
+        if rule.transform_workers > 1 and rule_file is not None:
+            results = self.parallel_transform(rule, rule_file, batches, context)
+        else:
+            results = (transform_batch(batch, context) for batch in batches)
+
+        try:
+            for result in results:
+                if result is None:
+                    result = {}
+                elif not isinstance(result, dict):
+                    result = {default_table: result}
+                for table_name, rows in result.items():
+                    if table_name not in writers:
+                        raise Exception(f"Rule {rule.name} returned rows for {table_name}, which is not one of its outputs")
+                    writers[table_name].insert_batch(rows)
+                # Only between batches, so that a batch is committed whole across the outputs
+                for transaction in transactions:
+                    transaction.commit_if_due()
+                done_batches += 1
+                if checkpoint_interval and done_batches % checkpoint_interval == 0:
+                    self.commit_batches(rule, writers, done_batches)
+
+            if checkpoint_interval:
+                self.commit_batches(rule, writers, done_batches)
+            else:
+                self.commit_writers(writers)
+        except Exception as e:
+            for writer in self.distinct_writers(writers):
+                writer.rollback()
+            raise e
+        finally:
+            results.close()
+
+    def incremental_rule(self, rule):
+        """
+        Returns a copy of the rule whose input queries only read the rows changed since its last successful
+        run (incremental_key greater than the stored watermark and at most the current maximum), and the
+        new watermarks, by input query, to save once the rule succeeds.
+
+        """
+        previous = (CheckpointStore(WATERMARKS).get(rule.name) or {}).get("values") or {}
+        inputs = []
+        watermarks = {}
+        for input in rule.inputs:
+            source = DatabaseFactory().create(input.credentials, query=input.query)
+            source.create_connection()
+            try:
+                upper = source.max_value(rule.incremental_key)
+            finally:
+                source.close_connection()
+            if isinstance(upper, Decimal):
+                upper = str(upper)
+            lower = previous.get(input.query)
+            watermarks[input.query] = upper if upper is not None else lower
+            inputs.append(Input(input.credentials, source.delta_query(rule.incremental_key, lower=lower, upper=upper)))
+            log(Level.INFO, f"[data_migration] Rule {rule.name}: reading {rule.incremental_key} from {lower if lower is not None else 'the start'} to {upper}")
+        incremental = copy.copy(rule)
+        incremental.inputs = inputs
+        return incremental, watermarks
+
+    def save_watermarks(self, rule, watermarks):
+        CheckpointStore(WATERMARKS).save(rule.name, values=watermarks)
+
+    def group_outputs(self, rule, database_outputs):
+        """
+        Makes the outputs sharing a connection commit together: one transaction per connection, committed
+        after the first batch that reaches group_commit rows flushed by all its writers or group_commit
+        interval seconds. Returns the transactions.
+
+        """
+        transactions = {}
+        for database in database_outputs:
+            transaction = transactions.get(id(database.connection))
+            if transaction is None:
+                transactions[id(database.connection)] = database.transaction(
+                    commit_rows=rule.group_commit.get("rows"),
+                    commit_interval=rule.group_commit.get("interval"))
+            else:
+                transaction.attach(database)
+        log(Level.DEBUG, f"[data_migration] Rule {rule.name}: {len(database_outputs)} outputs committed in {len(transactions)} transactions")
+        return list(transactions.values())
+
+    @staticmethod
+    def distinct_writers(writers):
+        """
+        Returns one writer per transaction: committing or rolling back a writer of a group commits or
+        rolls back the whole group.
+
+        """
+        distinct = {}
+        for writer in writers.values():
+            distinct.setdefault(id(writer.coordinator or writer), writer)
+        return list(distinct.values())
+
+    def commit_writers(self, writers):
+        for writer in writers.values():
+            writer.flush_buffer()
+        for writer in self.distinct_writers(writers):
+            writer.commit()
+
+    def commit_batches(self, rule, writers, done_batches):
+        """
+        Commits the outputs of a transform_batch rule and records the number of input batches done,
+        which a resumed run skips. The checkpoint files cannot take part in the database transaction, so
+        the batches are first recorded as pending: if the run stops between the commit and its record,
+        the resumed run cannot tell whether they were committed (see committed_batches).
+
+        """
+        self.checkpoint.save(rule.name, status="running", pending_batches=done_batches)
+        self.commit_writers(writers)
+        self.checkpoint.save(rule.name, status="running", batches=done_batches, pending_batches=None)
+
+    def committed_batches(self, rule):
+        """
+        Returns the number of input batches committed by the previous run of a transform_batch rule. When it
+        stopped while committing, the pending batches may or may not be committed: they are written again
+        with write_mode: upsert, which merges the rows already there, and the resume is refused otherwise.
 
-            end_time = time.perf_counter()
-            execution_time_ms = int((end_time - start_time) * 1000)
+        """
+        entry = self.checkpoint.get(rule.name) or {}
+        pending = entry.get("pending_batches")
+        if pending is not None and rule.write_mode != "upsert":
+            raise Exception(f"[data_migration] Rule {rule.name} was interrupted while committing its first {pending} batches, "
+                            f"which may have been committed or not, so running it again could write them twice. "
+                            f"Use write_mode: upsert to resume it, or run without --resume.")
+        return entry.get("batches", 0)
+
+    def check_resumable(self, rule, module, database_outputs):
+        """
+        Refuses to run again a rule that committed rows before it was interrupted, unless running it again
+        cannot duplicate them: transform_batch rules with checkpoint_interval skip the committed batches,
+        upserts update the rows already written, and resumable rules skip output.checkpoint_rows themselves.
+
+        """
+        committed = [f"{database.table_name} ({database.checkpoint_rows} rows)" for database in database_outputs if database.checkpoint_rows]
+        if not committed or rule.write_mode == "upsert" or rule.resumable:
+            return
+        if rule.checkpoint_interval and not hasattr(module, "exec"):
+            return
+        raise Exception(f"[data_migration] Rule {rule.name} committed rows into {', '.join(committed)} before it was interrupted, "
+                        f"and running it again would write them twice. Set checkpoint_interval (transform_batch rules), "
+                        f"write_mode: upsert, or resumable: true if the rule skips output.checkpoint_rows itself; or run without --resume.")
+
+    def run_rule(self, rule, context):
+        start_time = time.perf_counter()
+
+        watermarks = None
+        if rule.incremental_key:
+            rule, watermarks = self.incremental_rule(rule)
+
+        if rule.copy:
+            self.run_copy_rule(rule)
+            if watermarks is not None:
+                self.save_watermarks(rule, watermarks)
+            if self.checkpoint is not None:
+                self.checkpoint.complete(rule.name)
+            execution_time_ms = int((time.perf_counter() - start_time) * 1000)
             log(Level.INFO, f"[data_migration] Rule {rule.name} executed in {execution_time_ms} ms\n")
-            
-            
-        
-           
-            
+            return
+
+        # Check if the corresponding rule file exists
+        rule_file = f"{get_rules_folder()}/{rule.name}.py"
         
+        if not os.path.isfile(rule_file):
+            raise FileNotFoundError(f"Rule file {rule_file} not found")
+
+        # Load the module dynamically
+        module = load_rule_module(rule.name, rule_file)
+
+        # Ensure the module contains the 'exec' (or 'transform_batch') function
+        if not hasattr(module, "exec") and not hasattr(module, "transform_batch"):
+            raise AttributeError(f"Function 'exec' or 'transform_batch' not found in {rule_file}")
+        if rule.group_commit is not None and hasattr(module, "exec"):
+            # exec rules create their own writers, group_commit would be silently ignored
+            raise Exception(f"[data_migration] Rule {rule.name} sets group_commit, which only applies to transform_batch rules; "
+                            f"exec rules can group their writers with output.transaction()")
+
+        # Execute the rule function with inputs and outputs
         
+        database_inputs = []
+        for input in rule.inputs:
+            database_inputs.append(DatabaseFactory().create(
+                input.credentials,
+                buffer_size=self.buffer_size,
+                bulk_commit=self.bulk_commit,
+                query=input.query,
+                load_mode=self.load_mode))
+          
+        database_outputs = []
+        for output in rule.outputs:
+            database_outputs.append(DatabaseFactory().create(
+                output.credentials,
+                buffer_size=self.buffer_size,
+                bulk_commit=self.bulk_commit,
+                table=Table(output.table, 0),
+                table_name=output.table,
+                load_mode=self.load_mode,
+                async_flush=self.async_flush,
+                write_mode=rule.write_mode,
+                conflict_key=rule.conflict_key,
+                ))
+            if self.checkpoint is not None:
+                database_outputs[-1].checkpoint_rows, database_outputs[-1].on_commit = self.table_checkpoint(rule, output.table)
+        if self.checkpoint is not None:
+            self.check_resumable(rule, module, database_outputs)
 
+        try:
+            shadows = self.create_shadow_tables(rule)
+            for database in database_outputs:
+                if database.table_name in shadows:
+                    # Writers fill the shadow table; table_name still names the output
+                    database.table = Table(shadows[database.table_name].shadow_name, 0)
+            if hasattr(module, "exec"):
+                module.exec(database_inputs, database_outputs, context)
+            else:
+                self.run_transform_batch(rule, module.transform_batch, database_inputs, database_outputs, context, rule_file=rule_file)
+            self.swap_shadow_tables(shadows)
+        finally:
+            # Connections go back to the pool and are reused by the next rules
+            DatabaseFactory().release_all_connections()
 
+        if watermarks is not None:
+            self.save_watermarks(rule, watermarks)
+        if self.checkpoint is not None:
+            self.checkpoint.complete(rule.name)
+        end_time = time.perf_counter()
+        execution_time_ms = int((end_time - start_time) * 1000)
+        log(Level.INFO, f"[data_migration] Rule {rule.name} executed in {execution_time_ms} ms\n")
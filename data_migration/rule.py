@@ -4,11 +4,27 @@ class Rule:
         self.inputs = [] 
         self.outputs = []
         self.skip = False
+        self.depends_on = []
+        self.copy = False
+        self.columns = None
+        self.pushdown = True
+        self.batch_format = "rows"
+        self.transform_workers = 1
+        self.ordered = True
+        self.max_pending_batches = None
+        self.checkpoint_interval = None
+        self.incremental_key = None
+        self.write_mode = "insert"
+        self.conflict_key = None
+        self.shadow = False
+        self.group_commit = None
+        self.resumable = False
 
     def __str__(self):
         inputs_str = "\n".join(str(inp) for inp in self.inputs)
         outputs_str = "\n".join(str(out) for out in self.outputs)
-        return f"Rule: {self.name}\nInputs:\n{inputs_str}\nOutputs:\n{outputs_str}\n"
+        depends_on_str = f"Depends on: {', '.join(self.depends_on)}\n" if self.depends_on else ""
+        return f"Rule: {self.name}\n{depends_on_str}Inputs:\n{inputs_str}\nOutputs:\n{outputs_str}\n"
 
 
 class Input:
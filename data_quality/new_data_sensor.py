@@ -1,30 +1,56 @@
 import sys
 import traceback
-import time
 
 from configs.generic_module import GenericModule
-from configs.yaml_manager import load_credentials, get_private_folder, load_yaml_file, save_sensor_file, load_sensor_file
+from configs.yaml_manager import load_credentials, get_private_folder, save_sensor_file, load_sensor_file, load_new_data_sensor
 from system_logging.log_manager import log, Level
 from data_access.db_factory import DatabaseFactory
 
 class NewDataModule(GenericModule):
     def __init__(self):
         super().__init__("New Data Sensor")
+
+    @staticmethod
+    def exact_counts(db, tables):
+        return {table: db.metadata(table_name=table).get_table_row_count() for table in tables}
+
+    @staticmethod
+    def estimated_counts(db, key, sensor_data, exact_tables, exact_threshold):
+        """
+        Reads the row count estimates of all tables with a single catalog query. COUNT(*) is only
+        executed for the tables listed in exact_tables (as "table" or "database.table") and for
+        tables whose estimate moved at least exact_threshold rows since the last run.
+
+        """
+        counts = {}
+        for table, stats in db.row_count_estimates().items():
+            count = stats['estimate']
+            old_count = sensor_data.get(f"{key}.{table}")
+            exact = table in exact_tables or f"{key}.{table}" in exact_tables
+            if not exact and exact_threshold is not None and old_count is not None:
+                exact = abs(count - old_count) >= exact_threshold
+            if exact:
+                count = db.metadata(table_name=table).get_table_row_count()
+            counts[table] = count
+        return counts
         
     def run(self, configs: dict):
         try:
             
             credentials = load_credentials(configs=configs)
+            settings = load_new_data_sensor(configs=configs)
             private_folder = get_private_folder()
             sensor_data = load_sensor_file()
             new_sensor_data = {}
             for key in credentials:
-                print(f"[new_data_sensor] database: {key}")
+                print(f"[new_data_sensor] database: {key} (mode: {settings['mode']})")
                 db = DatabaseFactory().create(credentials[key], buffer_size=1000)
                 db.create_connection(reuse=False)
-                tables = db.tables_names()
-                for table in tables:
-                    count = db.metadata(table_name=table).get_table_row_count()
+                if settings['mode'] == 'exact':
+                    counts = self.exact_counts(db, db.tables_names())
+                else:
+                    counts = self.estimated_counts(db, key, sensor_data, settings['exact_tables'], settings['exact_threshold'])
+                for table, count in counts.items():
                     #print(f"[new_data_sensor] table: {table}, count: {count}")
                     sensor_key = f"{key}.{table}"
                     new_sensor_data[sensor_key] = count
@@ -44,6 +70,8 @@ class NewDataModule(GenericModule):
             log(Level.ERROR, f'[new_data_sensor] Fatal error: {e}')
             log(Level.ERROR, traceback.format_exc())
             sys.exit(1)
+        finally:
+            DatabaseFactory().close_all_connections()
 
 if __name__ == "__main__":
     NewDataModule().execute()
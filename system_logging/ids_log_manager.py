@@ -50,4 +50,33 @@ def log_id(schema, table, columns, data, logging_ids_key=None):
         log(Level.ERROR, f"[ids_log_manager] Data {key} is empty")
         return
     
-    log(Level.ID, f"{schema}{table.name}.{key}: {data[index]}")
\ No newline at end of file
+    log(Level.ID, f"{schema}{table.name}.{key}: {data[index]}")
+
+
+def log_ids(schema, table, columns, rows, logging_ids_key=None):
+    """
+    Logs the ids of a batch of rows (sequences in the order of columns) with a single log call.
+
+    """
+    if table is None or table.name is None or not rows:
+        return
+    if schema is None:
+        schema = ""
+    key = logging_ids_key or "id"
+    if columns is None:
+        columns = [column.name for column in table.columns or []]
+    if key not in columns:
+        log(Level.ERROR, f"[ids_log_manager] Column {key} not found in table {table.name}")
+        return
+
+    index = columns.index(key)
+    lines = []
+    for row in rows:
+        value = row[index] if len(row) > index else None
+        if value is None or value == "":
+            log(Level.ERROR, f"[ids_log_manager] Data {key} is empty (index: {index})")
+            continue
+        lines.append(f"{schema}{table.name}.{key}: {value}")
+    if lines:
+        log(Level.ID, "\n".join(lines))
+
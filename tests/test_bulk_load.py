@@ -0,0 +1,94 @@
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from configs.checkpoint_manager import CheckpointStore
+from data_access.postgresql_bulk_load import PostgreSQLBulkLoadSession, create_index_if_not_exists
+
+
+class FakeCatalog:
+    """
+    Pool connections whose cursors answer the catalog queries and record the other statements.
+
+    """
+    def __init__(self, indexes, foreign_keys):
+        self.indexes = indexes
+        self.foreign_keys = foreign_keys
+        self.statements = []
+        self.lock = threading.Lock()
+        self.pool = MagicMock()
+        self.pool.checkout.side_effect = self.connection
+
+    def connection(self):
+        postgresql = MagicMock()
+        cursor = postgresql.connection.cursor.return_value
+        cursor.execute.side_effect = lambda sql, params=None: self.execute(cursor, sql)
+        return postgresql
+
+    def execute(self, cursor, sql):
+        if "pg_get_indexdef" in sql:
+            cursor.fetchall.return_value = self.indexes
+        elif "pg_get_constraintdef" in sql:
+            cursor.fetchall.return_value = self.foreign_keys
+        else:
+            with self.lock:
+                self.statements.append(sql)
+
+
+class TestBulkLoadSession(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.checkpoint = CheckpointStore("bulk_load", folder=folder.name)
+        self.catalog = FakeCatalog(
+            indexes=[("orders", "orders_date_idx", "CREATE INDEX orders_date_idx ON public.orders USING btree (date)")],
+            foreign_keys=[("orders", "orders_client_fk", "FOREIGN KEY (client_id) REFERENCES clients(id)", True)])
+
+    def session(self):
+        return PostgreSQLBulkLoadSession(self.catalog.pool, "erp", ["orders"], schema="public", workers=2, checkpoint=self.checkpoint)
+
+    def test_drops_and_rebuilds(self):
+        with self.session():
+            self.assertEqual(self.catalog.statements, [
+                'ALTER TABLE "public"."orders" DROP CONSTRAINT IF EXISTS "orders_client_fk"',
+                'DROP INDEX IF EXISTS "public"."orders_date_idx"'])
+            self.assertEqual(len(self.checkpoint.get("erp.public.orders")["indexes"]), 1)
+            # dropped: the catalog no longer returns them
+            self.catalog.indexes, self.catalog.foreign_keys = [], []
+            self.catalog.statements = []
+
+        self.assertEqual(self.catalog.statements, [
+            "CREATE INDEX IF NOT EXISTS orders_date_idx ON public.orders USING btree (date)",
+            'ALTER TABLE "public"."orders" ADD CONSTRAINT "orders_client_fk" FOREIGN KEY (client_id) REFERENCES clients(id) NOT VALID',
+            'ALTER TABLE "public"."orders" VALIDATE CONSTRAINT "orders_client_fk"',
+            'ANALYZE "public"."orders"'])
+        self.assertIsNone(CheckpointStore("bulk_load", folder=self.checkpoint.folder).get("erp.public.orders"))
+
+    def test_not_valid_foreign_keys_stay_not_valid(self):
+        self.catalog.foreign_keys = [("orders", "orders_client_fk", "FOREIGN KEY (client_id) REFERENCES clients(id) NOT VALID", False)]
+        with self.session():
+            self.catalog.indexes, self.catalog.foreign_keys = [], []
+            self.catalog.statements = []
+
+        self.assertIn('ALTER TABLE "public"."orders" ADD CONSTRAINT "orders_client_fk" FOREIGN KEY (client_id) REFERENCES clients(id) NOT VALID',
+                      self.catalog.statements)
+        self.assertFalse(any("VALIDATE" in sql for sql in self.catalog.statements))
+
+    def test_interrupted_session_is_restored(self):
+        self.session().begin()
+        self.catalog.indexes, self.catalog.foreign_keys = [], []
+        self.catalog.statements = []
+
+        session = self.session()
+        session.restore()
+
+        self.assertIn("CREATE INDEX IF NOT EXISTS orders_date_idx ON public.orders USING btree (date)", self.catalog.statements)
+        self.assertIsNone(self.checkpoint.get("erp.public.orders"))
+
+    def test_create_index_if_not_exists(self):
+        self.assertEqual(create_index_if_not_exists("CREATE UNIQUE INDEX a ON t (b)"), "CREATE UNIQUE INDEX IF NOT EXISTS a ON t (b)")
+
+
+if __name__ == "__main__":
+    unittest.main()
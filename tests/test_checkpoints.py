@@ -0,0 +1,161 @@
+import os
+import pickle
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+from configs.checkpoint_manager import CheckpointStore, TableCheckpoint, COMPLETED
+from csv_loader.csv_to_database import import_csv_file
+from data_access.metadata_models import Column
+from data_migration.mapper import Mapper
+from data_migration.rule import Rule
+
+
+class TestCheckpointStore(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = os.path.join(folder.name, "module")
+
+    def test_entries_are_persisted(self):
+        store = CheckpointStore("module", folder=self.folder)
+        store.save("data/file.csv:table", status="running", rows=10)
+        store.complete("rule_a")
+
+        reloaded = pickle.loads(pickle.dumps(store))
+        self.assertEqual(reloaded.committed_rows("data/file.csv:table"), 10)
+        self.assertTrue(reloaded.is_completed("rule_a"))
+        self.assertFalse(reloaded.is_completed("data/file.csv:table"))
+        self.assertIsNone(reloaded.get("unknown"))
+
+        reloaded.clear()
+        self.assertEqual(CheckpointStore("module", folder=self.folder).committed_rows("data/file.csv:table"), 0)
+
+    def test_table_checkpoint_adds_the_rows_of_every_writer(self):
+        store = CheckpointStore("module", folder=self.folder)
+        on_commit = TableCheckpoint(store, "rule.table", rows=5)
+        first, second = MagicMock(committed_rows=0), MagicMock(committed_rows=0)
+
+        first.committed_rows = 3
+        on_commit(first)
+        first.committed_rows = 4
+        on_commit(first)
+        second.committed_rows = 2
+        on_commit(second)
+
+        self.assertEqual(store.committed_rows("rule.table"), 11)
+
+
+class TestCsvResume(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "people.csv")
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write("id,name\n1,a\n2,b\n3,c\n4,d\n5,e\n")
+        self.checkpoint = CheckpointStore("csv_loader", folder=os.path.join(folder.name, "checkpoints"))
+        self.csv_file = {"path": self.path, "target_table": "people", "chunk_size": 2}
+
+        self.db = MagicMock()
+        self.db.metadata.return_value.get_table_columns.return_value = [Column("id", "integer"), Column("name", "text")]
+        self.writer = self.db.writer.return_value
+        self.writer.committed_rows = 0
+
+    def test_restarts_after_the_committed_rows(self):
+        self.checkpoint.save(f"{self.path}:people", status="running", rows=3)
+
+        result = import_csv_file(self.db, self.csv_file, checkpoint=self.checkpoint)
+
+        self.assertEqual([row for call in self.writer.insert_batch.call_args_list for row in call[0][0]], [(4, "d"), (5, "e")])
+        self.assertEqual(result["total_valid"], 5)
+        self.assertTrue(self.checkpoint.is_completed(f"{self.path}:people"))
+
+    def test_completed_file_is_skipped(self):
+        self.checkpoint.complete(f"{self.path}:people", rows=5, total=5)
+
+        result = import_csv_file(self.db, self.csv_file, checkpoint=self.checkpoint)
+
+        self.db.writer.assert_not_called()
+        self.assertEqual(result["total_valid"], 5)
+
+
+class TestTransformCheckpoint(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.mapper = object.__new__(Mapper)
+        self.mapper.buffer_size = 1000
+        self.mapper.prefetch = 0
+        self.mapper.checkpoint = CheckpointStore("data_migration", folder=folder.name)
+
+        self.rule = Rule("people")
+        self.rule.checkpoint_interval = 2
+        reader = MagicMock()
+        reader.iter_batches.return_value = iter([[{"id": i}] for i in range(5)])
+        self.database_input = MagicMock()
+        self.database_input.reader.return_value = reader
+        self.database_output = MagicMock()
+        self.database_output.table_name = "people"
+        self.writer = self.database_output.writer.return_value
+
+    def run_rule(self):
+        self.mapper.run_transform_batch(self.rule, lambda batch, context: batch,
+                                        [self.database_input], [self.database_output], {})
+        return [call[0][0][0]["id"] for call in self.writer.insert_batch.call_args_list]
+
+    def test_batches_are_committed_every_interval(self):
+        self.assertEqual(self.run_rule(), [0, 1, 2, 3, 4])
+        self.assertEqual(self.writer.commit.call_count, 3)
+        self.assertEqual(self.mapper.checkpoint.get("people")["batches"], 5)
+        self.assertIsNone(self.mapper.checkpoint.get("people")["pending_batches"])
+        # rows are only committed at the checkpoints
+        self.assertFalse(self.writer.bulk_commit)
+
+    def test_resume_skips_the_committed_batches(self):
+        self.mapper.checkpoint.save("people", status="running", batches=4)
+        self.assertEqual(self.run_rule(), [4])
+        self.assertNotEqual(self.mapper.checkpoint.get("people")["status"], COMPLETED)
+
+    def test_interrupted_commit_is_only_resumed_with_upsert(self):
+        self.mapper.checkpoint.save("people", status="running", batches=2, pending_batches=4)
+        with self.assertRaises(Exception) as error:
+            self.run_rule()
+        self.assertIn("first 4 batches", str(error.exception))
+        self.writer.insert_batch.assert_not_called()
+
+        self.rule.write_mode = "upsert"
+        self.assertEqual(self.run_rule(), [2, 3, 4])
+
+
+class TestResumableRule(unittest.TestCase):
+    def setUp(self):
+        self.mapper = object.__new__(Mapper)
+        self.mapper.checkpoint = MagicMock()
+        self.rule = Rule("people")
+        self.output = MagicMock(table_name="people", checkpoint_rows=500)
+        self.exec_module = MagicMock(spec=["exec"])
+
+    def test_partly_committed_exec_rule_is_refused(self):
+        with self.assertRaises(Exception) as error:
+            self.mapper.check_resumable(self.rule, self.exec_module, [self.output])
+        self.assertIn("people (500 rows)", str(error.exception))
+
+    def test_rules_that_cannot_duplicate_rows_resume(self):
+        self.output.checkpoint_rows = 0
+        self.mapper.check_resumable(self.rule, self.exec_module, [self.output])
+
+        self.output.checkpoint_rows = 500
+        self.rule.write_mode = "upsert"
+        self.mapper.check_resumable(self.rule, self.exec_module, [self.output])
+
+        self.rule.write_mode = "insert"
+        self.rule.resumable = True
+        self.mapper.check_resumable(self.rule, self.exec_module, [self.output])
+
+        self.rule.resumable = False
+        self.rule.checkpoint_interval = 10
+        self.mapper.check_resumable(self.rule, MagicMock(spec=["transform_batch"]), [self.output])
+
+
+if __name__ == "__main__":
+    unittest.main()
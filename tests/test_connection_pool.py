@@ -0,0 +1,116 @@
+import unittest
+import threading
+from unittest.mock import MagicMock, patch
+from data_access.db_credentials import DBCredentials
+from data_access.postgresql_pool import PostgreSQLConnectionPool
+from data_access.postgresql_facade import PostgreSQLFacade
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.db_credentials = DBCredentials(
+            name="test_db",
+            database="testdb",
+            user="testuser",
+            password="testpassword",
+            host="localhost",
+            port=5432,
+            schema="public",
+            type="postgresql"
+        )
+
+    def new_connection(self, *args, **kwargs):
+        connection = MagicMock()
+        connection.closed = 0
+        connection.autocommit = False
+        return connection
+
+    @patch('psycopg2.connect')
+    def test_checkout_reuses_connections(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        pool = PostgreSQLConnectionPool(self.db_credentials, max_size=2)
+
+        connection = pool.checkout()
+        pool.checkin(connection)
+        self.assertIs(pool.checkout(), connection)
+        connection.connection.rollback.assert_called()
+
+        stats = pool.stats()
+        self.assertEqual(stats['created'], 1)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+
+    @patch('psycopg2.connect')
+    def test_checkout_waits_when_pool_is_full(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        pool = PostgreSQLConnectionPool(self.db_credentials, max_size=1, checkout_timeout=0.05)
+        connection = pool.checkout()
+
+        with self.assertRaises(Exception):
+            pool.checkout()
+
+        timer = threading.Timer(0.01, pool.checkin, args=(connection,))
+        pool.checkout_timeout = 5
+        timer.start()
+        self.assertIs(pool.checkout(), connection)
+        timer.join()
+
+    @patch('psycopg2.connect')
+    def test_broken_connection_is_replaced(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        pool = PostgreSQLConnectionPool(self.db_credentials, max_size=1)
+        connection = pool.checkout()
+        pool.checkin(connection)
+        connection.connection.closed = 1
+
+        self.assertIsNot(pool.checkout(), connection)
+        self.assertEqual(pool.stats()['created'], 2)
+
+    @patch('psycopg2.connect')
+    def test_idle_eviction(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        pool = PostgreSQLConnectionPool(self.db_credentials, min_size=0, max_size=2, idle_timeout=0)
+        connection = pool.checkout()
+        psycopg2_connection = connection.connection
+        pool.checkin(connection)
+
+        self.assertIsNot(pool.checkout(), connection)
+        psycopg2_connection.close.assert_called_once()
+
+    @patch('psycopg2.connect')
+    def test_checkin_resets_the_session(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        pool = PostgreSQLConnectionPool(self.db_credentials, max_size=1)
+        connection = pool.checkout()
+        psycopg2_connection = connection.connection
+        psycopg2_connection.reset_mock()
+
+        pool.checkin(connection)
+        psycopg2_connection.rollback.assert_called_once()
+        psycopg2_connection.cursor.return_value.execute.assert_called_once_with("DISCARD ALL")
+        self.assertFalse(psycopg2_connection.autocommit)
+
+    def test_aliases_get_their_own_pool(self):
+        # Pooled connections carry the credentials of the alias that opened them (schema, cache keys)
+        other_schema = DBCredentials(name="test_db_other", database="testdb", user="testuser", password="testpassword",
+                                     host="localhost", port=5432, schema="your_schema", type="postgresql")
+        self.assertNotEqual(PostgreSQLConnectionPool.pool_name(self.db_credentials), PostgreSQLConnectionPool.pool_name(other_schema))
+
+    @patch('psycopg2.connect')
+    def test_facade_connections_survive_release(self, mock_connect):
+        mock_connect.side_effect = self.new_connection
+        facade = PostgreSQLFacade(self.db_credentials)
+        facade.create_connection(reuse=True)
+        connection = facade.connection
+        psycopg2_connection = connection.connection
+
+        PostgreSQLFacade.release_all_connections()
+        facade.create_connection(reuse=True)
+        self.assertIs(facade.connection, connection)
+        self.assertEqual(mock_connect.call_count, 1)
+
+        PostgreSQLFacade.close_all_connections()
+        psycopg2_connection.close.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
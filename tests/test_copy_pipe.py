@@ -0,0 +1,68 @@
+import unittest
+from unittest.mock import MagicMock
+from data_access.postgresql_data_access import PostgreSQLCopyPipe
+
+DATA = b"1\talice\n2\tbob\n" * 50000
+
+
+def make_connection():
+    postgresql = MagicMock()
+    postgresql.connection.cursor.return_value = MagicMock()
+    return postgresql
+
+
+class TestCopyPipe(unittest.TestCase):
+    def setUp(self):
+        self.source = make_connection()
+        self.target = make_connection()
+        self.received = bytearray()
+
+        source_cursor = self.source.connection.cursor.return_value
+        source_cursor.copy_expert.side_effect = lambda sql, file, size: file.write(DATA)
+
+        self.target_cursor = self.target.connection.cursor.return_value
+
+        def consume(sql, file, size):
+            while True:
+                data = file.read(size)
+                if not data:
+                    break
+                self.received.extend(data)
+            self.target_cursor.rowcount = self.received.count(b"\n")
+        self.target_cursor.copy_expert.side_effect = consume
+
+    def test_streams_source_into_target(self):
+        pipe = PostgreSQLCopyPipe(self.source, self.target, "people", schema="public", query="SELECT id, name FROM users", buffer_size=4096)
+        rows = pipe.run()
+
+        self.assertEqual(bytes(self.received), DATA)
+        self.assertEqual(rows, 100000)
+        self.target.connection.commit.assert_called_once()
+
+    def test_column_mapping(self):
+        pipe = PostgreSQLCopyPipe(self.source, self.target, "people", schema="public", query="SELECT * FROM users",
+                                  columns={"id": "person_id", "name": "full_name"}, format="binary")
+        self.assertEqual(pipe.source_sql(), 'COPY (SELECT id, "name" FROM (SELECT * FROM users) AS source) TO STDOUT WITH (FORMAT binary)')
+        self.assertEqual(pipe.target_sql(), "COPY public.people (person_id, full_name) FROM STDIN WITH (FORMAT binary)")
+
+    def test_source_error_rolls_back_target(self):
+        def fail(sql, file, size):
+            file.write(DATA[:1000])
+            raise Exception("source failed")
+        self.source.connection.cursor.return_value.copy_expert.side_effect = fail
+
+        with self.assertRaises(Exception) as error:
+            PostgreSQLCopyPipe(self.source, self.target, "people").run()
+        self.assertEqual(str(error.exception), "source failed")
+        self.target.connection.rollback.assert_called_once()
+        self.target.connection.commit.assert_not_called()
+
+    def test_target_error_stops_source(self):
+        self.target_cursor.copy_expert.side_effect = Exception("target failed")
+
+        with self.assertRaises(Exception):
+            PostgreSQLCopyPipe(self.source, self.target, "people").run()
+        self.target.connection.rollback.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,21 @@ import unittest
 from unittest.mock import MagicMock, patch
 import pandas as pd
 from data_access.db_credentials import DBCredentials
-from csv_loader.csv_to_database import csv_importer  
+from data_access.metadata_models import Column
+from csv_loader.csv_to_database import csv_importer, read_csv_chunks, reject_sink
+from configs.checkpoint_manager import CheckpointStore
+import tempfile
+import os
 
 
 class TestCSVLoader(unittest.TestCase):
     
     def setUp(self):   
+      checkpoints = tempfile.TemporaryDirectory()
+      self.addCleanup(checkpoints.cleanup)
+      patcher = patch("csv_loader.csv_to_database.CheckpointStore", side_effect=lambda module: CheckpointStore(module, folder=checkpoints.name))
+      patcher.start()
+      self.addCleanup(patcher.stop)
       self.credentials = DBCredentials(
           name="teste_db",
           host="localhost",
@@ -45,28 +54,27 @@ class TestCSVLoader(unittest.TestCase):
         self.assertEqual(str(context.exception), "[csv_loader] No CSV files found")
     
     @patch("csv_loader.csv_to_database.pd.read_csv")
-    @patch("csv_loader.csv_to_database.process_row")
     @patch("data_access.db_factory.DatabaseFactory.create")
-    def test_csv_loader_success(self, mock_db_create, mock_process_row, mock_read_csv):
+    def test_csv_loader_success(self, mock_db_create, mock_read_csv):
         mock_db = MagicMock()
         mock_writer = MagicMock()
         mock_db.writer.return_value = mock_writer
         mock_db_create.return_value = mock_db
 
-        mock_db.metadata.return_value.get_table_columns.return_value = ["id", "name", "email"]
+        mock_db.metadata.return_value.get_table_columns.return_value = [
+            Column("id", "integer"), Column("name", "character varying"), Column("email", "text")]
 
         mock_read_csv.return_value = pd.DataFrame([
             {"id": 6786, "name": "João Guimarães", "email": "jg@example.com"},
             {"id": 86756, "name": "Maria Cristina", "email": "mc@example.com"} 
         ])
 
-        mock_process_row.side_effect = lambda row, columns, replace : row
-        
         csv_importer(credentials=self.credentials, csv_files=self.csv_files)
 
         mock_db.create_connection.assert_called_once()
         mock_db.writer.assert_called()
-        self.assertEqual(mock_writer.insert.call_count, 4)
+        self.assertEqual(mock_writer.insert_batch.call_count, 2)
+        self.assertIn((6786, "João Guimarães", "jg@example.com"), mock_writer.insert_batch.call_args[0][0])
         mock_writer.flush_buffer.assert_called()
         mock_writer.commit.assert_called()
         mock_db.close_connection.assert_called_once()
@@ -91,5 +99,37 @@ class TestCSVLoader(unittest.TestCase):
         csv_importer(credentials=self.credentials, csv_files=self.csv_files)       
       self.assertTrue("[csv_loader] Error: No columns found for table" in str(context.exception))  
 
+    @patch("data_access.db_factory.DatabaseFactory.create")
+    def test_csv_loader_chunked(self, mock_db_create):
+      mock_db = MagicMock()
+      mock_writer = MagicMock()
+      mock_db.writer.return_value = mock_writer
+      mock_db_create.return_value = mock_db
+      mock_db.metadata.return_value.get_table_columns.return_value = [Column("id", "integer"), Column("name", "text")]
+
+      with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "chunked.csv")
+        with open(path, "w", encoding="utf-8") as f:
+          f.write("id,name\n1,a\n2,b\n3,c\n4,d\n5,e\n")
+
+        with patch("csv_loader.csv_to_database.read_csv_chunks", wraps=read_csv_chunks) as mock_chunks:
+          csv_importer(credentials=self.credentials, csv_files=[{"path": path, "target_table": "test_table", "chunk_size": 2}])
+          self.assertEqual(mock_chunks.call_args[0][4], 2)
+
+      # one call per chunk
+      self.assertEqual(mock_writer.insert_batch.call_count, 3)
+      mock_writer.insert_batch.assert_called_with([(5, "e")])
+      mock_writer.commit.assert_called_once()
+
+    def test_reject_sink(self):
+      db = MagicMock()
+      csv_file = {"path": "people.csv", "target_table": "people", "reject_file": "rejects/people.csv"}
+      self.assertEqual(reject_sink(db, csv_file).path, "rejects/people.csv")
+      self.assertEqual(reject_sink(db, csv_file, byte_range=(0, 100, [])).path, "rejects/people_0-100.csv")
+
+      csv_file["reject_table"] = "people_rejects"
+      self.assertIs(reject_sink(db, csv_file), db.reject_table.return_value)
+      db.reject_table.assert_called_once_with("people_rejects")
+
 if __name__ == "__main__":
     unittest.main()
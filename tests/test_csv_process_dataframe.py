@@ -0,0 +1,45 @@
+import unittest
+import pandas as pd
+from data_access.metadata_models import Column
+from csv_loader.csv_process_dataframe import convert_dataframe, dataframe_rows
+
+
+class TestCSVProcessDataFrame(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({
+            "id": [1, 2, 3],
+            "price": ["10", "2.5", None],
+            "code": ["001", None, "1.50"],
+            "active": ["true", "0", "no"],
+            "score": [1.0, None, 2.5],
+            "email": ["a@example.com", "b@example.com", "c@example.com"],
+        })
+        self.columns = [
+            Column("id", "integer"),
+            Column("price", "numeric"),
+            Column("code", "character varying"),
+            Column("active", "boolean"),
+            Column("score", "double precision"),
+            Column("email", "text"),
+        ]
+
+    def test_convert_dataframe(self):
+        arrays = convert_dataframe(self.df, self.columns, {"email": "[private_data]"})
+
+        self.assertEqual(list(arrays[0]), [1, 2, 3])
+        self.assertEqual(list(arrays[1]), [10, 2.5, None])
+        self.assertIsInstance(arrays[1][0], int)
+        self.assertEqual(list(arrays[2]), ["001", None, "1.50"])
+        self.assertEqual(list(arrays[3]), [True, False, False])
+        self.assertEqual(list(arrays[4]), [1, None, 2.5])
+        self.assertEqual(list(arrays[5]), ["[private_data]"] * 3)
+
+    def test_dataframe_rows(self):
+        self.assertEqual(dataframe_rows(self.df, self.columns[:2]), [(1, 10), (2, 2.5), (3, None)])
+
+    def test_missing_column(self):
+        with self.assertRaises(Exception):
+            convert_dataframe(self.df, [Column("missing", "text")])
+
+if __name__ == '__main__':
+    unittest.main()
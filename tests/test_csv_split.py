@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from configs.dependency_scheduler import TaskResult
+from csv_loader.csv_split import split_csv_file, read_csv_header, read_csv_range_chunks
+from csv_loader.csv_to_database import combine_file_results
+
+
+class TestCSVSplit(unittest.TestCase):
+    def setUp(self):
+        lines = ['id,name,notes']
+        for i in range(200):
+            notes = f'"line one\nline ""two"" of {i}"' if i % 3 == 0 else f'plain {i}'
+            lines.append(f'{i},"name, {i}",{notes}')
+        self.temp_file = tempfile.NamedTemporaryFile(mode="w", suffix=".csv", delete=False, encoding="utf-8")
+        self.temp_file.write("\n".join(lines) + "\n")
+        self.temp_file.close()
+
+    def tearDown(self):
+        os.remove(self.temp_file.name)
+
+    def test_ranges_cover_all_records(self):
+        path = self.temp_file.name
+        header_end, ranges = split_csv_file(path, 4)
+        names = read_csv_header(path, header_end)
+
+        self.assertEqual(names, ["id", "name", "notes"])
+        self.assertEqual(len(ranges), 4)
+        self.assertEqual(ranges[0][0], header_end)
+        self.assertEqual(ranges[-1][1], os.path.getsize(path))
+
+        parts = [df for start, end in ranges for df in read_csv_range_chunks(path, start, end, names, chunk_size=30)]
+        combined = pd.concat(parts, ignore_index=True)
+        expected = pd.read_csv(path)
+        pd.testing.assert_frame_equal(combined, expected)
+
+    def test_small_file_has_fewer_ranges(self):
+        with open(self.temp_file.name, "w", encoding="utf-8") as file:
+            file.write('id,notes\n1,"a\nb"\n')
+        header_end, ranges = split_csv_file(self.temp_file.name, 8)
+        self.assertEqual(len(ranges), 1)
+
+    def test_combine_file_results(self):
+        parts = [
+            TaskResult((0, 0), "success", result={'total': 10, 'total_valid': 10}, elapsed_time=1.0),
+            TaskResult((0, 1), "success", result={'total': 5, 'total_valid': 4}, elapsed_time=2.0),
+        ]
+        result = combine_file_results("table_1", parts)
+        self.assertEqual(result.status, "success")
+        self.assertEqual(result.result['total_valid'], 14)
+        self.assertEqual(result.elapsed_time, 2.0)
+
+        parts.append(TaskResult((0, 2), "failed", error="ValueError: bad row"))
+        self.assertEqual(combine_file_results("table_1", parts).status, "failed")
+
+if __name__ == '__main__':
+    unittest.main()
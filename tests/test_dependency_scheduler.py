@@ -0,0 +1,59 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from configs.dependency_scheduler import DependencyScheduler
+
+
+def fail():
+    raise ValueError("broken file")
+
+
+class TestDependencyScheduler(unittest.TestCase):
+    def test_dependencies_run_first(self):
+        order = []
+        scheduler = DependencyScheduler()
+        scheduler.add_task("child", order.append, args=("child",), depends_on=["parent"])
+        scheduler.add_task("parent", order.append, args=("parent",))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = scheduler.run(executor)
+
+        self.assertEqual(order, ["parent", "child"])
+        self.assertEqual(list(results), ["child", "parent"])
+        self.assertTrue(all(r.status == "success" for r in results.values()))
+
+    def test_failure_skips_dependents(self):
+        scheduler = DependencyScheduler()
+        scheduler.add_task("parent", fail)
+        scheduler.add_task("child", len, args=("abc",), depends_on=["parent"])
+        scheduler.add_task("grandchild", len, args=("abc",), depends_on=["child"])
+        scheduler.add_task("other", len, args=("abc",))
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = scheduler.run(executor)
+
+        self.assertEqual(results["parent"].status, "failed")
+        self.assertIn("broken file", results["parent"].error)
+        self.assertEqual(results["child"].status, "skipped")
+        self.assertEqual(results["grandchild"].status, "skipped")
+        self.assertEqual(results["other"].result, 3)
+
+    def test_cycle_detection(self):
+        scheduler = DependencyScheduler()
+        scheduler.add_task("a", len, args=("a",), depends_on=["b"])
+        scheduler.add_task("b", len, args=("b",), depends_on=["a"])
+        with self.assertRaises(Exception):
+            scheduler.validate()
+
+    def test_ordered_tasks(self):
+        scheduler = DependencyScheduler()
+        scheduler.add_task("child", len, depends_on=["parent"])
+        scheduler.add_task("other", len)
+        scheduler.add_task("parent", len)
+        self.assertEqual(scheduler.ordered_tasks(), ["other", "parent", "child"])
+
+        scheduler.add_task("orphan", len, depends_on=["missing"])
+        with self.assertRaises(Exception):
+            scheduler.ordered_tasks()
+
+if __name__ == '__main__':
+    unittest.main()
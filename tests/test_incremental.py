@@ -0,0 +1,58 @@
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from configs.checkpoint_manager import CheckpointStore
+from data_access.postgresql_data_access import postgres_delta_query
+from data_migration.mapper import Mapper
+from data_migration.rule import Rule, Input
+
+
+class TestDeltaQuery(unittest.TestCase):
+    def test_bounds(self):
+        query = "SELECT * FROM people"
+        self.assertEqual(postgres_delta_query(query, "id"), query)
+        self.assertEqual(postgres_delta_query(query, "id", lower=10, upper=20),
+                         "SELECT * FROM (SELECT * FROM people) AS source WHERE id > 10 AND id <= 20")
+        self.assertEqual(postgres_delta_query(query, "updated_at", lower="2024-01-01 00:00:00"),
+                         "SELECT * FROM (SELECT * FROM people) AS source WHERE updated_at > '2024-01-01 00:00:00'")
+
+
+class TestIncrementalRule(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        patcher = patch("data_migration.mapper.CheckpointStore", side_effect=lambda module: CheckpointStore(module, folder=folder.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mapper = object.__new__(Mapper)
+        self.rule = Rule("people")
+        self.rule.incremental_key = "id"
+        self.rule.inputs = [Input(MagicMock(), "SELECT * FROM people")]
+
+    def incremental_queries(self, max_value):
+        source = MagicMock()
+        source.max_value.return_value = max_value
+        source.delta_query.side_effect = lambda column, lower=None, upper=None: postgres_delta_query("SELECT * FROM people", column, lower, upper)
+        with patch("data_migration.mapper.DatabaseFactory") as factory:
+            factory.return_value.create.return_value = source
+            rule, watermarks = self.mapper.incremental_rule(self.rule)
+        source.close_connection.assert_called_once()
+        self.mapper.save_watermarks(rule, watermarks)
+        return [input.query for input in rule.inputs]
+
+    def test_reads_the_delta_since_the_last_run(self):
+        self.assertEqual(self.incremental_queries(10), ["SELECT * FROM (SELECT * FROM people) AS source WHERE id <= 10"])
+        self.assertEqual(self.incremental_queries(Decimal(25)), ["SELECT * FROM (SELECT * FROM people) AS source WHERE id > 10 AND id <= '25'"])
+        self.assertEqual(self.rule.inputs[0].query, "SELECT * FROM people")
+
+    def test_empty_source_keeps_the_watermark(self):
+        self.incremental_queries(10)
+        self.incremental_queries(None)
+        self.assertEqual(self.incremental_queries(12), ["SELECT * FROM (SELECT * FROM people) AS source WHERE id > 10 AND id <= 12"])
+
+
+if __name__ == "__main__":
+    unittest.main()
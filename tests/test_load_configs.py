@@ -1,10 +1,13 @@
+import os
+import tempfile
 import unittest
 import yaml
+from unittest.mock import patch
 from io import StringIO
 from data_access.db_credentials import DBCredentials
 from data_migration.mapper import Mapper
 from data_migration.rule import Rule
-from configs.yaml_manager import load_credentials, load_csv_loader, get_rules_folder
+from configs.yaml_manager import load_credentials, load_csv_loader, get_rules_folder, load_data_migration
 from system_logging.log_manager import instance, Level, log
 
 class TestConfigLoaders(unittest.TestCase):
@@ -119,5 +122,27 @@ csv_loader:
         self.assertEqual(len(rule.inputs), 3)
         self.assertEqual(len(rule.outputs), 2)
 
+    def test_group_commit_is_refused_on_exec_rules(self):
+        self.configs['data_migration']['rules']['rule_1']['group_commit'] = {'rows': 1000}
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "rule_1.py"), "w") as file:
+                file.write("def exec(inputs, outputs, context):\n    pass\n")
+            with patch("configs.yaml_manager.RULES_FOLDER", folder):
+                with self.assertRaises(Exception) as error:
+                    load_data_migration(object.__new__(Mapper), configs=self.configs)
+        self.assertIn("group_commit", str(error.exception))
+
+    def test_incremental_key_requires_upsert(self):
+        rule = self.configs['data_migration']['rules']['rule_1']
+        rule['incremental_key'] = 'updated_at'
+        with self.assertRaises(Exception) as error:
+            load_data_migration(object.__new__(Mapper), configs=self.configs)
+        self.assertIn("write_mode: upsert", str(error.exception))
+
+        rule['write_mode'] = 'upsert'
+        mapper = object.__new__(Mapper)
+        load_data_migration(mapper, configs=self.configs)
+        self.assertEqual(mapper.rules[0].incremental_key, 'updated_at')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
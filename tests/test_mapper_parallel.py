@@ -0,0 +1,76 @@
+import unittest
+from unittest.mock import patch
+from data_migration.mapper import Mapper
+from data_migration.rule import Rule
+
+
+def make_rule(name, depends_on=None):
+    rule = Rule(name)
+    rule.depends_on = depends_on or []
+    return rule
+
+
+def fake_run_rule(self, rule, context):
+    if rule.name == "broken":
+        raise ValueError("broken rule")
+    if rule.name == "children":
+        context["children_parent"] = context.get("parent")
+    context[rule.name] = f"{rule.name} done"
+    context.pop("obsolete", None)
+
+
+class TestMapperParallel(unittest.TestCase):
+    def setUp(self):
+        self.mapper = object.__new__(Mapper)
+        self.mapper.parallelism = 2
+        self.mapper.executor = "thread"
+        self.mapper.checkpoint = None
+        self.mapper.rules = [
+            make_rule("children", depends_on=["parent"]),
+            make_rule("parent"),
+            make_rule("broken"),
+            make_rule("after_broken", depends_on=["broken"]),
+        ]
+
+    @patch.object(Mapper, "run_rule", fake_run_rule)
+    def test_dependencies_and_context(self):
+        self.mapper.rules = self.mapper.rules[:2]
+        context = {"obsolete": True}
+        with patch.object(Mapper, "_instance", self.mapper):
+            self.mapper.run_rules_parallel(context)
+
+        self.assertEqual(context["parent"], "parent done")
+        self.assertEqual(context["children_parent"], "parent done")
+        self.assertNotIn("obsolete", context)
+
+    @patch.object(Mapper, "run_rule", fake_run_rule)
+    def test_failure_skips_dependents(self):
+        context = {}
+        with patch.object(Mapper, "_instance", self.mapper):
+            with self.assertRaises(Exception) as error:
+                self.mapper.run_rules_parallel(context)
+
+        self.assertIn("2 of 4 rules", str(error.exception))
+        self.assertIn("children", context)
+        self.assertNotIn("after_broken", context)
+
+    def test_sequential_order_follows_dependencies(self):
+        self.mapper.rules[2].skip = True
+        self.assertEqual(self.mapper.rule_scheduler().ordered_tasks(), ["parent", "children", "after_broken"])
+
+        self.mapper.rules[1].depends_on = ["children"]
+        with self.assertRaises(Exception):
+            self.mapper.rule_scheduler().ordered_tasks()
+
+    @patch.object(Mapper, "run_rule", fake_run_rule)
+    def test_skipped_rules_do_not_block_dependents(self):
+        self.mapper.rules = self.mapper.rules[:2]
+        self.mapper.rules[1].skip = True
+        context = {}
+        with patch.object(Mapper, "_instance", self.mapper):
+            self.mapper.run_rules_parallel(context)
+
+        self.assertIsNone(context["children_parent"])
+
+if __name__ == '__main__':
+    unittest.main()
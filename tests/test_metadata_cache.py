@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock
+from data_access.metadata_cache import MetadataCache
+from data_access.metadata_models import Column
+from data_access.postgresql_metadata_access import PostgreSQLTableManager
+from data_access.postgresql_data_access import postgres_execute_DDL
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        MetadataCache().invalidate()
+        MetadataCache().configure(ttl=300)
+        self.postgresql = MagicMock()
+        self.postgresql.db_credentials.name = "database_1"
+        self.cursor = MagicMock()
+        self.cursor.fetchall.return_value = [("id", "integer", "NO", None), ("name", "text", "YES", None)]
+        self.postgresql.connection.cursor.return_value = self.cursor
+
+    def tearDown(self):
+        MetadataCache().invalidate()
+
+    def test_columns_are_cached(self):
+        first = PostgreSQLTableManager(self.postgresql, "table_1", schema="public").get_table_columns()
+        second = PostgreSQLTableManager(self.postgresql, "table_1", schema="public").get_table_columns()
+
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.assertEqual([c.name for c in second], ["id", "name"])
+        self.assertIsNot(first, second)
+
+    def test_ddl_invalidates_cache(self):
+        PostgreSQLTableManager(self.postgresql, "table_1", schema="public").get_table_columns()
+        postgres_execute_DDL(self.postgresql, "ALTER TABLE table_1 ADD COLUMN age INT")
+        self.assertIsNone(MetadataCache().get("database_1", "public", "table_1"))
+
+    def test_expired_entries(self):
+        MetadataCache().configure(ttl=0)
+        MetadataCache().put("database_1", "public", "table_1", [Column("id")], fetched_at=0)
+        self.assertIsNone(MetadataCache().get("database_1", "public", "table_1"))
+
+    def test_snapshot_round_trip(self):
+        MetadataCache().put("database_1", "public", "table_1", [Column("id", "integer", False, None)])
+        snapshot = MetadataCache().to_dict()
+        MetadataCache().invalidate()
+
+        self.assertEqual(MetadataCache().load_dict(snapshot), 1)
+        columns = MetadataCache().get("database_1", "public", "table_1")
+        self.assertEqual(columns[0].data_type, "integer")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from unittest.mock import MagicMock
+from data_quality.new_data_sensor import NewDataModule
+
+
+class TestNewDataSensor(unittest.TestCase):
+    def setUp(self):
+        self.db = MagicMock()
+        self.db.row_count_estimates.return_value = {
+            "orders": {"estimate": 1500},
+            "customers": {"estimate": 100},
+            "logs": {"estimate": 90},
+        }
+        self.db.metadata.return_value.get_table_row_count.return_value = 42
+
+    def test_estimates_without_exact_counts(self):
+        counts = NewDataModule.estimated_counts(self.db, "database_1", {}, [], None)
+        self.assertEqual(counts, {"orders": 1500, "customers": 100, "logs": 90})
+        self.db.metadata.assert_not_called()
+
+    def test_exact_count_per_table_and_threshold(self):
+        sensor_data = {"database_1.orders": 1000, "database_1.logs": 80}
+        counts = NewDataModule.estimated_counts(self.db, "database_1", sensor_data, ["database_1.customers"], 100)
+
+        self.assertEqual(counts, {"orders": 42, "customers": 42, "logs": 90})
+        self.assertEqual(self.db.metadata.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from data_access.postgresql_parallel_reader import PostgreSQLParallelReader
+
+
+class FakePartition:
+    def __init__(self, batches, error=None):
+        self.batches = batches
+        self.error = error
+        self.closed = False
+
+    def iter_batches(self):
+        for batch in self.batches:
+            yield batch
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def make_connection():
+    postgresql = MagicMock()
+    cursor = MagicMock()
+    cursor.fetchone.return_value = ("00000003-0000001B-1",)
+    postgresql.connection.cursor.return_value = cursor
+    return postgresql
+
+
+class TestParallelReader(unittest.TestCase):
+    def setUp(self):
+        self.coordinator = make_connection()
+        self.workers = [make_connection() for _ in range(4)]
+        self.released = []
+        self.reader = PostgreSQLParallelReader(self.coordinator, self.workers, table_name="people", schema="public",
+                                               key="id", batch_size=100, on_close=lambda: self.released.append(True))
+
+    def test_split_points(self):
+        with patch.object(PostgreSQLParallelReader, "key_bounds", return_value=(1, 101)):
+            self.assertEqual(self.reader.split_points(4), [26, 51, 76])
+        with patch.object(PostgreSQLParallelReader, "key_bounds", return_value=(1, 2)):
+            self.assertEqual(self.reader.split_points(4), [2])
+        with patch.object(PostgreSQLParallelReader, "key_bounds", return_value=(None, None)):
+            self.assertEqual(self.reader.split_points(4), [])
+
+    def test_open_shares_snapshot(self):
+        with patch.object(PostgreSQLParallelReader, "key_bounds", return_value=(1, 101)):
+            partitions = self.reader.partitions()
+
+        self.assertEqual(self.reader.snapshot, "00000003-0000001B-1")
+        self.assertEqual(len(partitions), 4)
+        self.assertEqual(partitions[0].query, "SELECT * FROM (SELECT * FROM public.people) AS source WHERE (id < 26) OR id IS NULL")
+        self.assertEqual(partitions[3].query, "SELECT * FROM (SELECT * FROM public.people) AS source WHERE id >= 76")
+        for worker in self.workers:
+            worker.connection.cursor.return_value.execute.assert_any_call("SET TRANSACTION SNAPSHOT %s", ("00000003-0000001B-1",))
+
+    def test_merged_iteration(self):
+        self.reader.iterators = [FakePartition([[1, 2], [3]]), FakePartition([[4]]), FakePartition([])]
+        self.assertEqual(sorted(self.reader), [1, 2, 3, 4])
+
+        self.reader.close()
+        self.assertEqual(self.released, [True])
+        self.coordinator.connection.rollback.assert_called_once()
+
+    def test_merged_iteration_error(self):
+        self.reader.iterators = [FakePartition([[1]]), FakePartition([[2]], error=Exception("range failed"))]
+        with self.assertRaises(Exception) as error:
+            list(self.reader.iter_batches())
+        self.assertEqual(str(error.exception), "range failed")
+        self.assertEqual(self.reader.threads, [])
+
+if __name__ == '__main__':
+    unittest.main()
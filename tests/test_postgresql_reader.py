@@ -0,0 +1,79 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+from data_access.postgresql_data_access import PostgresTableIterator
+
+
+class TestPostgresTableIterator(unittest.TestCase):
+    def setUp(self):
+        self.rows = [(1, "John"), (2, "Jane"), (3, "Jack")]
+        self.postgresql = MagicMock()
+        self.cursor = MagicMock()
+        self.cursor.closed = False
+        self.cursor.description = [("id",), ("name",)]
+        self.postgresql.connection.cursor.return_value = self.cursor
+
+        def fetchmany(size):
+            batch = self.rows[:size]
+            del self.rows[:size]
+            return batch
+        self.cursor.fetchmany.side_effect = fetchmany
+
+    def test_named_cursor_row_iteration(self):
+        reader = PostgresTableIterator(self.postgresql, query="select * from table_1", batch_size=2)
+        rows = list(reader)
+
+        name = self.postgresql.connection.cursor.call_args.kwargs["name"]
+        self.assertTrue(name.startswith("sterna_"))
+        # not held past commits unless asked, so the server never materializes the result
+        self.assertFalse(self.postgresql.connection.cursor.call_args.kwargs["withhold"])
+        self.assertEqual(self.cursor.itersize, 2)
+        self.assertEqual(rows, [{"id": 1, "name": "John"}, {"id": 2, "name": "Jane"}, {"id": 3, "name": "Jack"}])
+        self.cursor.close.assert_called_once()
+
+    def test_withhold_cursor(self):
+        reader = PostgresTableIterator(self.postgresql, query="select * from table_1", batch_size=2, withhold=True)
+        reader.open()
+        self.assertTrue(self.postgresql.connection.cursor.call_args.kwargs["withhold"])
+
+    def test_iter_batches_as_tuples(self):
+        reader = PostgresTableIterator(self.postgresql, table_name="table_1", schema="public", batch_size=2)
+        batches = list(reader.iter_batches(as_dict=False))
+
+        self.cursor.execute.assert_called_once_with("SELECT * FROM public.table_1")
+        self.assertEqual(batches, [[(1, "John"), (2, "Jane")], [(3, "Jack")]])
+
+    def test_prefetch(self):
+        self.rows = [(i, f"name {i}") for i in range(10)]
+        reader = PostgresTableIterator(self.postgresql, query="select * from table_1", batch_size=3, prefetch=2)
+        batches = []
+        for batch in reader.iter_batches(as_dict=False):
+            time.sleep(0.02)  # slow consumer: the producer fills the queue and waits
+            batches.append(batch)
+
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 3, 1])
+        self.assertEqual(batches[-1], [(9, "name 9")])
+        self.assertIsNone(reader.prefetch_thread)
+        stats = reader.prefetch_stats()
+        self.assertEqual(stats['batches'], 4)
+        self.assertGreater(stats['producer_blocked_time'], 0)
+        self.cursor.close.assert_called_once()
+
+    def test_prefetch_error(self):
+        self.cursor.fetchmany.side_effect = Exception("connection lost")
+        reader = PostgresTableIterator(self.postgresql, query="select * from table_1", prefetch=2)
+        with self.assertRaises(Exception) as error:
+            list(reader)
+        self.assertEqual(str(error.exception), "connection lost")
+        reader.close()
+        self.assertIsNone(reader.prefetch_thread)
+
+    def test_close_stops_prefetch(self):
+        self.rows = [(i, f"name {i}") for i in range(100)]
+        reader = PostgresTableIterator(self.postgresql, query="select * from table_1", batch_size=1, prefetch=1)
+        self.assertEqual(next(reader), {"id": 0, "name": "name 0"})
+        reader.close()
+        self.assertIsNone(reader.prefetch_thread)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import time
+import tempfile
+import unittest
+import psycopg2
+import datetime
+import threading
+from unittest.mock import MagicMock
+from data_access.metadata_models import Table, Column
+from data_access.postgresql_data_access import PostgreSQLWriter, PostgreSQLTransactionCoordinator
+from data_access.postgresql_reject_sink import RejectFile
+from data_access.utils import format_copy_value, rows_to_copy_buffer
+
+
+class TestPostgreSQLWriter(unittest.TestCase):
+    def setUp(self):
+        self.postgresql = MagicMock()
+        self.cursor = MagicMock()
+        self.postgresql.connection.cursor.return_value = self.cursor
+        self.table = Table("test_table", 0, columns=[Column("id"), Column("name"), Column("active")])
+
+    def test_format_copy_value(self):
+        self.assertEqual(format_copy_value(None), "\\N")
+        self.assertEqual(format_copy_value(True), "t")
+        self.assertEqual(format_copy_value(False), "f")
+        self.assertEqual(format_copy_value(12.5), "12.5")
+        self.assertEqual(format_copy_value("a\tb\nc\\d"), "a\\tb\\nc\\\\d")
+        self.assertEqual(format_copy_value(b"\x01\xff"), "\\\\x01ff")
+        self.assertEqual(format_copy_value(datetime.date(2024, 1, 31)), "2024-01-31")
+        self.assertEqual(format_copy_value([1, None, 'a"b']), '{"1",NULL,"a\\\\"b"}')
+
+    def test_rows_to_copy_buffer(self):
+        buffer = rows_to_copy_buffer([(1, "John", True), (2, None, False)])
+        self.assertEqual(buffer.getvalue(), "1\tJohn\tt\n2\t\\N\tf\n")
+
+    def test_copy_load_mode(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, schema="public", buffer_size=2, bulk_commit=False, load_mode="copy")
+        writer.insert([1, "John", True], logging_ids=False)
+        writer.insert({"id": 2, "name": "Jane", "active": False}, logging_ids=False)
+
+        self.cursor.copy_expert.assert_called_once()
+        sql, buffer = self.cursor.copy_expert.call_args[0]
+        self.assertEqual(sql, "COPY public.test_table (id, \"name\", active) FROM STDIN")
+        self.assertEqual(buffer.getvalue(), "1\tJohn\tt\n2\tJane\tf\n")
+        self.assertEqual(writer.buffer, [])
+        self.assertEqual(writer.total_rows, 2)
+
+    def test_async_flush(self):
+        started = threading.Event()
+        release = threading.Event()
+        buffers = []
+        def copy_expert(sql, buffer):
+            started.set()
+            release.wait(5)
+            buffers.append(buffer.getvalue())
+        self.cursor.copy_expert.side_effect = copy_expert
+
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=1, bulk_commit=False, load_mode="copy", async_flush=True)
+        writer.insert([1, "John", True], logging_ids=False)
+        self.assertTrue(started.wait(5))
+        # the caller keeps filling buffers while the first one is being written
+        writer.insert([2, "Jane", False], logging_ids=False)
+        self.assertEqual(buffers, [])
+
+        release.set()
+        writer.commit()
+        self.assertEqual(buffers, ["1\tJohn\tt\n", "2\tJane\tf\n"])
+        self.assertEqual(writer.total_rows, 2)
+        self.postgresql.connection.commit.assert_called_once()
+        self.assertIsNone(writer.flusher)
+
+    def test_async_flush_reports_nothing_committed(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=10, bulk_commit=True, load_mode="copy", async_flush=True)
+        writer.insert([1, "John", True], logging_ids=False)
+        self.assertFalse(writer.flush_buffer())
+        writer.commit()
+
+    def test_async_flush_error(self):
+        self.cursor.copy_expert.side_effect = Exception("insert failed")
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=1, bulk_commit=False, load_mode="copy", async_flush=True)
+        writer.insert([1, "John", True], logging_ids=False)
+
+        deadline = time.monotonic() + 5
+        while writer.flush_error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with self.assertRaises(Exception) as error:
+            writer.insert([2, "Jane", False], logging_ids=False)
+        self.assertEqual(str(error.exception), "insert failed")
+        with self.assertRaises(Exception):
+            writer.commit()
+        self.postgresql.connection.commit.assert_not_called()
+
+        writer.rollback()
+        self.assertIsNone(writer.flush_error)
+        self.postgresql.connection.rollback.assert_called_once()
+
+    def test_invalid_load_mode(self):
+        with self.assertRaises(Exception):
+            PostgreSQLWriter(self.postgresql, self.table, load_mode="merge")
+
+    def test_upsert_merges_through_the_staging_table(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, schema="public", buffer_size=2, bulk_commit=False, load_mode="copy", write_mode="upsert", conflict_key=["id"])
+        writer.insert([1, "John", True], logging_ids=False)
+        writer.insert([1, "Johnny", True], logging_ids=False)
+
+        staging = writer.staging_table
+        statements = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertEqual(statements[0], f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE public.test_table INCLUDING DEFAULTS) ON COMMIT DROP")
+        self.assertEqual(self.cursor.copy_expert.call_args[0][0], f"COPY {staging} (id, \"name\", active) FROM STDIN")
+        self.assertEqual(statements[1],
+                         f"INSERT INTO public.test_table (id, \"name\", active) SELECT DISTINCT ON (id) id, \"name\", active FROM {staging} "
+                         "ORDER BY id, ctid DESC ON CONFLICT (id) DO UPDATE SET \"name\" = EXCLUDED.\"name\", active = EXCLUDED.active")
+        self.assertEqual(statements[2], f"TRUNCATE {staging}")
+
+    def test_staging_table_name_is_sanitized_and_quoted(self):
+        writer = PostgreSQLWriter(self.postgresql, Table('"Order Items"', 0, columns=[Column("id")]), write_mode="upsert")
+        self.assertRegex(writer.staging_table, r'^"staging_Order_Items_[0-9a-f]+"$')
+
+        writer = PostgreSQLWriter(self.postgresql, Table("x" * 80 + "; DROP TABLE people", 0, columns=[Column("id")]), write_mode="upsert")
+        self.assertRegex(writer.staging_table, r'^"staging_x{40}_[0-9a-f]+"$')
+
+    def test_upsert_uses_the_primary_key(self):
+        self.cursor.fetchall.return_value = [("id",), ("name",), ("active",)]
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=1, bulk_commit=False, write_mode="upsert")
+        self.assertTrue(writer.upsert_sql().endswith("ON CONFLICT (id, \"name\", active) DO NOTHING"))
+
+        self.cursor.fetchall.return_value = []
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=1, bulk_commit=False, write_mode="upsert")
+        with self.assertRaises(Exception):
+            writer.upsert_sql()
+
+    def test_group_commit(self):
+        coordinator = PostgreSQLTransactionCoordinator(self.postgresql, commit_rows=3)
+        parents = coordinator.register(PostgreSQLWriter(self.postgresql, self.table, buffer_size=2, load_mode="copy"))
+        children = coordinator.register(PostgreSQLWriter(self.postgresql, Table("child", 0, columns=[Column("id")]), buffer_size=2, load_mode="copy"))
+
+        parents.insert([1, "John", True], logging_ids=False)
+        parents.insert([2, "Jane", False], logging_ids=False)
+        children.insert([1], logging_ids=False)
+        # bulk_commit is ignored: 2 rows flushed, below the budget
+        self.assertFalse(coordinator.commit_if_due())
+
+        parents.insert([3, "Jim", True], logging_ids=False)
+        parents.insert([4, "Jill", True], logging_ids=False)
+        # the budget is spent, but flushes never commit: the batch may not be whole yet
+        self.postgresql.connection.commit.assert_not_called()
+        # between batches, the pending child row is flushed and committed with the parents
+        self.assertTrue(coordinator.commit_if_due())
+        self.postgresql.connection.commit.assert_called_once()
+        self.assertEqual(self.cursor.copy_expert.call_count, 3)
+        self.assertEqual((parents.committed_rows, children.committed_rows), (4, 1))
+        self.assertEqual(coordinator.pending_rows, 0)
+
+        children.insert([2], logging_ids=False)
+        children.commit()
+        self.assertEqual(self.postgresql.connection.commit.call_count, 2)
+        self.assertEqual(coordinator.commits, 2)
+
+    def test_bad_rows_are_rejected(self):
+        written = []
+        def copy_expert(sql, buffer):
+            rows = buffer.getvalue().splitlines()
+            if any("bad" in row for row in rows):
+                raise psycopg2.DataError("invalid input syntax")
+            written.extend(rows)
+        self.cursor.copy_expert.side_effect = copy_expert
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "rejects", "test_table.csv")
+
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=8, load_mode="copy", on_error="reject")
+        writer.reject_sink = RejectFile(path)
+        for i in range(8):
+            writer.insert([i, "bad" if i in (2, 5) else f"name {i}", True], logging_ids=False)
+
+        self.assertEqual(written, [f"{i}\tname {i}\tt" for i in (0, 1, 3, 4, 6, 7)])
+        self.assertEqual(writer.rejected_rows, 2)
+        self.postgresql.connection.commit.assert_called_once()
+        self.assertEqual(writer.committed_rows, 8)
+        statements = [call[0][0] for call in self.cursor.execute.call_args_list]
+        self.assertEqual(statements.count("SAVEPOINT writer_rows"), statements.count("RELEASE SAVEPOINT writer_rows"))
+        with open(path, encoding="utf-8") as file:
+            self.assertEqual(file.read().splitlines(), ["id,name,active,error_sqlstate,error_message",
+                                                        "2,bad,True,,invalid input syntax", "5,bad,True,,invalid input syntax"])
+
+    def test_other_errors_abort(self):
+        self.cursor.copy_expert.side_effect = psycopg2.OperationalError("connection lost")
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=2, load_mode="copy", on_error="reject")
+        writer.insert([1, "John", True], logging_ids=False)
+        with self.assertRaises(psycopg2.OperationalError):
+            writer.insert([2, "Jane", True], logging_ids=False)
+        self.assertEqual(writer.rejected_rows, 0)
+
+    def test_group_commit_requires_the_same_connection(self):
+        coordinator = PostgreSQLTransactionCoordinator(self.postgresql)
+        with self.assertRaises(Exception):
+            coordinator.register(PostgreSQLWriter(MagicMock(), self.table))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import MagicMock
+from data_access.postgresql_metadata_access import PostgreSQLSchemaManager
+
+
+class TestSchemaIntrospection(unittest.TestCase):
+    def setUp(self):
+        self.postgresql = MagicMock()
+        self.cursor = MagicMock()
+        self.cursor.closed = False
+        self.postgresql.connection.cursor.return_value = self.cursor
+        self.cursor.fetchall.side_effect = [
+            [("orders", 1200, 65536), ("customers", -1, 8192)],
+            [("orders", "id", "integer", False, "nextval('orders_id_seq'::regclass)"),
+             ("orders", "customer_id", "integer", True, None),
+             ("customers", "id", "integer", False, None)],
+            [("orders", "orders_pkey", "p", "id", None, None, None, "PRIMARY KEY (id)"),
+             ("orders", "orders_customer_fk", "f", "customer_id", "public", "customers", "id", "FOREIGN KEY (customer_id) REFERENCES customers(id)")],
+            [("orders", "orders_pkey", "id", False, "btree", False, "CREATE UNIQUE INDEX orders_pkey ON public.orders USING btree (id)", "orders_pkey")],
+        ]
+
+    def test_get_tables(self):
+        tables = {table.name: table for table in PostgreSQLSchemaManager(self.postgresql, schema="public").get_tables()}
+
+        self.assertEqual(self.cursor.execute.call_count, 4)
+        self.assertEqual(self.cursor.execute.call_args[0][1], ("public",))
+
+        orders = tables["orders"]
+        self.assertEqual(orders.num_tuples, 1200)
+        self.assertEqual(orders.size_bytes, 65536)
+        self.assertEqual([c.name for c in orders.columns], ["id", "customer_id"])
+        self.assertEqual([c.constraint_type for c in orders.constraints], ["p", "f"])
+        self.assertEqual(orders.constraints[1].referenced_table_name, "customers")
+        self.assertEqual(orders.indexes[0].constraint_name, "orders_pkey")
+        self.assertIsNone(tables["customers"].num_tuples)
+
+    def test_get_row_count_estimates(self):
+        self.cursor.fetchall.side_effect = [[("orders", 1000, 1250, 2000, 10, 750), ("logs", 300, None, None, None, None)]]
+        estimates = PostgreSQLSchemaManager(self.postgresql, schema="public").get_row_count_estimates()
+
+        self.assertEqual(self.cursor.execute.call_count, 1)
+        self.assertEqual(estimates["orders"]["estimate"], 1250)
+        self.assertEqual(estimates["orders"]["n_tup_del"], 750)
+        self.assertEqual(estimates["logs"]["estimate"], 300)
+
+    def test_row_count_estimates_without_live_tuples(self):
+        self.cursor.fetchall.side_effect = [[("orders", 1000, 0, 0, 0, 0), ("empty", -1, 0, 0, 0, 0)]]
+        estimates = PostgreSQLSchemaManager(self.postgresql, schema="public").get_row_count_estimates()
+
+        self.assertEqual(estimates["orders"]["estimate"], 1000)
+        self.assertEqual(estimates["empty"]["estimate"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock
+
+from data_access.postgresql_shadow_table import PostgreSQLShadowTable, suffixed_name
+
+
+class FakeConnection:
+    """
+    A connection whose cursors answer the catalog queries of PostgreSQLShadowTable and record the other statements.
+
+    """
+    def __init__(self, dependents=(0, 0)):
+        self.statements = []
+        self.answers = {
+            "pg_trigger": [dependents],
+            "pg_get_indexdef": [("orders_date_idx", "CREATE INDEX orders_date_idx ON public.orders USING btree (date)")],
+            "con.conname, con.contype": [("orders_pkey", "p", False, "PRIMARY KEY (id)"),
+                                         ("orders_client_fk", "f", False, "FOREIGN KEY (client_id) REFERENCES clients(id)"),
+                                         ("orders_parent_fk", "f", True, "FOREIGN KEY (parent_id) REFERENCES orders(id)")],
+            "con.confrelid = %s::regclass": [("public", "order_items", "order_items_order_fk", "FOREIGN KEY (order_id) REFERENCES orders(id)")],
+            "aclexplode": [("SELECT", "reporting")],
+            "pg_get_serial_sequence": [],
+        }
+        self.postgresql = MagicMock()
+        self.postgresql.connection.cursor.side_effect = self.cursor
+
+    def cursor(self):
+        cursor = MagicMock()
+        def execute(sql, params=None):
+            for marker, rows in self.answers.items():
+                if marker in sql:
+                    cursor.fetchall.return_value = rows
+                    return
+            self.statements.append(sql)
+        cursor.execute.side_effect = execute
+        return cursor
+
+
+class TestShadowTable(unittest.TestCase):
+    def test_create(self):
+        connection = FakeConnection()
+        PostgreSQLShadowTable(connection.postgresql, "orders", schema="public").create()
+
+        self.assertEqual(connection.statements, [
+            'DROP TABLE IF EXISTS "public"."orders_shadow"',
+            'CREATE UNLOGGED TABLE "public"."orders_shadow" (LIKE "public"."orders" INCLUDING DEFAULTS INCLUDING IDENTITY '
+            'INCLUDING GENERATED INCLUDING CONSTRAINTS INCLUDING STORAGE)'])
+        connection.postgresql.connection.commit.assert_called_once()
+
+    def test_tables_with_triggers_are_refused(self):
+        connection = FakeConnection(dependents=(1, 0))
+        with self.assertRaises(Exception):
+            PostgreSQLShadowTable(connection.postgresql, "orders", schema="public").create()
+        self.assertEqual(connection.statements, [])
+
+    def test_swap(self):
+        connection = FakeConnection()
+        PostgreSQLShadowTable(connection.postgresql, "orders", schema="public").swap()
+
+        self.assertEqual(connection.statements, [
+            'ALTER TABLE "public"."orders_shadow" SET LOGGED',
+            'CREATE INDEX "orders_date_idx_shadow" ON "public"."orders_shadow" USING btree (date)',
+            'ALTER TABLE "public"."orders_shadow" ADD CONSTRAINT "orders_pkey_shadow" PRIMARY KEY (id)',
+            'ALTER TABLE "public"."orders_shadow" ADD CONSTRAINT "orders_client_fk" FOREIGN KEY (client_id) REFERENCES clients(id)',
+            'GRANT SELECT ON "public"."orders_shadow" TO reporting',
+            'ANALYZE "public"."orders_shadow"',
+            'LOCK TABLE "public"."orders" IN ACCESS EXCLUSIVE MODE',
+            'ALTER TABLE "public"."order_items" DROP CONSTRAINT "order_items_order_fk"',
+            'ALTER TABLE "public"."orders" RENAME TO "orders_swap_old"',
+            'ALTER TABLE "public"."orders_shadow" RENAME TO "orders"',
+            'DROP TABLE "public"."orders_swap_old"',
+            'ALTER INDEX "public"."orders_date_idx_shadow" RENAME TO "orders_date_idx"',
+            'ALTER TABLE "public"."orders" RENAME CONSTRAINT "orders_pkey_shadow" TO "orders_pkey"',
+            'ALTER TABLE "public"."order_items" ADD CONSTRAINT "order_items_order_fk" FOREIGN KEY (order_id) REFERENCES orders(id) NOT VALID',
+            'ALTER TABLE "public"."orders" ADD CONSTRAINT "orders_parent_fk" FOREIGN KEY (parent_id) REFERENCES orders(id) NOT VALID',
+            'ALTER TABLE "public"."order_items" VALIDATE CONSTRAINT "order_items_order_fk"',
+            'ALTER TABLE "public"."orders" VALIDATE CONSTRAINT "orders_parent_fk"'])
+
+    def test_suffixed_name_fits_identifiers(self):
+        self.assertEqual(len(suffixed_name("x" * 70, "_shadow")), 63)
+
+
+if __name__ == "__main__":
+    unittest.main()
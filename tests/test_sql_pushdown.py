@@ -0,0 +1,86 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+from data_access.db_credentials import DBCredentials
+from data_access.postgresql_facade import PostgreSQLFacade
+from data_access.postgresql_data_access import postgres_insert_select
+from configs.checkpoint_manager import CheckpointStore
+from data_migration.mapper import Mapper
+from data_migration.rule import Rule, Input, Output
+
+
+def credentials(name, database, user="user"):
+    return DBCredentials(name=name, database=database, user=user, password="password", host="localhost", port=5432, schema="public", type="postgresql")
+
+
+class PermissionDenied(Exception):
+    pgcode = "42501"
+
+
+class TestSQLPushdown(unittest.TestCase):
+    def test_insert_select_sql(self):
+        postgresql = MagicMock()
+        cursor = postgresql.connection.cursor.return_value
+        cursor.rowcount = 42
+
+        rows = postgres_insert_select(postgresql, "people", "SELECT * FROM users", schema="public", columns={"id": "person_id", "name": "full_name"})
+
+        self.assertEqual(rows, 42)
+        cursor.execute.assert_called_once_with('INSERT INTO public.people (person_id, full_name) SELECT id, "name" FROM (SELECT * FROM users) AS source')
+
+    def run_copy_rule(self, input_credentials, output_credentials, insert_select_error=None, checkpoint=None, pairs=1):
+        rule = Rule("copy_people")
+        rule.copy = True
+        rule.columns = ["id", "email"]
+        for _ in range(pairs):
+            rule.inputs.append(Input(input_credentials, "SELECT * FROM users"))
+            rule.outputs.append(Output(output_credentials, "people"))
+
+        facades = []
+        def create(db_credentials, **kwargs):
+            facade = MagicMock()
+            facade.db_credentials = db_credentials
+            facade.same_database.side_effect = lambda other: other.db_credentials.database == db_credentials.database
+            facade.insert_select.side_effect = insert_select_error
+            facades.append(facade)
+            return facade
+
+        with patch("data_access.db_factory.DatabaseFactory.create", side_effect=create):
+            mapper = object.__new__(Mapper)
+            mapper.checkpoint = checkpoint
+            mapper.run_copy_rule(rule)
+        return facades
+
+    def test_same_database_runs_on_server(self):
+        source, target = self.run_copy_rule(credentials("db_1", "erp"), credentials("db_1_copy", "erp"))
+        target.insert_select.assert_called_once_with("SELECT * FROM users", table_name="people", columns=["id", "email"])
+        source.pipe_to.assert_not_called()
+
+    def test_other_database_streams(self):
+        source, target = self.run_copy_rule(credentials("db_1", "erp"), credentials("db_2", "warehouse"))
+        source.pipe_to.assert_called_once_with(target, table_name="people", columns=["id", "email"])
+        target.insert_select.assert_not_called()
+
+    def test_same_database_requires_the_same_user(self):
+        source = PostgreSQLFacade(credentials("db_1", "erp"))
+        self.assertTrue(source.same_database(PostgreSQLFacade(credentials("db_1_copy", "erp"))))
+        self.assertFalse(source.same_database(PostgreSQLFacade(credentials("db_1_loader", "erp", user="loader"))))
+
+    def test_permission_error_falls_back_to_copy(self):
+        error = PermissionDenied("permission denied for table users")
+        source, target = self.run_copy_rule(credentials("db_1", "erp"), credentials("db_1_copy", "erp"), insert_select_error=error)
+        target.insert_select.assert_called_once()
+        source.pipe_to.assert_called_once_with(target, table_name="people", columns=["id", "email"])
+
+    def test_resume_skips_the_copied_pairs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            checkpoint = CheckpointStore("data_migration", folder=folder)
+            checkpoint.save("copy_people", status="running", copied_pairs=[0])
+            facades = self.run_copy_rule(credentials("db_1", "erp"), credentials("db_2", "warehouse"), checkpoint=checkpoint, pairs=2)
+
+            self.assertEqual(len(facades), 2)
+            facades[0].pipe_to.assert_called_once_with(facades[1], table_name="people", columns=["id", "email"])
+            self.assertEqual(CheckpointStore("data_migration", folder=folder).get("copy_people")["copied_pairs"], [0, 1])
+
+if __name__ == '__main__':
+    unittest.main()
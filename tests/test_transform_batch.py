@@ -0,0 +1,139 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from unittest.mock import MagicMock
+from data_access.metadata_models import Table, Column
+from data_access.postgresql_data_access import PostgreSQLWriter
+from data_migration.mapper import Mapper
+from data_migration.rule import Rule
+
+
+class TestTransformBatch(unittest.TestCase):
+    def setUp(self):
+        self.postgresql = MagicMock()
+        self.cursor = MagicMock()
+        self.postgresql.connection.cursor.return_value = self.cursor
+        self.table = Table("people", 0, columns=[Column("id"), Column("name")])
+
+    def test_insert_batch_dataframe(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, schema="public", buffer_size=2, bulk_commit=False, load_mode="copy")
+        df = pd.DataFrame({"name": ["John", None, "Ann"], "id": [1, 2, 3]})
+        writer.insert_batch(df, logging_ids=False)
+
+        self.assertEqual(self.cursor.copy_expert.call_count, 1)
+        self.assertEqual(self.cursor.copy_expert.call_args[0][1].getvalue(), "1\tJohn\n2\t\\N\n")
+        self.assertEqual(writer.buffer, [(3, "Ann")])
+
+    def test_insert_batch_dataframe_missing_column(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=10, bulk_commit=False)
+        with self.assertRaises(KeyError) as error:
+            writer.insert_batch(pd.DataFrame({"nome": ["a"], "id": [1]}), logging_ids=False)
+        self.assertIn("name", str(error.exception))
+        self.assertEqual(writer.buffer, [])
+
+    def test_insert_batch_dicts(self):
+        writer = PostgreSQLWriter(self.postgresql, self.table, buffer_size=10, bulk_commit=False)
+        writer.insert_batch([{"id": 1, "name": "John"}, {"name": "Ann", "id": 2}], logging_ids=False)
+        self.assertEqual(writer.buffer, [[1, "John"], [2, "Ann"]])
+
+    def test_mapper_feeds_batches(self):
+        reader = MagicMock()
+        reader.columns = ["id", "name"]
+        reader.iter_batches.return_value = iter([[(1, "john"), (2, "ann")], [(3, "bob")]])
+        database_input = MagicMock()
+        database_input.reader.return_value = reader
+        database_output = MagicMock()
+        database_output.table_name = "people"
+        writer = database_output.writer.return_value
+
+        def transform_batch(batch, context):
+            context["batches"] = context.get("batches", 0) + 1
+            batch["name"] = batch["name"].str.upper()
+            return batch
+
+        rule = Rule("people")
+        rule.batch_format = "dataframe"
+        mapper = object.__new__(Mapper)
+        mapper.buffer_size = 1000
+        mapper.prefetch = 0
+        mapper.checkpoint = None
+        context = {}
+        mapper.run_transform_batch(rule, transform_batch, [database_input], [database_output], context)
+
+        self.assertEqual(context["batches"], 2)
+        self.assertEqual(writer.insert_batch.call_count, 2)
+        self.assertEqual(list(writer.insert_batch.call_args_list[0][0][0]["name"]), ["JOHN", "ANN"])
+        writer.commit.assert_called_once()
+        reader.iter_batches.assert_called_once_with(as_dict=False)
+
+    def test_mapper_group_commit(self):
+        reader = MagicMock()
+        reader.columns = ["id", "name"]
+        reader.iter_batches.return_value = iter([[(1, "john")]])
+        database_input = MagicMock()
+        database_input.reader.return_value = reader
+        connection = MagicMock()
+        database_outputs = [MagicMock(table_name=name, connection=connection) for name in ("people", "addresses")]
+        transaction = database_outputs[0].transaction.return_value
+        for database in database_outputs:
+            database.writer.return_value.coordinator = transaction
+
+        rule = Rule("people")
+        rule.group_commit = {"rows": 1000}
+        mapper = object.__new__(Mapper)
+        mapper.buffer_size = 1000
+        mapper.prefetch = 0
+        mapper.checkpoint = None
+        mapper.run_transform_batch(rule, lambda batch, context: {"people": batch, "addresses": batch}, [database_input], database_outputs, {})
+
+        for database in database_outputs:
+            database.create_connection.assert_called_once_with(reuse=True)
+            database.writer.return_value.flush_buffer.assert_called_once()
+        database_outputs[0].transaction.assert_called_once_with(commit_rows=1000, commit_interval=None)
+        transaction.attach.assert_called_once_with(database_outputs[1])
+        # checked once per batch, after both outputs received their rows
+        transaction.commit_if_due.assert_called_once()
+        # committing one writer commits the whole group
+        self.assertEqual(database_outputs[0].writer.return_value.commit.call_count + database_outputs[1].writer.return_value.commit.call_count, 1)
+
+    def run_parallel_rule(self, ordered):
+        rule_file = tempfile.NamedTemporaryFile(mode="w", suffix=".py", delete=False)
+        rule_file.write("import time\n\ndef transform_batch(batch, context):\n"
+                        "    time.sleep(0.05 if batch[0]['id'] == 0 else 0)\n"
+                        "    return [{'id': row['id'], 'name': row['name'].upper() + context['suffix']} for row in batch]\n")
+        rule_file.close()
+        self.addCleanup(os.remove, rule_file.name)
+
+        reader = MagicMock()
+        reader.iter_batches.return_value = iter([[{"id": i, "name": f"name {i}"}] for i in range(6)])
+        database_input = MagicMock()
+        database_input.reader.return_value = reader
+        database_output = MagicMock()
+        database_output.table_name = "people"
+        writer = database_output.writer.return_value
+
+        rule = Rule("parallel_people")
+        rule.transform_workers = 2
+        rule.max_pending_batches = 3
+        rule.ordered = ordered
+        mapper = object.__new__(Mapper)
+        mapper.buffer_size = 1000
+        mapper.prefetch = 0
+        mapper.checkpoint = None
+        mapper.run_transform_batch(rule, None, [database_input], [database_output], {"suffix": "!"}, rule_file=rule_file.name)
+
+        writer.commit.assert_called_once()
+        return [call[0][0][0] for call in writer.insert_batch.call_args_list]
+
+    def test_parallel_transform_ordered(self):
+        rows = self.run_parallel_rule(ordered=True)
+        self.assertEqual([row["id"] for row in rows], list(range(6)))
+        self.assertEqual(rows[0]["name"], "NAME 0!")
+
+    def test_parallel_transform_unordered(self):
+        rows = self.run_parallel_rule(ordered=False)
+        self.assertEqual(sorted(row["id"] for row in rows), list(range(6)))
+
+if __name__ == '__main__':
+    unittest.main()